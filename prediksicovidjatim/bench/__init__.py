@@ -0,0 +1,5 @@
+from .synthetic import synthetic_kabko, synthetic_values, synthetic_province, synthetic_raw
+from .model import bench_kernel, bench_ensemble, bench_province
+from .fitting import bench_fit, bench_scorer
+from .plotting import bench_raw_plotters
+from .imports import bench_imports, IMPORT_BUDGET
@@ -0,0 +1,82 @@
+import json
+import sys
+import platform
+import argparse
+from datetime import datetime
+import numpy as np
+import scipy
+import lmfit
+from .model import bench_kernel, bench_ensemble, bench_province
+from .fitting import bench_fit, bench_scorer
+from .plotting import bench_raw_plotters
+from .imports import bench_imports
+from .synthetic import synthetic_province
+from ..data.model.snapshot import load_snapshots
+
+BENCHES = ["imports", "kernel", "ensemble", "province", "scorer", "raw_plotters", "fit"]
+
+def meta():
+    #what the numbers depend on, to compare runs across versions and machines
+    try:
+        from importlib.metadata import version
+        package_version = version("prediksicovidjatim")
+    except Exception:
+        package_version = None
+    return {
+        "time": datetime.now().isoformat(),
+        "version": package_version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "lmfit": lmfit.__version__
+    }
+
+def run(benches=BENCHES, count=38, min_days=200, max_days=400, fit_count=3, max_nfev=300, seed=0, snapshots=None):
+    #snapshots replays exported kabko instead of synthetic ones
+    if snapshots:
+        kabkos = load_snapshots(snapshots)
+    else:
+        kabkos = synthetic_province(count, min_days, max_days, seed=seed)
+    ret = {"meta": meta()}
+    ret["meta"]["kabko"] = len(kabkos)
+    ret["meta"]["snapshots"] = snapshots
+    for name in benches:
+        print("Running %s" % (name,), file=sys.stderr)
+        if name == "imports":
+            ret[name] = bench_imports()
+        elif name == "kernel":
+            ret[name] = bench_kernel(seed=seed)
+        elif name == "ensemble":
+            ret[name] = bench_ensemble(seed=seed)
+        elif name == "province":
+            ret[name] = bench_province(kabkos)
+        elif name == "scorer":
+            ret[name] = bench_scorer(kabkos)
+        elif name == "raw_plotters":
+            ret[name] = bench_raw_plotters(kabkos)
+        elif name == "fit":
+            ret[name] = bench_fit(kabkos, count=fit_count, max_nfev=max_nfev)
+        else:
+            raise ValueError("Invalid bench: " + str(name))
+    return ret
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m prediksicovidjatim.bench", description="Times the hot paths on synthetic kabko, printing JSON.")
+    parser.add_argument("benches", nargs="*", default=BENCHES, help="any of " + ", ".join(BENCHES))
+    parser.add_argument("--count", type=int, default=38, help="synthetic kabko")
+    parser.add_argument("--min-days", type=int, default=200)
+    parser.add_argument("--max-days", type=int, default=400)
+    parser.add_argument("--fit-count", type=int, default=3, help="kabko to fit")
+    parser.add_argument("--max-nfev", type=int, default=300, help="objective evaluations per fit")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--snapshots", help="directory of kabko snapshots to use instead of synthetic kabko")
+    parser.add_argument("--output", help="file to write instead of stdout")
+    args = parser.parse_args()
+
+    ret = run(args.benches, args.count, args.min_days, args.max_days, args.fit_count, args.max_nfev, args.seed, args.snapshots)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(ret, f, indent=2)
+    else:
+        print(json.dumps(ret, indent=2))
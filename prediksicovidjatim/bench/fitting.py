@@ -0,0 +1,59 @@
+import time
+import numpy as np
+from ..modeling import SeicrdRlcModel
+from ..modeling.fitting_result import BaseScorer
+from ..data.model.repo import score_columns
+from .model import best_time, summarize
+from .synthetic import synthetic_province, synthetic_values
+
+def bench_fit(kabkos=None, count=3, test_splits=[3], max_nfev=300, sensitivity=False):
+    '''
+    Full fits of the first count kabko, folds and uncertainty included.
+    max_nfev caps each minimization of a fit so runs compare on time per evaluation rather than on how chaotic the fit was.
+    '''
+    kabkos = (kabkos or synthetic_province())[:count]
+    ret = []
+    for kabko in kabkos:
+        model = SeicrdRlcModel(kabko)
+        start = time.time()
+        fit_result = model.fit(test_splits=test_splits, max_nfev=max_nfev, sensitivity=sensitivity, instrument=True)
+        elapsed = time.time() - start
+        nfev = fit_result.instrumentation.get("objective", {}).get("count", 0)
+        ret.append({
+            "kabko": kabko.kabko,
+            "days": kabko.data_days(),
+            "time": elapsed,
+            "nfev": nfev,
+            "time_per_nfev": elapsed / max(1, nfev),
+            "chisqr": float(fit_result.fit_result.chisqr),
+            "budget_truncated": fit_result.budget_truncated,
+            "instrumentation": fit_result.instrumentation
+        })
+    return {
+        "max_nfev": max_nfev,
+        "test_splits": test_splits,
+        "sensitivity": sensitivity,
+        "time": summarize([r["time"] for r in ret]),
+        "time_per_nfev": summarize([r["time_per_nfev"] for r in ret]),
+        "fits": ret
+    }
+    
+def bench_scorer(kabkos=None, number=1, repeat=3, columns=score_columns):
+    '''
+    The score columns saved for every kabko, on its data against the model at init values.
+    '''
+    kabkos = kabkos or synthetic_province()
+    times = []
+    for kabko in kabkos:
+        model = SeicrdRlcModel(kabko)
+        data = kabko.get_datasets_values(model.datasets)
+        pred = model.fitter(**synthetic_values(kabko))
+        dely = pred * 0.1
+        x = np.arange(0, len(data[0]))
+        #stats are kept by the scorer, so each call gets a new one
+        score = lambda: BaseScorer(data, pred, dely, dely, 10, np.mean(data, axis=1), x=x).get_values(columns)
+        times.append(best_time(score, number, repeat))
+    return {
+        "columns": len(columns),
+        "score": summarize(times)
+    }
@@ -0,0 +1,35 @@
+import os
+import sys
+import subprocess
+
+#seconds a fresh process may take to import each module, what a spawned pool worker pays
+IMPORT_BUDGET = {
+    "prediksicovidjatim.util": 0.3,
+    "prediksicovidjatim.data.model.entities": 0.5,
+    "prediksicovidjatim.data.model.snapshot": 0.5,
+    "prediksicovidjatim.modeling": 2.0,
+    "prediksicovidjatim.modeling.batch": 2.0
+}
+
+def import_time(module):
+    #in a new interpreter, so nothing is imported yet
+    package_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([package_dir] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else []))
+    code = "import time; start = time.perf_counter(); import %s; print(time.perf_counter() - start)" % (module,)
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True).stdout
+    return float(out.strip().splitlines()[-1])
+    
+def bench_imports(budget=IMPORT_BUDGET, repeat=3):
+    '''
+    Best import time of each module of budget, in seconds, against its budget.
+    '''
+    ret = {}
+    for module, limit in budget.items():
+        time = min([import_time(module) for i in range(0, repeat)])
+        ret[module] = {
+            "time": time,
+            "budget": limit,
+            "within_budget": time <= limit
+        }
+    return ret
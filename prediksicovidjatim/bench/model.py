@@ -0,0 +1,78 @@
+import timeit
+import numpy as np
+from .. import util
+from ..modeling import SeicrdRlcModel
+from ..modeling import kernel
+from .synthetic import synthetic_kabko, synthetic_values, synthetic_province
+
+def best_time(f, number=5, repeat=3):
+    #best mean seconds per call, as timeit recommends
+    return min(timeit.repeat(f, number=number, repeat=repeat)) / number
+    
+def bench_kernel(days=350, number=5, repeat=3, seed=0):
+    kabko = synthetic_kabko(days=days, seed=seed)
+    values = synthetic_values(kabko)
+    
+    ret = {
+        "days": days,
+        "numba": kernel.is_compiled()
+    }
+    for mode_name, mode in (("ignore", util.SANITY_CHECK_IGNORE), ("correct", util.SANITY_CHECK_CORRECT)):
+        times = {}
+        for compiled in (False, True):
+            #no cache, or every call after the first would be a cache hit
+            model = SeicrdRlcModel(kabko, compiled=compiled, cache=False, checkpoint=False)
+            #warm up, this includes jit compilation
+            model.model(**values, sanity_check_mode=mode)
+            times[compiled] = best_time(lambda: model.model(**values, sanity_check_mode=mode), number, repeat)
+        ret["model_%s_deriv" % (mode_name,)] = times[False]
+        ret["model_%s_compiled" % (mode_name,)] = times[True]
+        ret["model_%s_speedup" % (mode_name,)] = times[False] / times[True]
+    return ret
+    
+def bench_ensemble(days=350, members=64, number=1, repeat=3, seed=0):
+    kabko = synthetic_kabko(days=days, seed=seed)
+    model = SeicrdRlcModel(kabko, cache=False, checkpoint=False)
+    values = synthetic_values(kabko)
+    params = model.ensemble_values([values] * members)
+    
+    serial = best_time(lambda: model.model(**values), number, repeat)
+    ensemble = best_time(lambda: model.model_ensemble(params, days), number, repeat)
+    return {
+        "days": days,
+        "members": members,
+        "model_serial": serial * members,
+        "model_ensemble": ensemble,
+        "speedup": serial * members / ensemble
+    }
+        
+def summarize(times):
+    #over the kabko of the province
+    return {
+        "total": float(np.sum(times)),
+        "mean": float(np.mean(times)),
+        "max": float(np.max(times))
+    }
+        
+def bench_province(kabkos=None, number=3, repeat=3):
+    '''
+    model() and the fit objective of every kabko once, as one nightly fit round sees them.
+    '''
+    kabkos = kabkos or synthetic_province()
+    model_times = []
+    objective_times = []
+    for kabko in kabkos:
+        model = SeicrdRlcModel(kabko, cache=False, checkpoint=False)
+        values = synthetic_values(kabko)
+        data = kabko.get_datasets_values(model.datasets)
+        x = (0, len(data[0]))
+        #warm up
+        model.objective(values, x, data)
+        model_times.append(best_time(lambda: model.model(**values), number, repeat))
+        objective_times.append(best_time(lambda: model.objective(values, x, data), number, repeat))
+    return {
+        "kabko": len(kabkos),
+        "days": summarize([kabko.data_days() for kabko in kabkos]),
+        "model": summarize(model_times),
+        "objective": summarize(objective_times)
+    }
@@ -0,0 +1,24 @@
+import matplotlib.pyplot as plt
+from ..data.raw.plotting import RawDataPlotterTotal, RawDataPlotterHarian
+from .model import best_time, summarize
+from .synthetic import synthetic_province, synthetic_raw
+
+def plot_all(plotter):
+    for name in dir(plotter):
+        if name.startswith("plot_"):
+            plt.close(getattr(plotter, name)())
+    
+def bench_raw_plotters(kabkos=None, number=1, repeat=3):
+    '''
+    Every plot of RawDataPlotterTotal and RawDataPlotterHarian for every kabko, drawn without a display.
+    '''
+    plt.switch_backend("Agg")
+    kabkos = kabkos or synthetic_province()
+    ret = {}
+    for plotter_class in (RawDataPlotterTotal, RawDataPlotterHarian):
+        times = []
+        for kabko in kabkos:
+            plotter = plotter_class(synthetic_raw(kabko))
+            times.append(best_time(lambda: plot_all(plotter), number, repeat))
+        ret[plotter_class.__name__] = summarize(times)
+    return ret
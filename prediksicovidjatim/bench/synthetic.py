@@ -0,0 +1,122 @@
+import numpy as np
+from datetime import timedelta
+from .. import util, config
+from ..data.model.entities import KabkoData, DayData, RtData, ParamData
+from ..data.raw.entities import RawData
+from ..modeling import SeicrdRlcModel
+
+#init, min, max
+PARAMS = {
+    "infectious_rate": (1/5.2, 0.1, 0.5),
+    "critical_chance": (0.1, 0.01, 0.5),
+    "critical_rate": (1/7, 0.05, 0.5),
+    "recovery_rate_normal": (1/10, 0.05, 0.5),
+    "recovery_rate_critical": (1/10, 0.05, 0.5),
+    "death_chance_normal": (0.1, 0.01, 0.5),
+    "death_rate_normal": (1/8, 0.05, 0.5),
+    "death_chance_over": (0.5, 0.1, 0.9),
+    "death_rate_over": (1/3, 0.1, 0.9),
+    "exposed_rate_over": (0.2, 0.0, 1.0),
+    "k": (0.3, 0.3, 0.3),
+    "kapasitas_rs_mul": (1, 1, 1),
+    "test_coverage_0": (0.05, 0.01, 0.2),
+    "test_coverage_increase": (0.001, 0.0, 0.01),
+    "test_coverage_max": (0.3, 0.1, 0.9),
+    #the older models' own params, so any of the models can be fit on synthetic kabko
+    "incubation_period": (5, 2, 14),
+    "recovery_time": (14, 7, 21),
+    "death_chance": (0.03, 0.005, 0.2),
+    "death_time": (10, 3, 21),
+    "critical_time": (6, 2, 14),
+    "recovery_time_normal": (14, 7, 21),
+    "recovery_time_critical": (14, 7, 28),
+    "death_time_normal": (10, 3, 21),
+    "death_time_over": (4, 1, 10),
+    "exposed_rate_critical": (0.1, 0.0, 1.0)
+}
+
+def synthetic_kabko(kabko="bench", days=300, population=1000000, rt_count=5, kapasitas_count=3, noise=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    oldest_tanggal = util.parse_date(config.FIRST_TANGGAL)
+    
+    params = [ParamData(k, init, min, max, 0 if min == max else 1) for k, (init, min, max) in PARAMS.items()]
+    
+    rt_days = [0] + [int(d) + int(rng.integers(-5, 5)) for d in np.linspace(0, days, rt_count+1)[1:-1]]
+    rt_values = [3.0] + rng.uniform(0.8, 1.4, rt_count-1).tolist()
+    rt = [RtData(util.shift_date(oldest_tanggal, d), r, 0.3, 5) for d, r in zip(rt_days, rt_values)]
+    
+    #stepped and low enough that critical crosses it
+    kapasitas_days = [0] + sorted(rng.choice(np.arange(20, days-20), kapasitas_count-1, replace=False).tolist())
+    kapasitas = np.cumsum(rng.integers(20, 60, kapasitas_count)).tolist()
+    kapasitas_rs = [(util.shift_date(oldest_tanggal, d), k) for d, k in zip(kapasitas_days, kapasitas)]
+    
+    data = [DayData(util.shift_date(oldest_tanggal, i), 0, 0, 0, 0, 0, 0) for i in range(days)]
+    ret = KabkoData(kabko, kabko, population, 0, oldest_tanggal, 1, 0, data, kapasitas_rs, rt, params)
+    
+    #the data is the model itself at init values, plus noise
+    result = SeicrdRlcModel(ret).model(**synthetic_values(ret, days))
+    noisy = lambda arr: np.clip(arr * (1 + noise * rng.standard_normal(days)), 0, None).astype(int)
+    critical_cared = noisy(result.critical_cared_scaled())
+    infectious = noisy(result.infectious_scaled())
+    recovered = noisy(result.recovered_scaled())
+    dead = noisy(result.dead_scaled())
+    for i, d in enumerate(data):
+        d.critical_cared = int(critical_cared[i])
+        d.infectious = int(infectious[i])
+        d.infectious_all = d.infectious + d.critical_cared
+        d.recovered = int(recovered[i])
+        d.dead = int(dead[i])
+        d.infected = d.infectious_all + d.recovered + d.dead
+    ret.set_data(data)
+    return ret
+    
+def synthetic_province(count=38, min_days=200, max_days=400, seed=0):
+    '''
+    count kabko like the province's, each with its own length, population, Rt breakpoints and kapasitas_rs steps.
+    '''
+    rng = np.random.default_rng(seed)
+    ret = []
+    for i in range(0, count):
+        ret.append(synthetic_kabko(
+            "bench_%02d" % (i,),
+            days=int(rng.integers(min_days, max_days+1)),
+            population=int(rng.integers(200000, 3000000)),
+            rt_count=int(rng.integers(3, 8)),
+            kapasitas_count=int(rng.integers(2, 5)),
+            seed=int(rng.integers(2**31))
+        ))
+    return ret
+    
+def synthetic_raw(kabko):
+    '''
+    RawData of the kabko for the raw plotters. Positif follows its data, ODP and PDP are made up in proportion.
+    '''
+    ret = []
+    for d in kabko.data:
+        rumah = d.infectious // 2
+        gedung = d.infectious - rumah
+        sub = lambda mul: {
+            "total": d.infected * mul,
+            "meninggal": d.dead * mul // 4,
+            "dirawat": d.infectious_all * mul,
+            "rumah": rumah * mul,
+            "gedung": gedung * mul,
+            "rs": d.critical_cared * mul
+        }
+        odp = sub(4)
+        odp["belum_dipantau"] = odp["total"] // 10
+        odp["selesai_dipantau"] = d.recovered * 4
+        pdp = sub(2)
+        pdp["belum_diawasi"] = pdp["total"] // 10
+        pdp["sehat"] = d.recovered * 2
+        positif = sub(1)
+        positif["meninggal"] = d.dead
+        positif["sembuh"] = d.recovered
+        ret.append(RawData(kabko.kabko, d.tanggal, d.infected * 8, d.infected * 6, odp, pdp, positif))
+    return ret
+    
+def synthetic_values(kabko, days=None):
+    ret = kabko.get_params_init(outbreak_shift=0)
+    if days is not None:
+        ret["days"] = days
+    return ret
@@ -1,6 +1,3 @@
-import matplotlib
-import matplotlib.pyplot as plt
-
 FONT_SMALL = 12
 FONT_MEDIUM = 14
 FONT_BIG = 16
@@ -10,6 +7,22 @@ LINE_WIDTH = 2
 FLOAT_TOLERANCE=1e-7
 FIRST_TANGGAL = "2020-03-20"
 PREDICT_DAYS = 30
+RT_TABLE_RESOLUTION = 16
+ENSEMBLE_STEPS_PER_DAY = 4
+ENSEMBLE_CHUNK_SIZE = 256
+ENSEMBLE_PERCENTILE_BINS = 2048
+MODEL_CACHE_SIZE = 64
+MODEL_CHECKPOINT_COUNT = 8
+#None for one per cpu
+BATCH_FIT_PROCESSES = None
+#"lhs" or "sobol"
+MULTISTART_SAMPLER = "lhs"
+MULTISTART_NFEV = 200
+MULTISTART_KEEP = 2
+#share of fit(max_time=...) left to the final fit, the folds and multi-start stop before it
+FIT_BUDGET_RESERVE = 0.25
+#leastsq ftol with the sensitivity jacobian; at lmfit's 1.5e-8 it keeps taking steps of <1e-6 chi-square for thousands of iterations
+SENSITIVITY_FTOL = 1e-6
 
 def init_plot(font_small=None, font_medium=None, font_big=None, fig_size=None, line_width=None):
     global FONT_SMALL
@@ -24,6 +37,7 @@ def init_plot(font_small=None, font_medium=None, font_big=None, fig_size=None, l
     fig_size = fig_size or FIG_SIZE
     line_width = line_width or LINE_WIDTH
     
+    import matplotlib.pyplot as plt
     plt.rc('font', size=font_small)          # controls default text sizes
     plt.rc('axes', titlesize=font_small)     # fontsize of the axes title
     plt.rc('axes', labelsize=font_medium)    # fontsize of the x and y labels
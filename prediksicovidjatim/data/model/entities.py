@@ -1,9 +1,7 @@
-from ... import util, database
+from ... import util
 from itertools import accumulate
 import numpy as np
-from ...modeling import SeicrdRlcModel, SeicrdRlExtModel, SeicrdRlModel, SeicrdRModel, SeicrdModel, SeirdModel, BaseModel
 import math
-from lmfit import Model, Parameters
         
 class KabkoData:
     def __init__(self, kabko, text, population, outbreak_shift, first_positive, seed, scored, data, kapasitas_rs, rt, params):
@@ -22,6 +20,15 @@ class KabkoData:
         
         self._kapasitas_rs = [(self.get_date_index(tanggal), kapasitas) for tanggal, kapasitas in kapasitas_rs]
         
+    def save_snapshot(self, path):
+        from .snapshot import save_snapshot
+        save_snapshot(self, path)
+        
+    def load_snapshot(path):
+        #KabkoData.load_snapshot(path), see snapshot.py
+        from .snapshot import load_snapshot
+        return load_snapshot(path)
+        
     def set_params(self, params):
         #self._params = params
         self.params = {p.parameter:p for p in params}
@@ -143,6 +150,22 @@ class KabkoData:
                 break
         return ret
         
+    def kapasitas_rs_table(self, length):
+        #same steps kapasitas_rs walks through, laid out per day
+        smallest_day = -1
+        steps = []
+        for day, kapasitas in self._kapasitas_rs:
+            if smallest_day < day:
+                smallest_day = day
+                steps.append((day, kapasitas))
+            else:
+                break
+        length = max(int(length), smallest_day+1)
+        ret = np.full(length, float("inf"))
+        for day, kapasitas in steps:
+            ret[day:] = kapasitas
+        return ret
+        
     def rt(self, rt_data, t):
         smallest_day = -1
         ret = 1
@@ -161,7 +184,28 @@ class KabkoData:
         rt = r0 + sum(logs)
         return rt
         
+    def logistic_rt_array(self, r0, rt_delta, t, k=None):
+        if k is None:
+            k = self.params["k"].init
+        t = np.asarray(t, dtype=float)
+        rt = np.full(t.shape, float(r0))
+        for day, delta in rt_delta:
+            rt += delta / (1 + np.exp(k*(-t+day)))
+        return rt
+        
+    def logistic_rt_slope_array(self, rt_delta, t, k=None):
+        if k is None:
+            k = self.params["k"].init
+        t = np.asarray(t, dtype=float)
+        slope = np.zeros(t.shape)
+        for day, delta in rt_delta:
+            logistic = 1 / (1 + np.exp(k*(-t+day)))
+            slope += delta * k * logistic * (1-logistic)
+        return slope
+        
     def get_params_needed(option):
+        #the models and lmfit are imported here, so loading kabko data doesn't import them
+        from ...modeling import SeicrdRlcModel, SeicrdRlExtModel, SeicrdRlModel, SeicrdRModel, SeicrdModel, SeirdModel
         params_needed = None
         if option == "seicrd_rlc":
             params_needed = SeicrdRlcModel.params
@@ -204,6 +248,7 @@ class KabkoData:
         return ret
         
     def apply_params(self, mod, option="seicrd_rlc"):
+        from lmfit import Model, Parameters
         if isinstance(mod, Model):
             f = mod.set_param_hint
         elif isinstance(mod, Parameters):
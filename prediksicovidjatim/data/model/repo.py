@@ -1,7 +1,6 @@
 from ... import util, database
 from ..model.entities import KabkoData, DayData, ParamData, RtData
 from ..raw.repo import fetch_kabko, fetch_kabko_dict, get_latest_tanggal, get_oldest_tanggal
-from ...modeling import BaseModel
 
 
 def fetch_kabko_need_fitting(tanggal, cur=None):
@@ -295,6 +294,8 @@ def _init_weights(cur):
     """)
     
     weights = dict(cur.fetchall())
+    #imported here so loading kabko data doesn't import the models
+    from ...modeling import BaseModel
     BaseModel.dataset_weights = weights
     
 def save_fitting_result(fit_result, tanggal=None, option="seicrd_rlc", cur=None):
@@ -0,0 +1,134 @@
+import os
+import json
+import functools
+from datetime import date
+import numpy as np
+from ... import util, database
+from .entities import KabkoData, DayData, RtData, ParamData
+from .repo import get_kabko_full
+from ..raw.repo import fetch_kabko
+
+SNAPSHOT_VERSION = 1
+DAY_FIELDS = ["infected", "infectious", "critical_cared", "infectious_all", "recovered", "dead"]
+
+def _ordinals(dates):
+    return np.array([d.toordinal() for d in dates], dtype=np.int32)
+
+def _dates(ordinals):
+    return [date.fromordinal(int(x)) for x in ordinals]
+
+def _floats(values):
+    #None is kept as nan
+    return np.array([np.nan if v is None else float(v) for v in values], dtype=float)
+
+def _optional(value):
+    value = float(value)
+    return None if np.isnan(value) else value
+
+def save_snapshot(kabko_data, path):
+    '''
+    Writes what get_kabko_full reads for the kabko into an .npz:
+    the per day, kapasitas_rs, rt and param columns as arrays, and the rest as a small JSON header.
+    '''
+    params = list(kabko_data.params.values())
+    #KabkoData keeps kapasitas_rs by day index, which maps back to the same dates
+    kapasitas_rs = [(util.shift_date(kabko_data.oldest_tanggal, day), kapasitas) for day, kapasitas in kabko_data._kapasitas_rs]
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "kabko": kabko_data.kabko,
+        "text": kabko_data.text,
+        "population": int(kabko_data.population),
+        "outbreak_shift": int(kabko_data.last_outbreak_shift),
+        "first_positive": kabko_data.first_positive.toordinal(),
+        "seed": int(kabko_data.seed),
+        "scored": 1 if kabko_data.scored else 0,
+        "param_names": [p.parameter for p in params],
+        "param_exprs": [p.expr for p in params]
+    }
+    arrays = {
+        "tanggal": _ordinals([d.tanggal for d in kabko_data.data]),
+        "kapasitas_rs_tanggal": _ordinals([tanggal for tanggal, kapasitas in kapasitas_rs]),
+        "kapasitas_rs": np.array([kapasitas for tanggal, kapasitas in kapasitas_rs], dtype=float),
+        "rt_tanggal": _ordinals([rt.tanggal for rt in kabko_data._rt_0]),
+        "param_vary": np.array([p.vary for p in params], dtype=bool)
+    }
+    for f in DAY_FIELDS:
+        arrays[f] = np.array([getattr(d, f) for d in kabko_data.data], dtype=np.int64)
+    for f in ("init", "min", "max", "stderr"):
+        arrays["rt_" + f] = _floats([getattr(rt, f) for rt in kabko_data._rt_0])
+        arrays["param_" + f] = _floats([getattr(p, f) for p in params])
+    np.savez_compressed(path, header=np.array(json.dumps(header)), **arrays)
+
+def load_snapshot(path):
+    with np.load(path, allow_pickle=False) as f:
+        header = json.loads(str(f["header"]))
+        if header["version"] > SNAPSHOT_VERSION:
+            raise Exception("Snapshot %s is version %d, only up to %d is supported" % (path, header["version"], SNAPSHOT_VERSION))
+        days = [f[k].tolist() for k in DAY_FIELDS]
+        data = [DayData(tanggal, *day) for tanggal, *day in zip(_dates(f["tanggal"]), *days)]
+        kapasitas_rs = list(zip(_dates(f["kapasitas_rs_tanggal"]), f["kapasitas_rs"].tolist()))
+        rt = [
+            RtData(tanggal, _optional(init), _optional(min), _optional(max), _optional(stderr))
+            for tanggal, init, min, max, stderr
+            in zip(_dates(f["rt_tanggal"]), f["rt_init"], f["rt_min"], f["rt_max"], f["rt_stderr"])
+        ]
+        params = [
+            ParamData(name, _optional(init), _optional(min), _optional(max), bool(vary), expr, _optional(stderr))
+            for name, expr, init, min, max, vary, stderr
+            in zip(header["param_names"], header["param_exprs"], f["param_init"], f["param_min"], f["param_max"], f["param_vary"], f["param_stderr"])
+        ]
+    return KabkoData(
+        header["kabko"],
+        header["text"],
+        header["population"],
+        header["outbreak_shift"],
+        date.fromordinal(header["first_positive"]),
+        header["seed"],
+        header["scored"],
+        data,
+        kapasitas_rs,
+        rt,
+        params
+    )
+
+def snapshot_path(directory, kabko):
+    return os.path.join(directory, "%s.npz" % (kabko,))
+
+def load_kabko_snapshot(directory, kabko):
+    return load_snapshot(snapshot_path(directory, kabko))
+
+def snapshot_loader(directory):
+    '''
+    load(kabko) reading the kabko from its snapshot in directory, e.g. for BatchFitter's load.
+    '''
+    return functools.partial(load_kabko_snapshot, directory)
+
+def export_snapshots(directory, kabkos=None, cur=None):
+    '''
+    Snapshots every kabko (or the given ones) into directory, on one database connection.
+    Returns the written paths.
+    '''
+    if cur:
+        return _export_snapshots(directory, kabkos, cur)
+    else:
+        with database.get_conn() as conn, conn.cursor() as cur:
+            return _export_snapshots(directory, kabkos, cur)
+            
+def _export_snapshots(directory, kabkos, cur):
+    os.makedirs(directory, exist_ok=True)
+    if kabkos is None:
+        kabkos = fetch_kabko(cur)
+    ret = []
+    for kabko in kabkos:
+        path = snapshot_path(directory, kabko)
+        save_snapshot(get_kabko_full(kabko, cur), path)
+        ret.append(path)
+    return ret
+
+def load_snapshots(directory, kabkos=None):
+    '''
+    The KabkoData of every snapshot in directory (or of the given kabko), without the database.
+    '''
+    if kabkos is None:
+        kabkos = sorted(f[:-len(".npz")] for f in os.listdir(directory) if f.endswith(".npz"))
+    return [load_kabko_snapshot(directory, kabko) for kabko in kabkos]
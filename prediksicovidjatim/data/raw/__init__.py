@@ -1,2 +1,8 @@
 from . import repo as RawDataRepo
-from .scrapper import Scrapper
+
+def __getattr__(name):
+    #the scrapper pulls in requests_html and pyppeteer, so it's only imported for scrapping
+    if name == "Scrapper":
+        from .scrapper import Scrapper
+        return Scrapper
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -1,16 +1,56 @@
 import os
+import functools
 import psycopg2
+import psycopg2.extensions
 import psycopg2.pool
 from psycopg2.extras import DictCursor, execute_batch
 from contextlib import contextmanager
 from dotenv import load_dotenv
 from threading import Semaphore
+from . import instrumentation
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 singleton = None
 
+class TimedCursorMixin:
+    #the time spent in queries, fetches and commits is the "db" counter of the instrumentation, see TimedConnection
+    def execute(self, *args, **kwargs):
+        with instrumentation.timed("db"):
+            return super().execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        with instrumentation.timed("db"):
+            return super().executemany(*args, **kwargs)
+
+    def callproc(self, *args, **kwargs):
+        with instrumentation.timed("db"):
+            return super().callproc(*args, **kwargs)
+
+    def fetchone(self):
+        with instrumentation.timed("db"):
+            return super().fetchone()
+
+    def fetchmany(self, *args, **kwargs):
+        with instrumentation.timed("db"):
+            return super().fetchmany(*args, **kwargs)
+
+    def fetchall(self):
+        with instrumentation.timed("db"):
+            return super().fetchall()
+
+@functools.lru_cache(maxsize=None)
+def timed_cursor(cursor_factory):
+    #the cursor_factory class with its queries timed
+    return type("Timed" + cursor_factory.__name__, (TimedCursorMixin, cursor_factory), {})
+
+class TimedConnection(psycopg2.extensions.connection):
+    #the pool's connections, their cursors time their queries whatever cursor_factory they're made with
+    def cursor(self, *args, cursor_factory=None, **kwargs):
+        cursor_factory = cursor_factory or self.cursor_factory or psycopg2.extensions.cursor
+        return super().cursor(*args, cursor_factory=timed_cursor(cursor_factory), **kwargs)
+
 class Database:
     
     def __init__(self, url=None, min=0, max=10):
@@ -18,7 +58,7 @@ class Database:
     
     def init(self, url=None, min=0, max=10):
         self.db_url = url or DATABASE_URL
-        self.conn_pool = psycopg2.pool.ThreadedConnectionPool(min, max, self.db_url)
+        self.conn_pool = psycopg2.pool.ThreadedConnectionPool(min, max, self.db_url, connection_factory=TimedConnection)
         self._semaphore = Semaphore(max)
         
     @contextmanager
@@ -32,7 +72,9 @@ class Database:
                 yield conn
             '''
             yield conn
-            conn.commit()
+            #the commit is a round trip of its own
+            with instrumentation.timed("db"):
+                conn.commit()
         except:
             raise
         finally:
@@ -0,0 +1,128 @@
+import time
+import json
+import functools
+from threading import Lock
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+#the recording fits and database calls add to, None while instrumentation is off.
+#per context, so fits in different threads each keep their own, see submit for executors
+current = ContextVar("instrumentation", default=None)
+
+class Instrumentation:
+    def __init__(self):
+        '''
+        Count and total seconds per name, e.g. "rhs", "integration", "objective", "uncertainty", "db".
+        '''
+        self.counters = {}
+        self.start = time.perf_counter()
+        self._lock = Lock()
+
+    def add(self, name, seconds, count=1):
+        with self._lock:
+            counter = self.counters.get(name)
+            if counter is None:
+                self.counters[name] = [count, seconds]
+            else:
+                counter[0] += count
+                counter[1] += seconds
+
+    def as_dict(self):
+        with self._lock:
+            ret = {name: {"count": count, "time": seconds} for name, (count, seconds) in self.counters.items()}
+        ret["wall_time"] = time.perf_counter() - self.start
+        return ret
+
+    def to_json(self):
+        return json.dumps(self.as_dict())
+
+    def __getstate__(self):
+        ret = dict(self.__dict__)
+        del ret["_lock"]
+        return ret
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = Lock()
+
+@contextmanager
+def recording(instrumentation=None):
+    '''
+    Makes instrumentation (a new one by default) the current one for the block, and yields it.
+    '''
+    instrumentation = instrumentation or Instrumentation()
+    token = current.set(instrumentation)
+    try:
+        yield instrumentation
+    finally:
+        current.reset(token)
+
+def _recorded(instrumentation, f, *args, **kwargs):
+    with recording(instrumentation):
+        return f(*args, **kwargs)
+
+def submit(executor, f, *args, **kwargs):
+    '''
+    executor.submit(f, *args, **kwargs), recorded on the current instrumentation.
+    Executor threads don't inherit it, and in a process executor the copy's counts are lost.
+    '''
+    instrumentation = current.get()
+    if instrumentation is None:
+        return executor.submit(f, *args, **kwargs)
+    return executor.submit(_recorded, instrumentation, f, *args, **kwargs)
+
+class timed:
+    '''
+    with timed("name"): adds the block to the current instrumentation, if any.
+    Only a context variable lookup when instrumentation is off.
+    '''
+    __slots__ = ("name", "instrumentation", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.instrumentation = current.get()
+        if self.instrumentation is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.instrumentation is not None:
+            self.instrumentation.add(self.name, time.perf_counter() - self.start)
+        return False
+
+def timed_function(name, f):
+    '''
+    f, counted and timed under name in the current instrumentation.
+    Returns f itself when instrumentation is off, so callbacks like the ode rhs cost nothing extra then.
+    '''
+    instrumentation = current.get()
+    if instrumentation is None:
+        return f
+    perf_counter = time.perf_counter
+    def wrapper(*args):
+        start = perf_counter()
+        ret = f(*args)
+        instrumentation.add(name, perf_counter() - start)
+        return ret
+    return wrapper
+
+def instrumented(fit):
+    '''
+    For fit methods taking instrument=False.
+    With instrument=True the fit is recorded on its own instrumentation,
+    inside recording() it adds to the current one.
+    Either way the returned result gets its as_dict() as instrumentation.
+    With a process executor only the parent process' work is recorded.
+    '''
+    @functools.wraps(fit)
+    def wrapper(*args, **kwargs):
+        active = current.get()
+        if active is None and not kwargs.get("instrument"):
+            return fit(*args, **kwargs)
+        with recording(active) as instrumentation:
+            ret = fit(*args, **kwargs)
+        ret.instrumentation = instrumentation.as_dict()
+        return ret
+    return wrapper
@@ -2,7 +2,7 @@ from arcgis.gis import GIS
 from arcgis.features.feature import Feature
 import os
 from .. import util
-from ..util import ThreadPool, lprofile
+from ..util import ThreadPool
 '''
 from dotenv import load_dotenv
 load_dotenv()
@@ -13,8 +13,6 @@ ARCGIS_USER = os.getenv("ARCGIS_USER")
 ARCGIS_PASS = os.getenv("ARCGIS_PASS")
 ARCGIS_PORTAL = os.getenv("ARCGIS_PORTAL")
 '''
-from memory_profiler import profile as mprofile
-
 import gc
 
 GEOMETRY_CACHE = {}
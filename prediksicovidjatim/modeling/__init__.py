@@ -5,4 +5,9 @@ from .seicrd_r import SeicrdRModel
 from .seicrd_rl import SeicrdRlModel
 from .seicrd_rl_ext import SeicrdRlExtModel
 from .seicrd_rlc import SeicrdRlcModel
-from .base_model import BaseModel
\ No newline at end of file
+from .base_model import BaseModel
+from .graph import CompartmentGraph, Flow, Capacity, GraphResult
+from .cache import ModelCache, ModelCheckpoints
+from .ensemble import StreamingPercentiles
+from .budget import FitBudget
+from .batch import BatchFitter
\ No newline at end of file
@@ -1,8 +1,13 @@
 import numpy as np
+from scipy import special
+import warnings
 import lmfit
-from .. import util
+from .. import util, config, instrumentation
 from .fitting_result import FittingResult, BaseScorer
+from .budget import FitBudget
+from .graph import GraphResult
 import math
+import copy
 
 class BaseModel:
     available_datasets = ["infectious", "critical_cared", "infectious_all", "recovered", "dead", "infected"]
@@ -13,46 +18,140 @@ class BaseModel:
         "recovered": 2.125,
         "dead": 2.125
     }
+    #the params option of KabkoData.apply_params
+    option = "seicrd_rlc"
+    #the CompartmentGraph of the model, and the series of its GraphResult each dataset reads, for integrate
+    graph = None
+    dataset_series = None
+    #model() takes state=(t0, y0) and history= to continue a trajectory, see FittingResult.predict
+    continues = False
+    #people exposed at day 0 for integrate, None for the kabko's seed; the models before SeicrdRlcModel start from one
+    initial_exposed = 1
+    
     def __init__(self, kabko):
         self.kabko = kabko
-        self.last_result_full = None
-        self.last_result = None
-        self.last_result_flat = None
         self.datasets = ["critical_cared", "infectious_all", "recovered", "dead"]
         
     def use_datasets(self, datasets):
         for dataset in datasets:
-            if dataset not in BaseModel.available_datasets:
+            if dataset not in self.available_datasets:
                 raise ValueError("Invalid dataset: " + str(dataset))
         self.datasets = datasets
         
     def mortality_rate(self, t, exposed, dead, infectious_rate):
-        return np.array([0] + [100 * dead[i] / sum(infectious_rate*exposed[:i]) if sum(infectious_rate*exposed[:i])>0 else 0 for i in range(1, len(t))])
+        #infected up to (not including) each day, cumsum adds in the same order as sum() did
+        infected = np.cumsum(infectious_rate*np.asarray(exposed))
+        infected = np.concatenate(([0], infected[:len(t)-1]))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ret = np.where(infected > 0, 100 * np.asarray(dead) / infected, 0)
+        ret[0] = 0
+        return ret
+        
+    def incubation_period_init(self):
+        #initial days from exposed to infectious, for the outbreak shift
+        return 1.0/self.kabko.params["infectious_rate"].init
+        
+    def logistic_rt(self, kwargs, k):
+        #Rt over t from the r_i in kwargs, t may be an array
+        rt_values = self.kabko.get_kwargs_rt(kwargs)
+        rt_delta = self.kabko.get_rt_delta(rt_values)
+        r_0 = rt_values[0]
+        def logistic_rt(t):
+            return self.kabko.logistic_rt(r_0, rt_delta, t, k)
+        return logistic_rt
+        
+    def check_continuation(self, kwargs):
+        #models that don't continue would integrate from the seed and silently drop state
+        if not self.continues and ("state" in kwargs or "history" in kwargs):
+            raise ValueError("%s can't continue from a state" % type(self).__name__)
+        
+    def integrate(self, days, values, varying={}, kapasitas_rs=None, sanity_check_mode=util.SANITY_CHECK_CORRECT, extra={}):
+        '''
+        Integrates the model's graph over days from initial_exposed people exposed,
+        values and varying as in CompartmentGraph.rhs, kapasitas_rs as a per day table if the graph has a Capacity.
+        Returns a GraphResult with the datasets in dataset_series.
+        '''
+        days = int(days)
+        population = self.kabko.population
+        t = np.linspace(0, days-1, days)
+        capacity = None
+        capacity_val = np.inf
+        if kapasitas_rs is not None:
+            kapasitas_rs_list = list(kapasitas_rs)
+            kapasitas_rs_last = len(kapasitas_rs_list) - 1
+            def capacity(t):
+                return kapasitas_rs_list[min(int(t), kapasitas_rs_last)]
+            capacity_val = np.asarray(kapasitas_rs, dtype=float)[np.minimum(t.astype(int), kapasitas_rs_last)]
+        y0 = self.graph.initial(population, self.kabko.seed if self.initial_exposed is None else self.initial_exposed)
+        ret = self.graph.integrate(y0, t, values, varying, capacity, population, sanity_check_mode == util.SANITY_CHECK_CORRECT)
+        return GraphResult(self.graph, t, ret.T, capacity_val, extra, self.dataset_series, sanity_check_mode)
+        
+    def fitter(self, **kwargs):
+        return self.model(**kwargs).get_datasets_values(self.datasets)
         
     def fitter_flat(self, x, **kwargs):
         results = self.fitter(**kwargs)
         
         results_flat = results.flatten()
-        self.last_result_flat = results_flat
         return results_flat[x]
         
+    def fitter_into(self, out, x, **kwargs):
+        #models without a direct path slice the full fitter output
+        pred = self.fitter(**kwargs)
+        for row, p in zip(out, pred):
+            row[:] = p[x[0]:x[1]]
+        return out
+        
     def objective(self, params, x, data):
-        pred = self.fitter(**params, sanity_check_mode=util.SANITY_CHECK_IGNORE)
-        #length = len(data[0])
-        #pred = np.array([p[:length] for p in pred])
-        pred = np.array([p[x[0]:x[1]] for p in pred])
-        obj = data - pred
-        weights = np.array([BaseModel.dataset_weights[d] for d in self.datasets])
-        obj = util.np_multiply_2d(obj, weights)
-        ret = obj.flatten()
-        return ret
+        #the returned array is kept by lmfit as the residual, so it can't be reused across calls
+        with instrumentation.timed("objective"):
+            ret = np.empty(np.shape(data))
+            self.fitter_into(ret, x, **params, sanity_check_mode=util.SANITY_CHECK_IGNORE)
+            np.subtract(data, ret, out=ret)
+            ret *= self.dataset_weights_array()[:, None]
+            return ret.ravel()
+        
+    def dataset_weights_array(self):
+        return np.array([BaseModel.dataset_weights[d] for d in self.datasets])
+        
+    def fitter_jacobian(self, names, **kwargs):
+        raise NotImplementedError("%s has no sensitivity equations" % (type(self).__name__,))
+        
+    def objective_jacobian(self, params, x, data):
+        #d(objective)/d(varying params), (residuals, params) like leastsq's Dfun with col_deriv=0
+        with instrumentation.timed("objective_jacobian"):
+            names = [k for k, p in params.items() if p.vary]
+            jac = self.fitter_jacobian(names, **params.valuesdict())
+            jac = jac[:, :, x[0]:x[1]]
+            weights = self.dataset_weights_array()
+            jac = -jac * weights[np.newaxis, :, np.newaxis]
+            return jac.reshape((len(names), -1)).T
         
     
-    def fit(self, method="leastsq", test_splits=[5,3], unvary=[], outbreak_shift=None, sigma_conf=2, sigma_pred=None, first_time=False):#, **kwargs):
+    @instrumentation.instrumented
+    def fit(self, method="leastsq", test_splits=[5,3], unvary=[], outbreak_shift=None, sigma_conf=2, sigma_pred=None, first_time=False, sensitivity=False, executor=None, starts=None, keep=None, start_nfev=None, seed=None, max_time=None, max_nfev=None, progress=None, instrument=False):#, **kwargs):
+        '''
+        sensitivity=True gives leastsq the jacobian from the forward sensitivity equations (fitter_jacobian)
+        instead of finite differencing the whole model for each param, and stops at config.SENSITIVITY_FTOL.
+        executor (a concurrent.futures thread or process pool) fits the cross validation folds concurrently.
+        The folds then all start from the same params instead of the previous fold's optimum.
+        starts > 1 fits from that many points spread over the bounds first, see _multistart,
+        and the folds and the final fit start from the best optimum found. executor runs those concurrently too.
+        max_time (seconds) limits the whole fit, with a share kept for the final fit,
+        and max_nfev every minimization in it (each fold, start and the final fit) on its own, see FitBudget.
+        progress(fold, nfev, chisqr, elapsed) is called after every evaluation,
+        the multi-start ones with fold "start i" or "finish i".
+        Once the budget is spent every minimization stops at its best values so far,
+        and the result is marked with budget_truncated.
+        instrument=True records counts and times of the rhs calls, integrations, objective
+        and uncertainty evaluations and database calls into the result's instrumentation, see instrumentation.instrumented.
+        '''
         if len([x for x in test_splits if x <= 1]) > 0:
             raise ValueError("A split must be at least 2")
         if sigma_pred is None:
             sigma_pred=sigma_conf
+        budget = FitBudget(max_time, max_nfev, progress) if (max_time or max_nfev or progress) else None
+        truncated = False
             
         params = lmfit.Parameters()
         params_f = params.add
@@ -60,17 +159,22 @@ class BaseModel:
         #mod = lmfit.Model(self.fitter_flat)
         
         outbreak_shift = outbreak_shift or self.kabko.outbreak_shift(
-            1.0/self.kabko.params["infectious_rate"].init
+            self.incubation_period_init()
         )
         
         days = self.kabko.data_days(outbreak_shift)
         
         params_f("days", value=days, vary=False)
         
-        self.kabko.apply_params(params)
+        self.kabko.apply_params(params, self.option)
         
         #params = mod.make_params()
-        mod = lmfit.Minimizer(self.objective, params, nan_policy='propagate')
+        fit_kws = {}
+        if sensitivity:
+            if method != "leastsq":
+                raise ValueError("sensitivity is only supported for leastsq")
+            fit_kws = {"Dfun": self.objective_jacobian, "col_deriv": False, "ftol": config.SENSITIVITY_FTOL}
+        mod = lmfit.Minimizer(self.objective, params, nan_policy='propagate', **fit_kws)
         
         y_data_0 = self.kabko.get_datasets_values(self.datasets, outbreak_shift)
         
@@ -94,40 +198,56 @@ class BaseModel:
         #full_index = np.linspace(0, len_y_0_0 - 1, len_y_0_0, dtype=int)
         #empty_index = np.array([], dtype=int)
         
+        best_values = None
+        if starts and starts > 1:
+            best_values, truncated = self._multistart(y_data_0, params, x_range_0, starts, keep=keep, start_nfev=start_nfev, method=method, fit_kws=fit_kws, executor=executor, seed=seed, budget=budget)
+            for k, v in best_values.items():
+                params[k].value = v
+        
         if first_time and len(test_splits) > 0:
-            fit_result = self.____fit(mod, x_range_0, y_data_0, params, days=days, method=method)#, **kwargs)
+            fit_result = self.____fit(mod, x_range_0, y_data_0, params, days=days, method=method, budget=budget, fold="first")#, **kwargs)
         
-        for i in test_splits:
-            results = self._fit(mod, y_data_0, params, util.time_series_split(y_data_0_0, i), method=method, sigma_conf=sigma_conf, sigma_pred=sigma_pred, nvarys=nvarys)#, **kwargs)
-            
-            #just mean the scores?
-            #https://medium.com/datadriveninvestor/k-fold-cross-validation-6b8518070833
-            
-            repeated_results.append(results)
+        if executor is None:
+            for i in test_splits:
+                results = self._fit(mod, y_data_0, params, util.time_series_split(y_data_0_0, i), method=method, sigma_conf=sigma_conf, sigma_pred=sigma_pred, nvarys=nvarys, budget=budget, fold=i)#, **kwargs)
+                
+                #just mean the scores?
+                #https://medium.com/datadriveninvestor/k-fold-cross-validation-6b8518070833
+                
+                repeated_results.append(results)
+        else:
+            futures = [[instrumentation.submit(executor, self._fit_split, y_data_0, params, split, method=method, sigma_conf=sigma_conf, sigma_pred=sigma_pred, nvarys=nvarys, fit_kws=fit_kws, budget=budget, fold="%d:%d" % (i, j)) for j, split in enumerate(util.time_series_split(y_data_0_0, i))] for i in test_splits]
+            #collected in submission order so the scores concatenate the same as the serial loop
+            for fs in futures:
+                results = [f.result() for f in fs]
+                repeated_results.append(BaseScorer.concatenate([scorer for scorer, values, split_truncated in results]))
+                truncated = truncated or any([split_truncated for scorer, values, split_truncated in results])
+            if len(repeated_results) > 0:
+                #the full fit starts from the last fold's optimum, like after the serial loop
+                for k, v in results[-1][1].items():
+                    params[k].value = v
         
         test_scorer = BaseScorer.concatenate(repeated_results) if len(repeated_results) > 0 else None
         
+        if best_values is not None:
+            #the folds moved params, the final fit goes back to the best of the starts
+            for k, v in best_values.items():
+                params[k].value = v
+        
         #fit_result = self.____fit(x_data_0_flat, y_data_0.flatten(), params, days=days, method=method, nvarys=nvarys)#, **kwargs)
-        fit_result = self.____fit(mod, x_range_0, y_data_0, params, days=days, method=method)#, **kwargs)
+        fit_result = self.____fit(mod, x_range_0, y_data_0, params, days=days, method=method, budget=budget, fold="full")#, **kwargs)
+        truncated = truncated or (budget is not None and budget.truncated)
         
-        for k, v in fit_result.params.items():
-            if v.stderr is None:
-                vary = v.vary and not math.isclose(v.min, v.max, abs_tol=1e-13, rel_tol=1e-13)
-                if vary:
-                    fit_result.params[k].stderr = abs(v.value * 0.1)
-                
-                else:
-                    fit_result.params[k].stderr = 0
-                
+        BaseModel.fill_stderr(fit_result.params)
         
-        #model_result = self.model(**fit_result.values)
-        pred_data_0 = self.fitter(**fit_result.values)
+        #model_result = self.model(**fit_result.params.valuesdict())
+        pred_data_0 = self.fitter(**fit_result.params.valuesdict())
         #pred_data_0 = util.np_split(fit_result.best_fit, set_count)
         #dely_conf_fit, dely_pred_fit = self._get_dely(fit_result, x_data_0_flat, set_count, sigma_conf=sigma_conf, sigma_pred=sigma_pred)
         try:
-            dely_conf_fit, dely_pred_fit = self._get_dely(mod, fit_result.params, fit_result.covar, x_range_0, set_count, sigma_conf=sigma_conf, sigma_pred=sigma_pred)
-            print("Error bar true fit")
-        except AttributeError:
+            dely_conf_fit, dely_pred_fit = self._get_dely(fit_result, x_range_0, set_count, sigma_conf=sigma_conf, sigma_pred=sigma_pred)
+        except AttributeError as e:
+            warnings.warn("No error bars for the fit, they're zero: %s" % (e,), RuntimeWarning)
             #raise Exception("Failed: %s, %s, %s, %s" % (str(len(pred_data_0[0])), str(x_range_0), str(fit_result.errorbars), str(fit_result.message)))
             dely = np.zeros(x_range_0[1]-x_range_0[0])
             dely = np.tile(dely, (set_count, 1))
@@ -136,17 +256,86 @@ class BaseModel:
         fit_scorer=BaseScorer(y_data_0, pred_data_0, dely_conf_fit, dely_pred_fit, nvarys, util.np_mean_2d(y_data_0), x=x_data_0)
         datasets = self.datasets
         
-        return FittingResult(self, fit_result, datasets, test_scorer, fit_scorer, nvarys, outbreak_shift)
+        return FittingResult(self, fit_result, datasets, test_scorer, fit_scorer, nvarys, outbreak_shift, budget_truncated=truncated)
         
-    def _fit(self, mod, y_data_0, params, splits, method="leastsq", sigma_conf=2, sigma_pred=None, nvarys=None):#, **kwargs):
+    def _fit(self, mod, y_data_0, params, splits, method="leastsq", sigma_conf=2, sigma_pred=None, nvarys=None, budget=None, fold=None):#, **kwargs):
         results = []
-        for split in splits:
-            result = self.__fit(mod, y_data_0, params, split, method=method, sigma_conf=sigma_conf, sigma_pred=sigma_pred, nvarys=nvarys)#, **kwargs)
+        for j, split in enumerate(splits):
+            result = self.__fit(mod, y_data_0, params, split, method=method, sigma_conf=sigma_conf, sigma_pred=sigma_pred, nvarys=nvarys, budget=budget, fold="%s:%d" % (fold, j))#, **kwargs)
             results.append(result)
             
         return BaseScorer.concatenate(results)
         
-    def __fit(self, mod, y_data_0, params, split, method="leastsq", sigma_conf=2, sigma_pred=None, nvarys=None):#, **kwargs):
+    def _fit_split(self, y_data_0, params, split, method="leastsq", sigma_conf=2, sigma_pred=None, nvarys=None, fit_kws={}, budget=None, fold=None):
+        #one fold on its own minimizer and params, for executors
+        params = copy.deepcopy(params)
+        mod = lmfit.Minimizer(self.objective, params, nan_policy='propagate', **fit_kws)
+        result = self.__fit(mod, y_data_0, params, split, method=method, sigma_conf=sigma_conf, sigma_pred=sigma_pred, nvarys=nvarys, budget=budget, fold=fold)
+        return result, params.valuesdict(), budget is not None and budget.truncated
+        
+    def start_values(self, params, starts, seed=None, sampler=None):
+        '''
+        The current values of params followed by starts-1 points spread over the bounds of the varying ones,
+        by latin hypercube or sobol sampling (config.MULTISTART_SAMPLER).
+        '''
+        from scipy.stats import qmc
+        names = [k for k, p in params.items() if p.vary and not p.expr]
+        lower = np.array([params[k].min for k in names])
+        upper = np.array([params[k].max for k in names])
+        sampler = sampler or config.MULTISTART_SAMPLER
+        if sampler == "lhs":
+            sampler = qmc.LatinHypercube(d=len(names), seed=seed)
+        elif sampler == "sobol":
+            sampler = qmc.Sobol(d=len(names), seed=seed)
+        else:
+            raise ValueError("Invalid sampler: " + str(sampler))
+        with warnings.catch_warnings():
+            #sobol prefers powers of 2
+            warnings.simplefilter("ignore")
+            points = qmc.scale(sampler.random(starts-1), lower, upper)
+        values = params.valuesdict()
+        return [{k: values[k] for k in names}] + [dict(zip(names, point)) for point in points]
+        
+    def _multistart(self, y_data_0, params, x_range, starts, keep=None, start_nfev=None, method="leastsq", fit_kws={}, executor=None, seed=None, budget=None):
+        '''
+        Fits from each of start_values for only start_nfev evaluations,
+        then finishes the keep best of them to convergence.
+        Returns the values of the best optimum and whether the budget cut it short.
+        '''
+        keep = keep or config.MULTISTART_KEEP
+        start_nfev = start_nfev or config.MULTISTART_NFEV
+        
+        def run(stage, values, max_nfev):
+            folds = ["%s %d" % (stage, i) for i in range(0, len(values))]
+            if executor is None:
+                return [self._fit_start(y_data_0, params, v, x_range, method=method, max_nfev=max_nfev, fit_kws=fit_kws, budget=budget, fold=fold) for v, fold in zip(values, folds)]
+            futures = [instrumentation.submit(executor, self._fit_start, y_data_0, params, v, x_range, method=method, max_nfev=max_nfev, fit_kws=fit_kws, budget=budget, fold=fold) for v, fold in zip(values, folds)]
+            return [f.result() for f in futures]
+        
+        screened = run("start", self.start_values(params, starts, seed=seed), start_nfev)
+        screened.sort(key=lambda r: r[0])
+        finished = run("finish", [values for chisqr, values, truncated in screened[:keep]], None)
+        chisqr, values, truncated = min(finished, key=lambda r: r[0])
+        truncated = any([r[2] for r in screened + finished])
+        return values, truncated
+        
+    def _fit_start(self, y_data_0, params, values, x_range, method="leastsq", max_nfev=None, fit_kws={}, budget=None, fold=None):
+        #one multi-start candidate on its own minimizer and params, for executors
+        params = copy.deepcopy(params)
+        for k, v in values.items():
+            params[k].value = v
+        mod = lmfit.Minimizer(self.objective, params, nan_policy='propagate', max_nfev=max_nfev, **fit_kws)
+        fit_result = self.____fit(mod, x_range, y_data_0, params, method=method, budget=budget, fold=fold)
+        if budget is not None and fold in budget.best and fit_result.aborted:
+            chisqr = budget.best[fold][0]
+        else:
+            chisqr = float(np.sum(np.square(fit_result.residual)))
+        #a start that blew up ranks last
+        if not math.isfinite(chisqr):
+            chisqr = math.inf
+        return chisqr, {k: params[k].value for k in values}, budget is not None and budget.truncated
+        
+    def __fit(self, mod, y_data_0, params, split, method="leastsq", sigma_conf=2, sigma_pred=None, nvarys=None, budget=None, fold=None):#, **kwargs):
         
         tr_index, ts_index = split
         
@@ -170,20 +359,21 @@ class BaseModel:
         x_range_test = ts_index[0], ts_index[-1]+1
         
         #fit_result = self.____fit(x_data_train.flatten(), y_data_train.flatten(), params, days=days, method=method)#, **kwargs)
-        fit_result = self.____fit(mod, x_range_train, y_data_train, params, days=days, method=method)#, **kwargs)
+        fit_result = self.____fit(mod, x_range_train, y_data_train, params, days=days, method=method, budget=budget, fold=fold)#, **kwargs)
+        BaseModel.fill_stderr(fit_result.params)
         
         #test_result = mod.eval(fit_result.params, x=x_data_test_flat)
         #test_result = fit_result.eval(fit_result.params, method=method, x=x_range_test)
         
         #values = {k:v.value for k, v in fit_result.params.items()}
-        #pred_data_test = [pred[ts_index] for pred in self.fitter(**fit_result.values)]
+        #pred_data_test = [pred[ts_index] for pred in self.fitter(**fit_result.params.valuesdict())]
         #pred_data_test = util.np_split(test_result, set_count)
-        pred_data_test = [pred[x_range_test[0]:x_range_test[1]] for pred in self.fitter(**fit_result.values)]
+        pred_data_test = [pred[x_range_test[0]:x_range_test[1]] for pred in self.fitter(**fit_result.params.valuesdict())]
         
         try:
-            dely_conf_test, dely_pred_test = self._get_dely(mod, fit_result.params, fit_result.covar, x_range_test, set_count, sigma_conf=sigma_conf, sigma_pred=sigma_pred)
-            print("Error bar true")
-        except AttributeError:
+            dely_conf_test, dely_pred_test = self._get_dely(fit_result, x_range_test, set_count, sigma_conf=sigma_conf, sigma_pred=sigma_pred)
+        except AttributeError as e:
+            warnings.warn("No error bars for fold %s, they're zero: %s" % (fold, e), RuntimeWarning)
             #raise Exception("Failed: %s, %s, %s, %s" % (str(len(fit_result.residual)/4), str(x_range_train), str(fit_result.errorbars), str(fit_result.message)))
             dely = np.zeros(x_range_test[1]-x_range_test[0])
             dely = np.tile(dely, (set_count, 1))
@@ -202,16 +392,72 @@ class BaseModel:
         dely_pred = fit_result.eval_uncertainty(x=x_data, sigma=sigma_pred, predict=True)
         return util.np_split(dely_conf, set_count), util.np_split(dely_pred, set_count)
     '''
-    def _get_dely(self, minimizer, params, covar, x_data, set_count, sigma_conf=2, sigma_pred=None):
+    def _get_dely(self, fit_result, x_range, set_count, sigma_conf=2, sigma_pred=None):
+        '''
+        Confidence and prediction bands over x_range, from the covariance at the optimum.
+        Both bands share one jacobian of the fitter, see uncertainty_jacobian.
+        '''
         if sigma_pred is None:
             sigma_pred=sigma_conf
-        with util.lmfit_lock:
-            dely_conf = minimizer.eval_uncertainty(params, covar, x=x_data, sigma=sigma_conf)
-            dely_pred = minimizer.eval_uncertainty(params, covar, x=x_data, sigma=sigma_pred, predict=True)
-            return util.np_split(dely_conf, set_count), util.np_split(dely_pred, set_count)
+        shape = (set_count, x_range[1]-x_range[0])
+        names = fit_result.var_names
+        if len(names) == 0:
+            return np.zeros(shape), np.zeros(shape)
+        covar = fit_result.covar
+        if covar is None:
+            #lmfit has no covariance when the fit was stopped or the jacobian singular, the stderr of fill_stderr taken as uncorrelated
+            covar = np.diag([(fit_result.params[n].stderr or 0)**2 for n in names])
+        with instrumentation.timed("uncertainty"):
+            jac = self.uncertainty_jacobian(fit_result.params, names)
+            jac = jac[:, :, x_range[0]:x_range[1]].reshape((len(names), -1))
+            df2 = np.einsum("in,ij,jn->n", jac, covar, jac)
+            dof = fit_result.ndata - fit_result.nvarys
+            dely_conf = BaseModel.uncertainty_scale(sigma_conf, dof) * np.sqrt(df2)
+            #the prediction band adds the noise, as reduced chi square
+            dely_pred = BaseModel.uncertainty_scale(sigma_pred, dof) * np.sqrt(df2 + fit_result.redchi)
+            return dely_conf.reshape(shape), dely_pred.reshape(shape)
+        
+    def fill_stderr(params):
+        #params lmfit left without a stderr get 10% of their value, 0 if they can't move
+        for k, v in params.items():
+            if v.stderr is None:
+                vary = v.vary and not math.isclose(v.min, v.max, abs_tol=1e-13, rel_tol=1e-13)
+                v.stderr = abs(v.value * 0.1) if vary else 0
+        
+    def uncertainty_scale(sigma, dof):
+        #sigma < 1 is taken as the probability itself, like lmfit's eval_uncertainty
+        prob = sigma if sigma < 1 else math.erf(sigma/math.sqrt(2))
+        #student t quantile, as scipy.stats.t.ppf without importing scipy.stats
+        return special.stdtrit(dof, (prob+1)/2.0)
+        
+    def uncertainty_jacobian(self, params, names, dscale=0.01):
+        '''
+        d(fitter)/d(params) at params for the given names, as (len(names), len(datasets), days).
+        Uses the sensitivity equations if the model has them, else one set of central differences
+        stepping each param by stderr*dscale, like lmfit's eval_uncertainty, or by value*dscale without a stderr.
+        '''
+        values = params.valuesdict()
+        try:
+            return self.fitter_jacobian(names, **values)
+        except NotImplementedError:
+            pass
+        ret = []
+        for name in names:
+            val0 = values[name]
+            dval = (params[name].stderr or abs(val0)) * dscale
+            if dval == 0:
+                ret.append(np.zeros_like(self.fitter(**values)))
+                continue
+            values[name] = val0 + dval
+            res1 = self.fitter(**values)
+            values[name] = val0 - dval
+            res2 = self.fitter(**values)
+            values[name] = val0
+            ret.append((res1 - res2) / (2*dval))
+        return np.array(ret)
     
         
-    def ____fit(self, mod, x_range, y_data, params, days=None, method="leastsq"):#, **kwargs):
+    def ____fit(self, mod, x_range, y_data, params, days=None, method="leastsq", budget=None, fold=None):#, **kwargs):
         '''
         if days is None:
             days = len(x_data)
@@ -226,9 +472,12 @@ class BaseModel:
             "data": y_data
         }
         mod.userkws = kws
+        if budget is not None:
+            mod.iter_cb = budget.iter_cb(fold, final=fold == "full")
         
-        with util.lmfit_lock:
-            fit_result = mod.minimize(params=params, method=method)#, **kwargs)
+        fit_result = mod.minimize(params=params, method=method)#, **kwargs)
+        if budget is not None:
+            budget.restore_best(fold, fit_result, params)
         
         #set back params
         for k, v in fit_result.params.items():
@@ -0,0 +1,78 @@
+import traceback
+import os
+from contextlib import nullcontext
+from .. import config, util, instrumentation
+from .seicrd_rlc import SeicrdRlcModel
+
+def load_kabko(kabko):
+    from ..data.model.repo import get_kabko_full
+    return get_kabko_full(kabko)
+
+def _init_worker(database_url):
+    #connections copied from the parent can't be shared, each worker opens its own pool
+    if database_url:
+        from .. import database
+        database.singleton = None
+        database.init(database_url, 0, 1)
+
+def _fit_kabko(args):
+    kabko, load, model_class, fit_kwargs = args
+    try:
+        #an instrumented fit also records the loading, with its database round trips
+        with instrumentation.recording() if fit_kwargs.get("instrument") else nullcontext():
+            kabko_data = load(kabko)
+            model = model_class(kabko_data)
+            return kabko, model.fit(**fit_kwargs), None
+    except Exception:
+        return kabko, None, traceback.format_exc()
+
+class BatchFitter:
+    def __init__(self, processes=None, model_class=SeicrdRlcModel, fit_kwargs={}, load=load_kabko, database_url=None, max_tasks_per_child=None):
+        '''
+        Fits many kabko in a process pool.
+        load(kabko) gives the KabkoData in the worker; the default reads it from the database,
+        in which case database_url is needed for the workers' own connections.
+        '''
+        self.processes = processes or config.BATCH_FIT_PROCESSES
+        self.model_class = model_class
+        self.fit_kwargs = fit_kwargs
+        self.load = load
+        self.database_url = database_url
+        self.max_tasks_per_child = max_tasks_per_child
+        self.failed = {}
+
+    def fit(self, kabkos):
+        '''
+        Yields (kabko, FittingResult) as the fits finish, in no particular order.
+        A kabko whose fit raised is printed and kept in self.failed instead.
+        '''
+        args = [(kabko, self.load, self.model_class, self.fit_kwargs) for kabko in kabkos]
+        if len(args) == 0:
+            return
+        processes = min(len(args), self.processes or os.cpu_count() or 1)
+        with util.Pool(processes=processes, initializer=_init_worker, initargs=(self.database_url,), maxtasksperchild=self.max_tasks_per_child) as pool:
+            for kabko, fit_result, error in pool.imap_unordered(_fit_kabko, args):
+                if error:
+                    print("Fitting %s failed:\n%s" % (kabko, error))
+                    self.failed[kabko] = error
+                    continue
+                yield kabko, fit_result
+
+    def fit_and_save(self, tanggal, kabkos=None, option="seicrd_rlc"):
+        '''
+        Fits the kabko that need fitting on tanggal (or the given ones) and saves each result as it comes.
+        Returns the saved kabko.
+        '''
+        from ..data.model.repo import fetch_kabko_need_fitting, save_fitting_result
+        if kabkos is None:
+            kabkos = fetch_kabko_need_fitting(tanggal)
+        saved = []
+        for kabko, fit_result in self.fit(kabkos):
+            try:
+                save_fitting_result(fit_result, tanggal, option)
+                saved.append(kabko)
+            except Exception:
+                error = traceback.format_exc()
+                print("Saving %s failed:\n%s" % (kabko, error))
+                self.failed[kabko] = error
+        return saved
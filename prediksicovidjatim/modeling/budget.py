@@ -0,0 +1,86 @@
+import numpy as np
+import math
+import time
+from threading import Lock
+from .. import config
+
+class FitBudget:
+    def __init__(self, max_time=None, max_nfev=None, progress=None, reserve=None):
+        '''
+        Wall time (seconds) limit of a whole fit, and objective evaluation limit of each of its minimizations.
+        max_nfev counts every fold, multi-start candidate and the final fit on its own,
+        so it means the same with a thread, a process or no executor.
+        The folds and starts stop at (1-reserve) of max_time, leaving the rest to the final fit,
+        reserve defaults to config.FIT_BUDGET_RESERVE.
+        progress(fold, nfev, chisqr, elapsed) is called after every evaluation, nfev counted within the fold.
+        '''
+        self.max_time = max_time
+        self.max_nfev = max_nfev
+        self.progress = progress
+        self.reserve = config.FIT_BUDGET_RESERVE if reserve is None else reserve
+        self.start = time.time()
+        #fold: evaluations of that fold
+        self.nfev = {}
+        self.truncated = False
+        #fold: (chisqr, values) of the best evaluation of that fold
+        self.best = {}
+        self._lock = Lock()
+
+    def elapsed(self):
+        return time.time() - self.start
+
+    def exceeded(self, fold, final=False):
+        if self.max_time is not None:
+            max_time = self.max_time if final else self.max_time * (1 - self.reserve)
+            if self.elapsed() >= max_time:
+                return True
+        return self.max_nfev is not None and self.nfev.get(fold, 0) >= self.max_nfev
+
+    def iter_cb(self, fold, final=False):
+        #lmfit iter_cb for the minimization labeled fold, aborting it once the budget is spent
+        def iter_cb(params, iter, resid, *args, **kws):
+            chisqr = float(np.sum(np.square(resid)))
+            if not math.isfinite(chisqr):
+                chisqr = math.inf
+            with self._lock:
+                nfev = self.nfev.get(fold, 0) + 1
+                self.nfev[fold] = nfev
+                best = self.best.get(fold)
+                if best is None or chisqr < best[0]:
+                    self.best[fold] = (chisqr, params.valuesdict())
+            if self.progress:
+                self.progress(fold, nfev, chisqr, self.elapsed())
+            if self.exceeded(fold, final):
+                self.truncated = True
+                return True
+            return False
+        return iter_cb
+
+    def restore_best(self, fold, fit_result, params):
+        '''
+        An aborted lmfit result holds the last evaluated values, this puts the fold's best back
+        into fit_result and params, with the fold's own evaluation count as nfev. Returns whether it did.
+        lmfit leaves out the statistics of an aborted fit, ndata, nfree and redchi are set from the best chisqr.
+        '''
+        if not fit_result.aborted or fold not in self.best:
+            return False
+        #lmfit's nfev of an aborted fit is short by two, -1 when it aborted on the first evaluation
+        fit_result.nfev = self.nfev[fold]
+        chisqr, values = self.best[fold]
+        for k, v in values.items():
+            fit_result.params[k].value = v
+            params[k].value = v
+        fit_result.chisqr = chisqr
+        fit_result.ndata = len(fit_result.residual)
+        fit_result.nfree = fit_result.ndata - fit_result.nvarys
+        fit_result.redchi = chisqr / max(1, fit_result.nfree)
+        return True
+
+    def __getstate__(self):
+        ret = dict(self.__dict__)
+        del ret["_lock"]
+        return ret
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = Lock()
@@ -0,0 +1,147 @@
+from collections import OrderedDict
+from threading import Lock
+from .. import config
+
+class ModelCache:
+    def __init__(self, size=None):
+        self.size = size or config.MODEL_CACHE_SIZE
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def key(self, *values):
+        #exact values, leastsq's finite difference steps can be below any rounding and must miss
+        return tuple(map(float, values))
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            ret = self._entries.get(key)
+            if ret is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return ret
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, f):
+        ret = self.get(key)
+        if ret is None:
+            #computed outside the lock; two threads may compute the same entry, the later one wins
+            ret = f()
+            self.put(key, ret)
+        return ret
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.size,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getstate__(self):
+        #locks don't pickle; a copy sent to another process starts empty
+        ret = dict(self.__dict__)
+        del ret["_lock"]
+        ret["_entries"] = OrderedDict()
+        return ret
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = Lock()
+
+class ModelCheckpoints:
+    def __init__(self, count=None):
+        self.count = count or config.MODEL_CHECKPOINT_COUNT
+        self.enabled = True
+        self.integrated_days = 0
+        self.reused_days = 0
+        self._entries = []
+        self._lock = Lock()
+
+    def find(self, key, values, resume_days, days):
+        '''
+        Finds a stored trajectory covering days that values can't have changed,
+        so it's reused as is instead of integrating. Continuing a stored state mid-trajectory isn't done,
+        restarting the integrator there differs from the full integration at rtol level,
+        which finite difference jacobians would take for the effect of their step.
+        resume_days(y) gives, for a stored trajectory y, the last day each of values can't have affected,
+        or None if it affects the whole trajectory.
+        Returns the states of days 0..days-1, or None.
+        '''
+        if not self.enabled:
+            return None
+        with self._lock:
+            entries = list(self._entries)
+        for entry_key, entry_values, y in entries:
+            if entry_key != key or len(y) < days:
+                continue
+            changed = [i for i, (a, b) in enumerate(zip(values, entry_values)) if a != b]
+            if changed:
+                resume = resume_days(y)
+                changed = [resume[i] for i in changed]
+                if None in changed or min(changed) < days-1:
+                    continue
+            return y[:days]
+        return None
+
+    def put(self, key, values, y):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries.append((key, values, y))
+            if len(self._entries) > self.count:
+                self._entries.pop(0)
+
+    def count_days(self, integrated, reused):
+        with self._lock:
+            self.integrated_days += integrated
+            self.reused_days += reused
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self.integrated_days = 0
+            self.reused_days = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.count,
+                "integrated_days": self.integrated_days,
+                "reused_days": self.reused_days
+            }
+
+    def __getstate__(self):
+        ret = dict(self.__dict__)
+        del ret["_lock"]
+        ret["_entries"] = []
+        return ret
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = Lock()
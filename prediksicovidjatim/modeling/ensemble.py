@@ -0,0 +1,53 @@
+import numpy as np
+import math
+from .. import config
+
+class StreamingPercentiles:
+    def __init__(self, shape, upper, bins=None):
+        '''
+        Percentiles of every element of an array of the given shape, over samples added in chunks.
+        Keeps a histogram on log1p scale between 0 and upper instead of the samples,
+        so memory doesn't grow with the sample count. Samples are clipped into [0, upper].
+        '''
+        self.shape = tuple(shape)
+        self.bins = int(bins or config.ENSEMBLE_PERCENTILE_BINS)
+        self.upper = upper
+        self.scale = self.bins / math.log1p(upper)
+        self.counts = np.zeros(self.shape + (self.bins,), dtype=np.int32)
+        self.count = 0
+        #exact extremes, so percentiles of narrow distributions don't spread over a whole bin
+        self.min = np.full(self.shape, np.inf)
+        self.max = np.full(self.shape, -np.inf)
+        #each element's bins are one contiguous run in the flat counts
+        self._offset = np.arange(int(np.prod(self.shape)), dtype=np.int64).reshape(self.shape) * self.bins
+
+    def add(self, samples):
+        #samples is (n,) + shape
+        samples = np.clip(samples, 0, self.upper)
+        np.minimum(self.min, samples.min(axis=0), out=self.min)
+        np.maximum(self.max, samples.max(axis=0), out=self.max)
+        index = (np.log1p(samples) * self.scale).astype(np.int64)
+        np.clip(index, 0, self.bins-1, out=index)
+        index += self._offset
+        #int32 halves the memory of the counts, they only need more past 2**31-1 samples
+        if self.count + len(samples) > np.iinfo(self.counts.dtype).max:
+            self.counts = self.counts.astype(np.int64)
+        self.counts += np.bincount(index.ravel(), minlength=self.counts.size).reshape(self.counts.shape)
+        self.count += len(samples)
+
+    def percentiles(self, q):
+        '''
+        Returns (len(q),) + shape, interpolating linearly within a bin.
+        '''
+        cum = np.cumsum(self.counts, axis=-1)
+        ret = []
+        for p in q:
+            target = p / 100.0 * self.count
+            i = np.minimum((cum < target).sum(axis=-1), self.bins-1)
+            i = i[..., np.newaxis]
+            below = np.take_along_axis(cum, i, axis=-1) - np.take_along_axis(self.counts, i, axis=-1)
+            inside = np.take_along_axis(self.counts, i, axis=-1)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                frac = np.where(inside > 0, (target - below) / inside, 0.5)
+            ret.append(np.clip(np.expm1((i + np.clip(frac, 0, 1)) / self.scale)[..., 0], self.min, self.max))
+        return np.array(ret)
@@ -1,10 +1,24 @@
-from sklearn.metrics import explained_variance_score, max_error, mean_absolute_error, mean_squared_error, mean_squared_log_error, median_absolute_error, r2_score, mean_tweedie_deviance, r2_score
-from scipy.stats import shapiro, pearsonr, f_oneway, kstest, ks_2samp
 import numpy as np
-from .. import util
-from statsmodels.stats.stattools import durbin_watson
-from statsmodels.sandbox.stats.runs import runstest_1samp
-import math
+from .. import util, config
+from .ensemble import StreamingPercentiles
+import json
+
+#only scoring needs these, so fitting processes don't pay for importing sklearn and statsmodels
+explained_variance_score = util.lazy_function("sklearn.metrics", "explained_variance_score")
+max_error = util.lazy_function("sklearn.metrics", "max_error")
+mean_absolute_error = util.lazy_function("sklearn.metrics", "mean_absolute_error")
+mean_squared_error = util.lazy_function("sklearn.metrics", "mean_squared_error")
+mean_squared_log_error = util.lazy_function("sklearn.metrics", "mean_squared_log_error")
+median_absolute_error = util.lazy_function("sklearn.metrics", "median_absolute_error")
+r2_score = util.lazy_function("sklearn.metrics", "r2_score")
+mean_tweedie_deviance = util.lazy_function("sklearn.metrics", "mean_tweedie_deviance")
+shapiro = util.lazy_function("scipy.stats", "shapiro")
+pearsonr = util.lazy_function("scipy.stats", "pearsonr")
+f_oneway = util.lazy_function("scipy.stats", "f_oneway")
+kstest = util.lazy_function("scipy.stats", "kstest")
+ks_2samp = util.lazy_function("scipy.stats", "ks_2samp")
+durbin_watson = util.lazy_function("statsmodels.stats.stattools", "durbin_watson")
+runstest_1samp = util.lazy_function("statsmodels.sandbox.stats.runs", "runstest_1samp")
 
 class BaseScorer:
     def __init__(self, data, pred, dely_conf, dely_pred, nvarys=None, train_mean=None, indexes=None, x=None):
@@ -12,7 +26,7 @@ class BaseScorer:
         self.pred = util.np_make_2d(pred)
         self.dely_conf = dely_conf
         self.dely_pred = dely_pred
-        self.residual = data-pred
+        self.residual = self.data-self.pred
         self.row_count = len(self.data)
         self.data_count = len(self.data[0])
         self.nvarys = nvarys
@@ -23,6 +37,7 @@ class BaseScorer:
             self.indexes=indexes
         self.x = x
         self.__stats = None
+        self.__metrics = None
         
     def flatten(self):
         return BaseScorer(
@@ -85,8 +100,7 @@ class BaseScorer:
         
     def stats(self, nvarys=None):
         if not self.__stats:
-            self.__stats = self.map_residual(self._stats, nvarys=nvarys)
-            self.__stats = util.transpose_dict_list(self.__stats)
+            self.__stats = self._stats(self.residual, nvarys=nvarys)
         return self.__stats
         
     def _stats(self, residual, nvarys=None):
@@ -95,12 +109,13 @@ class BaseScorer:
             raise ValueError("Please specify nvarys, which is the count of varying parameters")
         #taken shamelessly from lmfit
         #nvarys: number of parameters with vary=True
-        chisqr = (residual**2).sum()
+        #residual may be one row or all of them
+        chisqr = (residual**2).sum(axis=-1)
         ndata = self.data_count
         nfree = ndata - nvarys
         redchi = chisqr / max(1, nfree)
         # this is -2*loglikelihood
-        chisqr = max(chisqr, 1.e-250*ndata)
+        chisqr = np.maximum(chisqr, 1.e-250*ndata)
         _neg2_log_likel = ndata * np.log(chisqr / ndata)
         aic = _neg2_log_likel + 2 * nvarys
         bic = _neg2_log_likel + np.log(ndata) * nvarys
@@ -132,6 +147,68 @@ class BaseScorer:
     def bic(self):
         return self.stats()["bic"]
         
+    def metrics(self):
+        '''
+        Every point metric of every row, computed together on the 2d data and pred instead of row by row.
+        Returns a dict of metric name to an array with a value per row, kept by the scorer.
+        The values are those of the sklearn and statsmodels functions of the same metrics, which are still called per row for keyword arguments.
+        '''
+        if not self.__metrics:
+            self.__metrics = self._metrics()
+        return self.__metrics
+        
+    def _metrics(self):
+        data = self.data.astype(float)
+        pred = self.pred.astype(float)
+        residual = data - pred
+        error = np.abs(pred - data)
+        ret = {
+            "residual_mean": np.mean(residual, axis=1),
+            "residual_median": np.median(residual, axis=1),
+            "max_error": np.max(error, axis=1),
+            "mae": np.mean(error, axis=1),
+            "mse": np.mean(residual**2, axis=1),
+            "median_absolute_error": np.median(error, axis=1),
+            "explained_variance": BaseScorer._explained_deviance(
+                np.mean((residual - np.mean(residual, axis=1, keepdims=True))**2, axis=1),
+                np.mean((data - np.mean(data, axis=1, keepdims=True))**2, axis=1)
+            ),
+            "r2": BaseScorer._explained_deviance(
+                np.sum(residual**2, axis=1),
+                np.sum((data - np.mean(data, axis=1, keepdims=True))**2, axis=1)
+            ),
+            "mase": self._mase(data, pred),
+            "dw": np.sum(np.diff(residual, axis=1)**2, axis=1) / np.sum(residual**2, axis=1),
+            "prediction_interval": self._prediction_interval(data, pred, util.np_make_2d(self.dely_pred))
+        }
+        if self.data_count < 2:
+            #sklearn doesn't define R^2 for less than two samples
+            ret["r2"] = np.full(self.row_count, np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            #rows with values <= -1 have no msle, msle() raises for those like sklearn does
+            ret["msle"] = np.mean((np.log1p(data) - np.log1p(pred))**2, axis=1)
+            ret["smape"] = self._smape(data, pred)
+        ret["rmse"] = np.sqrt(ret["mse"])
+        ret["rmsle"] = np.sqrt(ret["msle"])
+        if self.nvarys is not None:
+            ret["r2_adj"] = self._r2_adj(ret["r2"])
+            ret.update(self.stats())
+        return ret
+        
+    def _explained_deviance(numerator, denominator):
+        #sklearn's force_finite: 1 for perfect predictions, 0 for imperfect predictions of constant data
+        ret = np.ones(len(numerator))
+        valid = (numerator != 0) & (denominator != 0)
+        ret[valid] = 1 - (numerator[valid] / denominator[valid])
+        ret[(numerator != 0) & (denominator == 0)] = 0.0
+        return ret
+        
+    def _metric(self, name, f, **kwargs):
+        #metrics() has them without keyword arguments, with those they go through f row by row
+        if kwargs:
+            return self.map_data_pred(f, **kwargs)
+        return self.metrics()[name]
+        
     def map_data_pred(self, f, *args, **kwargs):
         return np.array([f(self.data[i], self.pred[i], *args, **kwargs) for i in range(0, self.row_count)])
         
@@ -139,37 +216,47 @@ class BaseScorer:
         return np.array([f(r, *args, **kwargs) for r in self.residual])
         
     def smape(self):
-        return self.map_data_pred(self._smape)
+        return self.metrics()["smape"]
         
     def _smape(self, data, pred):
-        ret0 = [(d, p, math.fabs(d)+math.fabs(p)) for d, p in zip(data, pred)]
-        ret1 = [math.fabs(p-d) / c for d, p, c in ret0 if c != 0]
-        #return 2.0 * sum(ret1) / self.data_count
-        return sum(ret1) / self.data_count
+        #data and pred may be one row or all of them, points where both are 0 count as 0
+        c = np.abs(data) + np.abs(pred)
+        ret = np.where(c != 0, np.abs(pred - data) / c, 0.0)
+        #return 2.0 * np.sum(ret, axis=-1) / self.data_count
+        return np.sum(ret, axis=-1) / self.data_count
         
     def mase(self, seasonality=1):
-        ret = np.array([np.mean([self._mase(self.data[i][a:b], self.pred[i][a:b], seasonality=seasonality) for a, b in self.indexes]) for i in range(0, self.row_count)])
-        return ret
-        #return self.map_data_pred(self._mase, seasonality=seasonality)
+        if seasonality == 1:
+            return self.metrics()["mase"]
+        return self._mase(self.data, self.pred, seasonality=seasonality)
         
     def _mase(self, data, pred, seasonality=1):
-        return mean_absolute_error(data, pred) / mean_absolute_error(data[seasonality:], pred[:-seasonality])
+        #mean over the indexes of each row; in each, the MAE over that of data against pred shifted by seasonality
+        data = util.np_make_2d(data)
+        pred = util.np_make_2d(pred)
+        ret = []
+        for a, b in self.indexes:
+            d, p = data[:, a:b], pred[:, a:b]
+            ret.append(np.mean(np.abs(p - d), axis=1) / np.mean(np.abs(p[:, :-seasonality] - d[:, seasonality:]), axis=1))
+        return np.mean(np.stack(ret, axis=1), axis=1)
     
     def prediction_interval(self):
-        return np.array([self._prediction_interval(self.data[i], self.pred[i], self.dely_pred[i]) for i in range(0, self.row_count)])
+        return self.metrics()["prediction_interval"]
         
     def _prediction_interval(self, data, pred, dely_pred):
-        pred_low = pred - dely_pred
-        pred_high = pred + dely_pred
-        
-        p_arr = [0 if pl <= d and d <= ph else 1 for pl, d, ph in zip(pred_low, data, pred_high)]
-        return 1.0*sum(p_arr)/self.data_count
+        #fraction of the points outside pred +- dely_pred, for one row or all of them
+        inside = ((pred - dely_pred) <= data) & (data <= (pred + dely_pred))
+        return 1.0*np.sum(~inside, axis=-1)/self.data_count
         
     def residual_mean(self, **kwargs):
-        return self.map_residual(np.mean, **kwargs)
+        if kwargs:
+            return self.map_residual(np.mean, **kwargs)
+        return self.metrics()["residual_mean"]
         
     def residual_median(self, **kwargs):
-        return self.map_residual(np.median, **kwargs)
+        if kwargs:
+            return self.map_residual(np.median, **kwargs)
+        return self.metrics()["residual_median"]
         
     def residual_normal(self, **kwargs):
         return self.map_residual(self._residual_normal)
@@ -246,43 +333,46 @@ class BaseScorer:
         return p
         
     def dw(self, **kwargs):
-        return self.map_residual(durbin_watson, **kwargs)
+        if kwargs:
+            return self.map_residual(durbin_watson, **kwargs)
+        return self.metrics()["dw"]
         
     def mae(self, **kwargs):
-        return self.map_data_pred(mean_absolute_error, **kwargs)
+        return self._metric("mae", mean_absolute_error, **kwargs)
     
     def mse(self, **kwargs):
-        return self.map_data_pred(mean_squared_error, **kwargs)
+        return self._metric("mse", mean_squared_error, **kwargs)
     
     def rmse(self, **kwargs):
         return np.sqrt(self.mse(**kwargs))
     
     def msle(self, **kwargs):
-        return self.map_data_pred(mean_squared_log_error, **kwargs)
+        if not kwargs and (np.any(self.data <= -1) or np.any(self.pred <= -1)):
+            raise ValueError("Mean Squared Logarithmic Error cannot be used when targets contain values less than or equal to -1.")
+        return self._metric("msle", mean_squared_log_error, **kwargs)
     
     def rmsle(self, **kwargs):
         return np.sqrt(self.msle(**kwargs))
         
     def explained_variance(self, **kwargs):
-        return self.map_data_pred(explained_variance_score, **kwargs)
+        return self._metric("explained_variance", explained_variance_score, **kwargs)
         
     def max_error(self, **kwargs):
-        return self.map_data_pred(max_error, **kwargs)
+        return self._metric("max_error", max_error, **kwargs)
         
     def median_absolute_error(self, **kwargs):
-        return self.map_data_pred(median_absolute_error, **kwargs)
+        return self._metric("median_absolute_error", median_absolute_error, **kwargs)
     
     def r2(self, **kwargs):
-        return self.map_data_pred(r2_score, **kwargs)
+        return self._metric("r2", r2_score, **kwargs)
         
     def r2_adj(self, nvarys=None, **kwargs):
-        return self.map_data_pred(self._r2_adj, nvarys=nvarys, **kwargs)
+        return self._r2_adj(self.r2(**kwargs), nvarys=nvarys)
         
-    def _r2_adj(self, data, pred, nvarys=None, **kwargs):
+    def _r2_adj(self, r2, nvarys=None):
         nvarys = nvarys or self.nvarys
         if nvarys is None:
             raise ValueError("Please specify nvarys, which is the count of varying parameters")
-        r2 = r2_score(data, pred, **kwargs)
         ndata = self.data_count
         return 1.0 - (1.0-r2)*(ndata-1)/(ndata-nvarys-1)
     
@@ -310,7 +400,7 @@ class BaseScorer:
         return [util.get_obj_attr(self, a) for a in attrs]
         
 class FittingResult:
-    def __init__(self, model, fit_result, datasets, test_scorer, fit_scorer, nvarys, shift=0):
+    def __init__(self, model, fit_result, datasets, test_scorer, fit_scorer, nvarys, shift=0, budget_truncated=False):
         self.model = model
         self.kabko = model.kabko
         self.fit_result = fit_result
@@ -320,9 +410,80 @@ class FittingResult:
         self.fit_scorer = fit_scorer
         self.nvarys = nvarys
         self.outbreak_shift = shift
-        
+        #the fit ran out of its time or evaluation budget, params are the best found before that
+        self.budget_truncated = budget_truncated
+        #counts and times of the fit, set by instrumentation.instrumented if the fit was recorded
+        self.instrumentation = None
+        #(t_end, y_end, history) of the fitted trajectory, integrated on the first predict
+        self._fitted_state = None
+
+    def instrumentation_json(self):
+        return json.dumps(self.instrumentation)
+
+    def fitted_state(self):
+        if self._fitted_state is None:
+            fitted = self.model.model(**self.fit_result.params.valuesdict())
+            states = fitted.states
+            self._fitted_state = (fitted.t[-1], np.array(states[-1]), np.array(states[:-1]))
+        return self._fitted_state
+
     def predict(self, days):
-        params = dict(self.fit_result.values)
+        params = self.fit_result.params.valuesdict()
         params["days"] += days
-        return self.model.model(**params)
+        if not self.model.continues:
+            return self.model.model(**params)
+        #only the days after the fitted trajectory are integrated
+        t_end, y_end, history = self.fitted_state()
+        return self.model.model(**params, state=(t_end, y_end), history=history)
+        
+    def sample_params(self, n_samples, rng=None):
+        '''
+        Draws n_samples param vectors from the fitted covariance, or from the stderr if there's none.
+        Draws out of the bounds are redrawn a few times, then clipped.
+        Returns (n_samples, n_params) in the order of model.ensemble_params().
+        '''
+        rng = rng or np.random.default_rng()
+        params = self.fit_result.params
+        names = self.fit_result.var_names
+        mean = np.array([params[n].value for n in names])
+        covar = self.fit_result.covar
+        if covar is None:
+            covar = np.diag([(params[n].stderr or 0)**2 for n in names])
+        lower = np.array([params[n].min for n in names])
+        upper = np.array([params[n].max for n in names])
+        
+        samples = rng.multivariate_normal(mean, covar, size=n_samples, check_valid="ignore")
+        for i in range(0, 10):
+            out = ((samples < lower) | (samples > upper)).any(axis=1)
+            if not out.any():
+                break
+            samples[out] = rng.multivariate_normal(mean, covar, size=int(out.sum()), check_valid="ignore")
+        samples = np.clip(samples, lower, upper)
+        
+        ret = self.model.ensemble_values([self.fit_result.params.valuesdict()] * n_samples)
+        ensemble_params = self.model.ensemble_params()
+        ret[:, [ensemble_params.index(n) for n in names]] = samples
+        return ret
+        
+    def predict_ensemble(self, days=None, n_samples=1000, percentiles=(2.5, 50, 97.5), datasets=("infectious_all", "critical_cared", "dead"), chunk_size=None, steps_per_day=None, rng=None):
+        '''
+        Percentile bands of datasets over the fitted days plus days more (config.PREDICT_DAYS by default),
+        from n_samples params drawn by sample_params and integrated together by model.model_ensemble.
+        Samples are integrated chunk_size at a time and only their histogram is kept (StreamingPercentiles),
+        so memory doesn't grow with n_samples.
+        Returns {dataset: (len(percentiles), days)}.
+        '''
+        days = config.PREDICT_DAYS if days is None else days
+        days = int(self.fit_result.params.valuesdict()["days"] + days)
+        chunk_size = chunk_size or config.ENSEMBLE_CHUNK_SIZE
+        datasets = list(datasets)
+        
+        params = self.sample_params(n_samples, rng)
+        reducer = StreamingPercentiles((len(datasets), days), self.kabko.population)
+        for i in range(0, n_samples, chunk_size):
+            chunk = params[i:i+chunk_size]
+            y = self.model.model_ensemble(chunk, days, steps_per_day=steps_per_day)
+            reducer.add(self.model.ensemble_datasets(chunk, y, datasets))
+        ret = reducer.percentiles(percentiles)
+        return {d: ret[:, i] for i, d in enumerate(datasets)}
         
\ No newline at end of file
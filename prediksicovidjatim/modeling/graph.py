@@ -0,0 +1,357 @@
+import numpy as np
+from scipy.integrate import odeint
+from .. import util, config, instrumentation
+from . import kernel
+
+class Capacity:
+    def __init__(self, compartment, cared=None, over=None):
+        '''
+        The compartment limited by a capacity given per t, e.g. critical by kapasitas_rs.
+        cared and over name the views min(capacity, compartment) and max(0, compartment-capacity),
+        which flows can take as source or infector in place of the compartment.
+        '''
+        self.compartment = compartment
+        self.cared = cared
+        self.over = over
+
+class Flow:
+    def __init__(self, name, source, target, rate=None, chance=None, infector=None, admit=False, overflow=None, overflow_name=None):
+        '''
+        rate * chance * source, moving source into target.
+        rate and chance name values given when integrating, chance may be "1-name". Either defaults to 1.
+        With infector it's an infection, rate * chance * source * infector / population.
+        source and infector may be a capacity view instead of a compartment.
+        admit=True limits the flow into the capacity compartment to the room left there,
+        after the flows leaving it and the admitted flows declared before.
+        The rest goes to overflow as a flow named overflow_name, or stays in source without one.
+        '''
+        self.name = name
+        self.source = source
+        self.target = target
+        self.rate = rate
+        self.chance = chance
+        self.infector = infector
+        self.admit = admit
+        self.overflow = overflow
+        self.overflow_name = overflow_name
+
+class CompartmentGraph:
+    def __init__(self, compartments, flows, capacity=None, series={}, population="population", susceptible="susceptible", seed="exposed"):
+        '''
+        Compartments and the flows between them, compiled into index arrays once.
+        series maps names of derived series to the compartments or capacity views they sum.
+        population is the compartment holding the total, its dydt is the sum of the rest.
+        Integration starts with seed people in the seed compartment and the rest susceptible.
+        y is (compartments,) for a state, or (compartments, n) for n days or members at once.
+        '''
+        self.compartments = tuple(compartments)
+        self.capacity = capacity
+        self.series_names = tuple(series.keys())
+        size = len(self.compartments)
+        index = {c: i for i, c in enumerate(self.compartments)}
+        self._index = index
+        #the rows flows and series read: compartments, then the capacity views, then population
+        views = [capacity.cared, capacity.over] if capacity else []
+        terms = dict(index)
+        for i, v in enumerate(views):
+            if v:
+                terms[v] = size + i
+        self._one = size + len(views)
+        self._capacity = index[capacity.compartment] if capacity else -1
+
+        def term(name):
+            if name not in terms:
+                raise ValueError("Invalid compartment: " + str(name))
+            return terms[name]
+
+        def compartment(name):
+            return self._capacity if capacity and name in views else term(name)
+
+        #overflowing flows become two, the admitted part and the overflow right after it
+        expanded = []
+        admit = []
+        for f in flows:
+            expanded.append(f)
+            if f.admit:
+                if not capacity or f.target != capacity.compartment:
+                    raise ValueError("Only flows into the capacity compartment can be admitted: " + str(f.name))
+                if compartment(f.source) == self._capacity:
+                    raise ValueError("Admitted flows can't leave the capacity compartment: " + str(f.name))
+                if f.overflow:
+                    admit.append((len(expanded)-1, len(expanded)))
+                    expanded.append(Flow(f.overflow_name or f.name + "_overflow", f.source, f.overflow, f.rate, f.chance, f.infector))
+                else:
+                    admit.append((len(expanded)-1, None))
+        overflows = [o for i, o in admit]
+        self.flows = tuple(f.name for f in expanded)
+        self._flows = expanded
+        self._admit = admit
+
+        self._source = np.array([term(f.source) for f in expanded], dtype=np.int64)
+        self._infector = np.array([term(f.infector) if f.infector else self._one for f in expanded], dtype=np.int64)
+        #flows in the order of flows, mapped onto dydt
+        self.stoichiometry = np.zeros((size, len(expanded)))
+        for j, f in enumerate(expanded):
+            self.stoichiometry[compartment(f.source), j] -= 1
+            self.stoichiometry[compartment(f.target), j] += 1
+        if population in index:
+            self.stoichiometry[index[population]] = 0
+            self.stoichiometry[index[population]] = self.stoichiometry.sum(axis=0)
+        #room frees up by what leaves the capacity compartment
+        self._capacity_outflows = np.array([
+            j for j, f in enumerate(expanded)
+            if admit and not f.admit and j not in overflows and compartment(f.source) == self._capacity
+        ], dtype=np.int64)
+
+        self._population = population
+        self._susceptible = index[susceptible]
+        self._seed = index[seed]
+
+        self._series = np.zeros((len(self.series_names), self._one + 1))
+        for i, parts in enumerate(series.values()):
+            for p in parts:
+                self._series[i, term(p)] = 1
+
+        rates = {}
+        for j, f in enumerate(expanded):
+            if f.rate:
+                rates.setdefault(f.rate, []).append(j)
+        self._rate_flows = {k: np.array(v, dtype=np.int64) for k, v in rates.items()}
+
+        #the same graph as plain arrays for kernel.graph_deriv and graph_jacobian
+        self._kernel_args = (
+            self.stoichiometry, self._source, self._infector, self._capacity, self._one,
+            np.array([i for i, o in admit], dtype=np.int64),
+            np.array([-1 if o is None else o for i, o in admit], dtype=np.int64),
+            self._capacity_outflows
+        )
+
+    def _value(self, values, name):
+        if name is None:
+            return 1.0
+        if name.startswith("1-"):
+            return 1.0 - values[name[2:]]
+        return values[name]
+
+    def coefficients(self, values, varying=()):
+        '''
+        rate * chance of every flow, by the names in values, which may be arrays (per day or member).
+        Rates named in varying are left out, see with_rates.
+        '''
+        ret = [
+            (1.0 if f.rate in varying else self._value(values, f.rate)) * self._value(values, f.chance)
+            for f in self._flows
+        ]
+        return np.array(np.broadcast_arrays(*ret), dtype=float)
+
+    def with_rates(self, coefficients, rates):
+        #coefficients with the rates (name to value at t, or per member) multiplied into the flows using them
+        ret = coefficients.copy()
+        for name, value in rates.items():
+            index = self._rate_flows.get(name)
+            if index is not None:
+                ret[index] *= value
+        return ret
+
+    def initial(self, population, seed):
+        #y0, seed people exposed and the rest susceptible
+        ret = np.zeros(len(self.compartments))
+        if self._population in self._index:
+            ret[self._index[self._population]] = population
+        ret[self._susceptible] = population - seed
+        ret[self._seed] = seed
+        return ret
+
+    def extend(self, y, capacity=np.inf, population=1.0, clamp=False):
+        #y with the rows of the capacity views and population appended
+        y = np.asarray(y, dtype=float)
+        if clamp:
+            y = np.where(y < -config.FLOAT_TOLERANCE, 0.0, y)
+        ret = np.empty((self._one + 1,) + y.shape[1:])
+        ret[:len(y)] = y
+        if self.capacity:
+            c = y[self._capacity]
+            ret[len(y)] = np.minimum(capacity, c)
+            ret[len(y)+1] = np.maximum(0.0, c - capacity)
+        ret[self._one] = population
+        return ret
+
+    def flow_values(self, y, coefficients, capacity=np.inf, population=1.0, clamp=False):
+        '''
+        The flows at y, in the order of flows. coefficients are coefficients() with the varying rates in.
+        clamp zeroes states and flows below -FLOAT_TOLERANCE first, like SANITY_CHECK_CORRECT.
+        '''
+        ext = self.extend(y, capacity, population, clamp)
+        ret = coefficients * ext[self._source] * ext[self._infector] / population
+        if self._admit:
+            room = np.maximum(0.0, capacity - ext[self._capacity] + ret[self._capacity_outflows].sum(axis=0))
+            for i, o in self._admit:
+                want = ret[i]
+                ret[i] = np.minimum(want, room)
+                room = room - ret[i]
+                if o is not None:
+                    ret[o] = want - ret[i]
+        if clamp:
+            ret = np.where(ret < -config.FLOAT_TOLERANCE, 0.0, ret)
+        return ret
+
+    def _kernel(self, y, coefficients, compiled):
+        #single states go through the compiled kernel if there's one, unless compiled=False asks for numpy
+        return compiled and kernel.is_compiled() and np.ndim(y) == 1 and np.ndim(coefficients) == 1
+
+    def deriv(self, y, coefficients, capacity=np.inf, population=1.0, clamp=False, compiled=True):
+        #dydt, of every column at once if y is a trajectory or an ensemble
+        if self._kernel(y, coefficients, compiled):
+            return kernel.graph_deriv(np.asarray(y, dtype=float), coefficients, float(capacity), float(population), clamp, *self._kernel_args)
+        return self.stoichiometry @ self.flow_values(y, coefficients, capacity, population, clamp)
+
+    def flow_jacobian(self, y, coefficients, capacity=np.inf, population=1.0, clamp=False):
+        '''
+        d(flow_values)/d(y) at a single state, (flows, compartments).
+        Below capacity the cared view follows the compartment, at or above it the over view does.
+        '''
+        y = np.asarray(y, dtype=float)
+        ext = self.extend(y, capacity, population, clamp)
+        size = len(y)
+        c = self._capacity
+        dext = np.zeros((self._one + 1, size))
+        dext[:size] = np.eye(size)
+        if self.capacity:
+            if ext[c] >= capacity:
+                dext[size+1, c] = 1.0
+            else:
+                dext[size, c] = 1.0
+        if clamp:
+            #clamped states don't move the flows
+            dext[:, y < -config.FLOAT_TOLERANCE] = 0.0
+        source = ext[self._source]
+        infector = ext[self._infector]
+        flow = coefficients * source * infector / population
+        ret = (coefficients / population)[:, np.newaxis] * (dext[self._source] * infector[:, np.newaxis] + source[:, np.newaxis] * dext[self._infector])
+        if self._admit:
+            room = capacity - ext[c] + flow[self._capacity_outflows].sum()
+            room_d = ret[self._capacity_outflows].sum(axis=0) - dext[c]
+            if room < 0:
+                room = 0.0
+                room_d = np.zeros(size)
+            for i, o in self._admit:
+                want, want_d = flow[i], ret[i].copy()
+                if want > room:
+                    flow[i], ret[i] = room, room_d
+                room = room - flow[i]
+                room_d = room_d - ret[i]
+                if o is not None:
+                    flow[o] = want - flow[i]
+                    ret[o] = want_d - ret[i]
+        if clamp:
+            ret[flow < -config.FLOAT_TOLERANCE] = 0.0
+        return ret
+
+    def jacobian(self, y, coefficients, capacity=np.inf, population=1.0, clamp=False, compiled=True):
+        #d(dydt[i])/d(y[j]) at a single state
+        if self._kernel(y, coefficients, compiled):
+            return kernel.graph_jacobian(np.asarray(y, dtype=float), coefficients, float(capacity), float(population), clamp, *self._kernel_args)
+        return self.stoichiometry @ self.flow_jacobian(y, coefficients, capacity, population, clamp)
+
+    def rhs(self, values, varying={}, capacity=None, population=1.0, clamp=False, compiled=True):
+        '''
+        (deriv, jacobian) of y and t for odeint.
+        varying maps rate names to functions of t, multiplied into the flows using them.
+        capacity is a function of t, for graphs with a Capacity.
+        compiled=False keeps them on the numpy path even with numba installed.
+        '''
+        base = self.coefficients(values, varying)
+        population = float(population)
+
+        def at(t):
+            coefficients = self.with_rates(base, {name: f(t) for name, f in varying.items()}) if varying else base
+            return coefficients, (np.inf if capacity is None else capacity(t))
+
+        def deriv(y, t):
+            coefficients, capacity_val = at(t)
+            return self.deriv(y, coefficients, capacity_val, population, clamp, compiled)
+
+        def jacobian(y, t):
+            coefficients, capacity_val = at(t)
+            return self.jacobian(y, coefficients, capacity_val, population, clamp, compiled)
+
+        return deriv, jacobian
+
+    def integrate(self, y0, t, values, varying={}, capacity=None, population=1.0, clamp=False, jacobian=True, compiled=True):
+        #odeint over t with the rhs, (len(t), compartments)
+        deriv, jac = self.rhs(values, varying, capacity, population, clamp, compiled)
+        deriv = instrumentation.timed_function("rhs", deriv)
+        jac = instrumentation.timed_function("rhs_jacobian", jac)
+        with util.odeint_lock, instrumentation.timed("integration"):
+            return odeint(deriv, y0, t, Dfun=jac if jacobian else None)
+
+    def series(self, y, capacity=np.inf, names=None, mode=util.SANITY_CHECK_IGNORE):
+        '''
+        The derived series of a trajectory y (compartments, days), all of them or the given names, as a dict.
+        The compartments are clamped or checked by mode first, like the results do.
+        '''
+        y = np.asarray(y, dtype=float)
+        if mode == util.SANITY_CHECK_ERROR:
+            util.sanity_check_trajectory(self.compartments, y, mode)
+        else:
+            y = util.sanity_clamp(y, mode)
+        ext = self.extend(y, capacity)
+        index = range(len(self.series_names)) if names is None else [self.series_names.index(n) for n in names]
+        values = self._series[list(index)] @ ext.reshape((len(ext), -1))
+        return {self.series_names[i]: v.reshape(ext.shape[1:]) for i, v in zip(index, values)}
+
+class GraphResult:
+    def __init__(self, graph, t, y, capacity=np.inf, extra={}, datasets={}, sanity_check_mode=util.SANITY_CHECK_CORRECT):
+        '''
+        A trajectory of graph, y as (compartments, days).
+        Its compartments, derived series and their daily_ changes are read as attributes.
+        extra holds series the model adds, e.g. r0_normal, as arrays or functions computing them on first read.
+        datasets maps dataset names to the attribute they're read from.
+        '''
+        self.graph = graph
+        self.t = t
+        self.y = np.asarray(y, dtype=float)
+        self.capacity = capacity
+        self.extra = dict(extra)
+        self.datasets = datasets
+        self.sanity_check_mode = sanity_check_mode
+        self._memo = {}
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        memo = self._memo
+        ret = memo.get(name)
+        if ret is not None:
+            return ret
+        graph = self.graph
+        if name in graph.compartments:
+            ret = util.sanity_clamp(self.y[graph.compartments.index(name)], self.sanity_check_mode, name)
+        elif name in graph.series_names:
+            ret = graph.series(self.y, self.capacity, [name], self.sanity_check_mode)[name]
+        elif name in self.extra:
+            ret = self.extra[name]
+            ret = ret() if callable(ret) else ret
+        elif name.startswith("daily_"):
+            ret = util.delta(getattr(self, name[len("daily_"):]))
+        else:
+            raise AttributeError(name)
+        memo[name] = ret
+        return ret
+
+    @property
+    def states(self):
+        #raw integrated state as (days, compartments), the orientation of SeicrdRlcModelResult.states
+        return self.y.T
+
+    def get_dataset(self, d, shift=0):
+        if d not in self.datasets:
+            raise ValueError("Invalid dataset: " + str(d))
+        ret = getattr(self, self.datasets[d])
+        return np.array(ret) if not shift else util.shift_array(ret, shift)
+
+    def get_datasets(self, datasets, shift=0):
+        return {k:self.get_dataset(k, shift) for k in datasets}
+
+    def get_datasets_values(self, datasets, shift=0):
+        return np.array([self.get_dataset(k, shift) for k in datasets])
@@ -0,0 +1,441 @@
+import numpy as np
+from .. import config
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+FLOAT_TOLERANCE = config.FLOAT_TOLERANCE
+
+def _logistic_rt(t, rt_r0, rt_days, rt_deltas, k):
+    rt = rt_r0
+    for i in range(len(rt_days)):
+        rt += rt_deltas[i] / (1 + np.exp(k*(-t+rt_days[i])))
+    return rt
+
+def _exposed_rate_normal(t, rt_table, rt_resolution, rt_r0, rt_days, rt_deltas, k, infectious_leave_rate_opt):
+    ts = t * rt_resolution
+    i = int(ts)
+    if i < len(rt_table):
+        s = ts - i
+        return ((rt_table[i, 3]*s + rt_table[i, 2])*s + rt_table[i, 1])*s + rt_table[i, 0]
+    return _logistic_rt(t, rt_r0, rt_days, rt_deltas, k) * infectious_leave_rate_opt
+
+def _clamp(y, clamp):
+    if clamp and y < -FLOAT_TOLERANCE:
+        return 0.0
+    return y
+
+def _seicrd_rlc_deriv(y, t, population,
+                rt_table, rt_resolution, rt_r0, rt_days, rt_deltas, k, infectious_leave_rate_opt,
+                kapasitas_rs_table, exposed_rate_over,
+                infectious_rate,
+                critical_rate, critical_chance,
+                recovery_rate_normal, recovery_rate_critical,
+                death_rate_normal, death_chance_normal,
+                death_rate_over, death_chance_over,
+                clamp):
+    #same flows as SeicrdRlcModel.graph, with the rt table read in here so the whole rhs is compiled
+    #no checks here, the integrated trajectory is checked by SeicrdRlcModel.sanity_check_trajectory
+    susceptible = _clamp(y[1], clamp)
+    exposed_normal = _clamp(y[2], clamp)
+    exposed_over = _clamp(y[3], clamp)
+    infectious = _clamp(y[4], clamp)
+    critical = _clamp(y[5], clamp)
+
+    exposed_rate_normal = _exposed_rate_normal(t, rt_table, rt_resolution, rt_r0, rt_days, rt_deltas, k, infectious_leave_rate_opt)
+    kapasitas_rs_val = kapasitas_rs_table[min(int(t), len(kapasitas_rs_table)-1)]
+
+    exposed_flow_normal = exposed_rate_normal * susceptible * infectious / population
+
+    infectious_flow_normal = infectious_rate * exposed_normal
+    infectious_flow_over = infectious_rate * exposed_over
+
+    recovery_flow_normal = recovery_rate_normal * infectious * (1.0-critical_chance)
+    critical_flow = critical_rate * infectious * critical_chance
+
+    critical_cared = min(kapasitas_rs_val, critical)
+    critical_over = max(0.0, critical-critical_cared)
+
+    exposed_flow_over = exposed_rate_over * susceptible * critical_over / population
+    recovery_flow_critical = recovery_rate_critical * critical_cared * (1.0-death_chance_normal)
+
+    death_flow_normal = death_rate_normal * critical_cared * death_chance_normal
+    death_flow_over = death_rate_over * critical_over * death_chance_over
+
+    exposed_flow_normal = _clamp(exposed_flow_normal, clamp)
+    exposed_flow_over = _clamp(exposed_flow_over, clamp)
+    infectious_flow_normal = _clamp(infectious_flow_normal, clamp)
+    infectious_flow_over = _clamp(infectious_flow_over, clamp)
+    recovery_flow_normal = _clamp(recovery_flow_normal, clamp)
+    recovery_flow_critical = _clamp(recovery_flow_critical, clamp)
+    death_flow_normal = _clamp(death_flow_normal, clamp)
+    death_flow_over = _clamp(death_flow_over, clamp)
+    critical_flow = _clamp(critical_flow, clamp)
+
+    dydt = np.empty(10)
+    dydt[1] = -exposed_flow_normal - exposed_flow_over
+    dydt[2] = exposed_flow_normal - infectious_flow_normal
+    dydt[3] = exposed_flow_over - infectious_flow_over
+    dydt[4] = infectious_flow_normal + infectious_flow_over - recovery_flow_normal - critical_flow
+    dydt[5] = critical_flow - recovery_flow_critical - death_flow_normal - death_flow_over
+    dydt[6] = recovery_flow_normal
+    dydt[7] = recovery_flow_critical
+    dydt[8] = death_flow_normal
+    dydt[9] = death_flow_over
+    dydt[0] = dydt[1] + dydt[2] + dydt[3] + dydt[4] + dydt[5] + dydt[6] + dydt[7] + dydt[8] + dydt[9]
+    return dydt
+
+def _seicrd_rlc_jacobian_at(y, population,
+                exposed_rate_normal, kapasitas_rs_val, exposed_rate_over,
+                infectious_rate,
+                critical_rate, critical_chance,
+                recovery_rate_normal, recovery_rate_critical,
+                death_rate_normal, death_chance_normal,
+                death_rate_over, death_chance_over,
+                clamp):
+    #d(dydt[i])/d(y[j]) of the flows in _seicrd_rlc_deriv, at given time-varying inputs
+    susceptible = _clamp(y[1], clamp)
+    infectious = _clamp(y[4], clamp)
+    critical = _clamp(y[5], clamp)
+
+    #critical_cared=min(kapasitas_rs, critical) follows critical below capacity, critical_over above it
+    cared = 1.0 if critical < kapasitas_rs_val else 0.0
+    over = 1.0 - cared
+    critical_over = max(0.0, critical-kapasitas_rs_val)
+
+    exposed_flow_normal_s = exposed_rate_normal * infectious / population
+    exposed_flow_normal_i = exposed_rate_normal * susceptible / population
+    exposed_flow_over_s = exposed_rate_over * critical_over / population
+    exposed_flow_over_c = exposed_rate_over * susceptible / population * over
+    recovery_flow_normal_i = recovery_rate_normal * (1.0-critical_chance)
+    critical_flow_i = critical_rate * critical_chance
+    recovery_flow_critical_c = recovery_rate_critical * (1.0-death_chance_normal) * cared
+    death_flow_normal_c = death_rate_normal * death_chance_normal * cared
+    death_flow_over_c = death_rate_over * death_chance_over * over
+
+    jac = np.zeros((10, 10))
+    jac[1, 1] = -exposed_flow_normal_s - exposed_flow_over_s
+    jac[1, 4] = -exposed_flow_normal_i
+    jac[1, 5] = -exposed_flow_over_c
+    jac[2, 1] = exposed_flow_normal_s
+    jac[2, 2] = -infectious_rate
+    jac[2, 4] = exposed_flow_normal_i
+    jac[3, 1] = exposed_flow_over_s
+    jac[3, 3] = -infectious_rate
+    jac[3, 5] = exposed_flow_over_c
+    jac[4, 2] = infectious_rate
+    jac[4, 3] = infectious_rate
+    jac[4, 4] = -recovery_flow_normal_i - critical_flow_i
+    jac[5, 4] = critical_flow_i
+    jac[5, 5] = -recovery_flow_critical_c - death_flow_normal_c - death_flow_over_c
+    jac[6, 4] = recovery_flow_normal_i
+    jac[7, 5] = recovery_flow_critical_c
+    jac[8, 5] = death_flow_normal_c
+    jac[9, 5] = death_flow_over_c
+    for j in range(10):
+        jac[0, j] = jac[1:, j].sum()
+        #clamped states don't move the flows
+        if clamp and y[j] < -FLOAT_TOLERANCE:
+            jac[:, j] = 0.0
+    return jac
+
+def _seicrd_rlc_jacobian(y, t, population,
+                rt_table, rt_resolution, rt_r0, rt_days, rt_deltas, k, infectious_leave_rate_opt,
+                kapasitas_rs_table, exposed_rate_over,
+                infectious_rate,
+                critical_rate, critical_chance,
+                recovery_rate_normal, recovery_rate_critical,
+                death_rate_normal, death_chance_normal,
+                death_rate_over, death_chance_over,
+                clamp):
+    #same arguments as _seicrd_rlc_deriv, for odeint's Dfun
+    return _seicrd_rlc_jacobian_at(y, population,
+        _exposed_rate_normal(t, rt_table, rt_resolution, rt_r0, rt_days, rt_deltas, k, infectious_leave_rate_opt),
+        kapasitas_rs_table[min(int(t), len(kapasitas_rs_table)-1)],
+        exposed_rate_over,
+        infectious_rate,
+        critical_rate, critical_chance,
+        recovery_rate_normal, recovery_rate_critical,
+        death_rate_normal, death_chance_normal,
+        death_rate_over, death_chance_over,
+        clamp
+    )
+
+#columns of the sensitivities, in the order of SeicrdRlcModel.ensemble_params(), the r_i from _R_0 on
+(_INFECTIOUS_RATE, _CRITICAL_CHANCE, _CRITICAL_RATE,
+    _RECOVERY_RATE_NORMAL, _RECOVERY_RATE_CRITICAL,
+    _DEATH_CHANCE_NORMAL, _DEATH_RATE_NORMAL,
+    _DEATH_CHANCE_OVER, _DEATH_RATE_OVER,
+    _EXPOSED_RATE_OVER, _K, _KAPASITAS_RS_MUL,
+    _TEST_COVERAGE_0, _TEST_COVERAGE_INCREASE, _TEST_COVERAGE_MAX, _R_0) = range(16)
+
+def _seicrd_rlc_sensitivity_deriv(z, t, population,
+                rt_r0, rt_days, rt_deltas, k, infectious_leave_rate_opt,
+                kapasitas_rs_table, kapasitas_rs_mul, exposed_rate_over,
+                infectious_rate,
+                critical_rate, critical_chance,
+                recovery_rate_normal, recovery_rate_critical,
+                death_rate_normal, death_chance_normal,
+                death_rate_over, death_chance_over,
+                stoichiometry):
+    #z is y followed by the sensitivities s = dy/dp as (10, params), row major
+    #returns dydt of the unclamped flows, then ds/dt = J s + df/dp
+    param_count = (len(z) - 10) // 10
+    susceptible = z[1]
+    exposed_normal = z[2]
+    exposed_over = z[3]
+    infectious = z[4]
+    critical = z[5]
+
+    kapasitas_rs_base = kapasitas_rs_table[min(int(t), len(kapasitas_rs_table)-1)]
+    kapasitas_rs_val = kapasitas_rs_base * kapasitas_rs_mul
+    critical_cared = min(kapasitas_rs_val, critical)
+    critical_over = max(0.0, critical-kapasitas_rs_val)
+    #d(kapasitas_rs)/d(kapasitas_rs_mul) where the capacity binds, it's inf before the first capacity entry
+    kapasitas_rs_over = kapasitas_rs_base if critical >= kapasitas_rs_val else 0.0
+
+    #rt = sum(r_i * (g_i - g_i+1)) with g_0 = 1 and g_n = 0, so d(rt)/d(r_i) = g_i - g_i+1
+    rt_count = len(rt_days)
+    g = np.empty(rt_count + 2)
+    g[0] = 1.0
+    g[rt_count+1] = 0.0
+    rt = rt_r0
+    rt_k = 0.0
+    for i in range(rt_count):
+        g[i+1] = 1 / (1 + np.exp(k*(-t+rt_days[i])))
+        rt += rt_deltas[i] * g[i+1]
+        rt_k += rt_deltas[i] * g[i+1] * (1-g[i+1]) * (t-rt_days[i])
+    exposed_rate_normal = rt * infectious_leave_rate_opt
+    si = susceptible * infectious / population
+
+    flow = np.empty(9)
+    flow[0] = exposed_rate_normal * si
+    flow[1] = exposed_rate_over * susceptible * critical_over / population
+    flow[2] = infectious_rate * exposed_normal
+    flow[3] = infectious_rate * exposed_over
+    flow[4] = recovery_rate_normal * infectious * (1.0-critical_chance)
+    flow[5] = recovery_rate_critical * critical_cared * (1.0-death_chance_normal)
+    flow[6] = death_rate_normal * critical_cared * death_chance_normal
+    flow[7] = death_rate_over * critical_over * death_chance_over
+    flow[8] = critical_rate * infectious * critical_chance
+
+    #d(flow)/d(params)
+    flow_d = np.zeros((9, param_count))
+    flow_d[0, _RECOVERY_RATE_NORMAL] = rt * si * (1.0-critical_chance)
+    flow_d[0, _CRITICAL_RATE] = rt * si * critical_chance
+    flow_d[0, _CRITICAL_CHANCE] = rt * si * (critical_rate - recovery_rate_normal)
+    flow_d[0, _K] = infectious_leave_rate_opt * si * rt_k
+    for i in range(rt_count + 1):
+        flow_d[0, _R_0 + i] = infectious_leave_rate_opt * si * (g[i] - g[i+1])
+    flow_d[1, _EXPOSED_RATE_OVER] = susceptible * critical_over / population
+    flow_d[1, _KAPASITAS_RS_MUL] = -exposed_rate_over * susceptible / population * kapasitas_rs_over
+    flow_d[2, _INFECTIOUS_RATE] = exposed_normal
+    flow_d[3, _INFECTIOUS_RATE] = exposed_over
+    flow_d[4, _RECOVERY_RATE_NORMAL] = infectious * (1.0-critical_chance)
+    flow_d[4, _CRITICAL_CHANCE] = -recovery_rate_normal * infectious
+    flow_d[5, _RECOVERY_RATE_CRITICAL] = critical_cared * (1.0-death_chance_normal)
+    flow_d[5, _DEATH_CHANCE_NORMAL] = -recovery_rate_critical * critical_cared
+    flow_d[5, _KAPASITAS_RS_MUL] = recovery_rate_critical * (1.0-death_chance_normal) * kapasitas_rs_over
+    flow_d[6, _DEATH_RATE_NORMAL] = critical_cared * death_chance_normal
+    flow_d[6, _DEATH_CHANCE_NORMAL] = death_rate_normal * critical_cared
+    flow_d[6, _KAPASITAS_RS_MUL] = death_rate_normal * death_chance_normal * kapasitas_rs_over
+    flow_d[7, _DEATH_RATE_OVER] = critical_over * death_chance_over
+    flow_d[7, _DEATH_CHANCE_OVER] = death_rate_over * critical_over
+    flow_d[7, _KAPASITAS_RS_MUL] = -death_rate_over * death_chance_over * kapasitas_rs_over
+    flow_d[8, _CRITICAL_RATE] = infectious * critical_chance
+    flow_d[8, _CRITICAL_CHANCE] = critical_rate * infectious
+
+    jac = _seicrd_rlc_jacobian_at(z[:10], population,
+        exposed_rate_normal, kapasitas_rs_val, exposed_rate_over,
+        infectious_rate,
+        critical_rate, critical_chance,
+        recovery_rate_normal, recovery_rate_critical,
+        death_rate_normal, death_chance_normal,
+        death_rate_over, death_chance_over,
+        False
+    )
+    dz = np.zeros(len(z))
+    for i in range(10):
+        for j in range(9):
+            c = stoichiometry[i, j]
+            if c != 0.0:
+                dz[i] += c * flow[j]
+                for p in range(param_count):
+                    dz[10 + i*param_count + p] += c * flow_d[j, p]
+        for m in range(10):
+            c = jac[i, m]
+            if c != 0.0:
+                for p in range(param_count):
+                    dz[10 + i*param_count + p] += c * z[10 + m*param_count + p]
+    return dz
+
+def _seicrd_rlc_sensitivity_jacobian(z, t, population,
+                rt_r0, rt_days, rt_deltas, k, infectious_leave_rate_opt,
+                kapasitas_rs_table, kapasitas_rs_mul, exposed_rate_over,
+                infectious_rate,
+                critical_rate, critical_chance,
+                recovery_rate_normal, recovery_rate_critical,
+                death_rate_normal, death_chance_normal,
+                death_rate_over, death_chance_over,
+                stoichiometry):
+    #block diagonal, leaving out d(J s)/dy; only used for the newton iterations when stiff
+    param_count = (len(z) - 10) // 10
+    jac = _seicrd_rlc_jacobian_at(z[:10], population,
+        _logistic_rt(t, rt_r0, rt_days, rt_deltas, k) * infectious_leave_rate_opt,
+        kapasitas_rs_table[min(int(t), len(kapasitas_rs_table)-1)] * kapasitas_rs_mul,
+        exposed_rate_over,
+        infectious_rate,
+        critical_rate, critical_chance,
+        recovery_rate_normal, recovery_rate_critical,
+        death_rate_normal, death_chance_normal,
+        death_rate_over, death_chance_over,
+        False
+    )
+    ret = np.zeros((len(z), len(z)))
+    for i in range(10):
+        for m in range(10):
+            c = jac[i, m]
+            if c != 0.0:
+                ret[i, m] = c
+                for p in range(param_count):
+                    ret[10 + i*param_count + p, 10 + m*param_count + p] = c
+    return ret
+
+def _graph_extend(y, capacity, population, clamp, capacity_index, one):
+    #y, then the cared and over views of the capacity compartment, then population, like CompartmentGraph.extend
+    ext = np.empty(one + 1)
+    n = len(y)
+    for i in range(n):
+        ext[i] = _clamp(y[i], clamp)
+    if capacity_index >= 0:
+        c = ext[capacity_index]
+        ext[n] = min(capacity, c)
+        ext[n+1] = max(0.0, c-capacity)
+    ext[one] = population
+    return ext
+
+def _graph_flow_values(ext, coefficients, capacity, population, clamp,
+                source, infector, capacity_index, admit, admit_overflow, capacity_outflows):
+    #same as CompartmentGraph.flow_values, one flow at a time
+    flow_count = len(source)
+    flow = np.empty(flow_count)
+    for j in range(flow_count):
+        flow[j] = coefficients[j] * ext[source[j]] * ext[infector[j]] / population
+    if len(admit) > 0:
+        room = capacity - ext[capacity_index]
+        for j in capacity_outflows:
+            room += flow[j]
+        room = max(0.0, room)
+        for a in range(len(admit)):
+            i = admit[a]
+            want = flow[i]
+            flow[i] = min(want, room)
+            room -= flow[i]
+            if admit_overflow[a] >= 0:
+                flow[admit_overflow[a]] = want - flow[i]
+    for j in range(flow_count):
+        flow[j] = _clamp(flow[j], clamp)
+    return flow
+
+def _graph_deriv(y, coefficients, capacity, population, clamp,
+                stoichiometry, source, infector, capacity_index, one, admit, admit_overflow, capacity_outflows):
+    #stoichiometry @ flows, for graphs compiled by CompartmentGraph
+    ext = _graph_extend(y, capacity, population, clamp, capacity_index, one)
+    flow = _graph_flow_values(ext, coefficients, capacity, population, clamp,
+                source, infector, capacity_index, admit, admit_overflow, capacity_outflows)
+    n = len(y)
+    dydt = np.zeros(n)
+    for i in range(n):
+        for j in range(len(flow)):
+            if stoichiometry[i, j] != 0.0:
+                dydt[i] += stoichiometry[i, j] * flow[j]
+    return dydt
+
+def _graph_jacobian(y, coefficients, capacity, population, clamp,
+                stoichiometry, source, infector, capacity_index, one, admit, admit_overflow, capacity_outflows):
+    #same as CompartmentGraph.jacobian
+    n = len(y)
+    ext = _graph_extend(y, capacity, population, clamp, capacity_index, one)
+    dext = np.zeros((one + 1, n))
+    for i in range(n):
+        dext[i, i] = 1.0
+    if capacity_index >= 0:
+        if ext[capacity_index] >= capacity:
+            dext[n+1, capacity_index] = 1.0
+        else:
+            dext[n, capacity_index] = 1.0
+    if clamp:
+        #clamped states don't move the flows
+        for i in range(n):
+            if y[i] < -FLOAT_TOLERANCE:
+                dext[:, i] = 0.0
+    flow_count = len(source)
+    flow = np.empty(flow_count)
+    dflow = np.empty((flow_count, n))
+    for j in range(flow_count):
+        a = ext[source[j]]
+        b = ext[infector[j]]
+        flow[j] = coefficients[j] * a * b / population
+        for i in range(n):
+            dflow[j, i] = coefficients[j] / population * (dext[source[j], i] * b + a * dext[infector[j], i])
+    if len(admit) > 0:
+        room = capacity - ext[capacity_index]
+        room_d = -dext[capacity_index].copy()
+        for j in capacity_outflows:
+            room += flow[j]
+            room_d += dflow[j]
+        if room < 0:
+            room = 0.0
+            room_d[:] = 0.0
+        for a in range(len(admit)):
+            i = admit[a]
+            want = flow[i]
+            want_d = dflow[i].copy()
+            if want > room:
+                flow[i] = room
+                dflow[i] = room_d
+            room -= flow[i]
+            room_d = room_d - dflow[i]
+            o = admit_overflow[a]
+            if o >= 0:
+                flow[o] = want - flow[i]
+                dflow[o] = want_d - dflow[i]
+    if clamp:
+        for j in range(flow_count):
+            if flow[j] < -FLOAT_TOLERANCE:
+                dflow[j] = 0.0
+    jac = np.zeros((n, n))
+    for i in range(n):
+        for j in range(flow_count):
+            if stoichiometry[i, j] != 0.0:
+                for k in range(n):
+                    jac[i, k] += stoichiometry[i, j] * dflow[j, k]
+    return jac
+
+if njit:
+    _logistic_rt = njit(cache=True, nogil=True)(_logistic_rt)
+    _exposed_rate_normal = njit(cache=True, nogil=True)(_exposed_rate_normal)
+    _clamp = njit(cache=True, nogil=True)(_clamp)
+    seicrd_rlc_deriv = njit(cache=True, nogil=True)(_seicrd_rlc_deriv)
+    seicrd_rlc_jacobian_at = njit(cache=True, nogil=True)(_seicrd_rlc_jacobian_at)
+    _seicrd_rlc_jacobian_at = seicrd_rlc_jacobian_at
+    seicrd_rlc_jacobian = njit(cache=True, nogil=True)(_seicrd_rlc_jacobian)
+    seicrd_rlc_sensitivity_deriv = njit(cache=True, nogil=True)(_seicrd_rlc_sensitivity_deriv)
+    seicrd_rlc_sensitivity_jacobian = njit(cache=True, nogil=True)(_seicrd_rlc_sensitivity_jacobian)
+    _graph_extend = njit(cache=True, nogil=True)(_graph_extend)
+    _graph_flow_values = njit(cache=True, nogil=True)(_graph_flow_values)
+    graph_deriv = njit(cache=True, nogil=True)(_graph_deriv)
+    graph_jacobian = njit(cache=True, nogil=True)(_graph_jacobian)
+else:
+    seicrd_rlc_deriv = _seicrd_rlc_deriv
+    seicrd_rlc_jacobian_at = _seicrd_rlc_jacobian_at
+    seicrd_rlc_jacobian = _seicrd_rlc_jacobian
+    seicrd_rlc_sensitivity_deriv = _seicrd_rlc_sensitivity_deriv
+    seicrd_rlc_sensitivity_jacobian = _seicrd_rlc_sensitivity_jacobian
+    graph_deriv = _graph_deriv
+    graph_jacobian = _graph_jacobian
+
+def is_compiled():
+    return njit is not None
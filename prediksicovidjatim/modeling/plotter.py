@@ -1,4 +1,3 @@
-import matplotlib.pyplot as plt
 from .. import util
 
 class ModelPlotter:
@@ -75,6 +74,7 @@ class ModelPlotter:
         return ax.plot(x, y, *args, **kwargs)
         
     def plot(self, f, *args, **kwargs):
+        import matplotlib.pyplot as plt
         fig, ax = plt.subplots(1, 1)
         f(ax, *args, **kwargs)
         util.post_plot(ax)
@@ -1,120 +1,80 @@
 import numpy as np
-from scipy.integrate import odeint
-import lmfit
 from .. import util
 from .base_model import BaseModel
+from .graph import CompartmentGraph, Flow
 
 class SeicrdModel(BaseModel):
     params = ["incubation_period",
                     "critical_chance", "critical_time", 
                     "recovery_time_normal", "recovery_time_critical",
                     "death_chance_normal", "death_time_normal"]
+    option = "seicrd"
+    
+    graph = CompartmentGraph(
+        ("population", "susceptible", "exposed", "infectious", "critical", "recovered", "dead"),
+        [
+            Flow("exposed_flow", "susceptible", "exposed", "exposed_rate", infector="infectious"),
+            Flow("infectious_flow", "exposed", "infectious", "infectious_rate"),
+            Flow("critical_flow", "infectious", "critical", "critical_rate", "critical_chance"),
+            Flow("recovery_flow_normal", "infectious", "recovered", "recovery_rate_normal", "1-critical_chance"),
+            Flow("recovery_flow_critical", "critical", "recovered", "recovery_rate_critical", "1-death_chance_normal"),
+            Flow("death_flow", "critical", "dead", "death_rate_normal", "death_chance_normal")
+        ],
+        series={
+            "infectious_all": ("infectious", "critical"),
+            "infected": ("infectious", "critical", "recovered", "dead")
+        }
+    )
+    #without a capacity, every critical is cared for
+    dataset_series = {
+        "infectious": "infectious",
+        "critical_cared": "critical",
+        "infectious_all": "infectious_all",
+        "recovered": "recovered",
+        "dead": "dead",
+        "infected": "infected"
+    }
+    available_datasets = list(dataset_series.keys())
+    
     def __init__(self, kabko):
         super().__init__(kabko) 
-    
-    def deriv(self, y, t, exposed_rate, infectious_rate, 
-                critical_rate, critical_chance, 
-                recovery_rate_normal, recovery_rate_critical, 
-                death_rate, death_chance):
         
-        population, susceptible, exposed, infectious, critical, recovered, dead = y
-        exposed_flow = exposed_rate * susceptible * infectious / population
-        infectious_flow = infectious_rate * exposed * 1
-        critical_flow = critical_rate * infectious * critical_chance
-        recovery_flow_normal = recovery_rate_normal * infectious * (1-critical_chance)
-        recovery_flow_critical = recovery_rate_critical * critical * (1-death_chance)
-        death_flow = death_rate * critical * death_chance
-        dSdt = -exposed_flow
-        dEdt = exposed_flow - infectious_flow
-        dIdt = infectious_flow - recovery_flow_normal - critical_flow
-        dCdt = critical_flow - recovery_flow_critical - death_flow
-        dRdt = recovery_flow_normal + recovery_flow_critical
-        dDdt = death_flow
-        dPdt = dSdt + dEdt + dIdt + dCdt + dRdt + dDdt
-        return dPdt, dSdt, dEdt, dIdt, dCdt, dRdt, dDdt
+    def incubation_period_init(self):
+        return self.kabko.params["incubation_period"].init
         
-    def model(self, days, r_0, incubation_period,
+    def rates(self, incubation_period,
                     critical_chance, critical_time, 
                     recovery_time_normal, recovery_time_critical,
-                    death_chance_normal, death_time_normal, **kwargs):
-        
-        #load values
-        population = self.kabko.population
+                    death_chance_normal, death_time_normal):
+        #graph values of the times and chances, but the exposed rate
+        return {
+            "infectious_rate": 1.0 / incubation_period,
+            "critical_rate": 1.0 / critical_time,
+            "critical_chance": critical_chance,
+            "recovery_rate_normal": 1.0 / recovery_time_normal,
+            "recovery_rate_critical": 1.0 / recovery_time_critical,
+            "death_rate_normal": 1.0 / death_time_normal,
+            "death_chance_normal": death_chance_normal
+        }
+        
+    def model(self, days, incubation_period,
+                    critical_chance, critical_time, 
+                    recovery_time_normal, recovery_time_critical,
+                    death_chance_normal, death_time_normal, 
+                    sanity_check_mode=util.SANITY_CHECK_CORRECT, **kwargs):
+        self.check_continuation(kwargs)
+        r_0 = self.kabko.get_kwargs_rt(kwargs, single=True)[0]
         
-        # this is derived parameter
         infectious_period_opt = recovery_time_normal * (1-critical_chance) + critical_time * critical_chance #this is derived parameter
-        infectious_rate = 1.0 / incubation_period # this is derived parameter
-        recovery_rate_normal = 1.0 / recovery_time_normal # this is derived parameter
-        death_rate_normal = 1.0 / death_time_normal # this is derived parameter
-        critical_rate = 1.0 / critical_time # this is derived parameter
-        recovery_rate_critical = 1.0 / recovery_time_critical #this is derived parameter
-
-        exposed_rate_normal = r0 / infectious_period_opt
-
-        population_init, susceptible_init, exposed_init, infectious_init, critical_init, recovered_init, dead_init = population, population-1, 1, 0, 0, 0, 0,  # initial conditions: one exposed, rest susceptible
-        
-        t = np.linspace(0, days-1, days) # days
-        y0 = population_init, susceptible_init, exposed_init, infectious_init, critical_init, recovered_init, dead_init # Initial conditions tuple
-
-        
-        # Integrate the SIR equations over the time grid, t.
-        ret = odeint(self.deriv, y0, t, args=(
-            exposed_rate_normal, infectious_rate, 
-            critical_rate, critical_chance, 
-            recovery_rate_normal, recovery_rate_critical, 
-            death_rate_normal, death_chance_normal
-        ))
-        
-        retT = ret.T
-        population_2, susceptible, exposed, infectious, critical, recovered, dead = retT
-        
-        death_chance_val = [0] + [100 * dead[i] / sum(infectious_rate*exposed[:i]) if sum(infectious_rate*exposed[:i])>0 else 0 for i in range(1, len(t))]
-        #death_chance_val = np.zeros(days)
-        
-        infected = np.array(util.sum_respectively([infectious, critical, dead, recovered]))
         
-        return t, population_2, susceptible, exposed, infectious, critical, recovered, dead, infected, death_chance_val
-    
-    def fitter(self, x, days, r_0, incubation_period,
-                    critical_chance, critical_time, 
-                    recovery_time_normal, recovery_time_critical,
-                    death_chance_normal, death_time_normal, **kwargs):
-        #days = self.kabko.data_days(self.kabko.outbreak_shift(incubation_period))
-        ret = self.model(days, r_0, incubation_period,
+        values = self.rates(incubation_period,
                     critical_chance, critical_time, 
                     recovery_time_normal, recovery_time_critical,
-                    death_chance_normal, death_time_normal,
-                    k)
-        dead = ret[7]
-        return dead[x]
-    
-    def fit(self):
-        mod = lmfit.Model(self.fitter)
-        
-        self.kabko.apply_params(mod)
-        
-        outbreak_shift = self.kabko.outbreak_shift(
-            self.kabko.params["incubation_period"].init
-        )
-        
-        days = self.kabko.data_days(outbreak_shift)
-        
-        mod.set_param_hint("days", value=days, vary=False)
-
-        params = mod.make_params()
-        
-        x_data = np.linspace(0, days - 1, days, dtype=int)
-        
-        y_data = util.shift_array(
-            self.kabko.dead, 
-            outbreak_shift
-        )
-
-        result = mod.fit(y_data, params, method="least_squares", x=x_data)
-        
-
-        #result.plot_fit(datafmt="-");
+                    death_chance_normal, death_time_normal)
+        values["exposed_rate"] = r_0 / infectious_period_opt
         
-        return result
+        ret = self.integrate(days, values, sanity_check_mode=sanity_check_mode)
+        ret.extra["mortality_rate"] = lambda: self.mortality_rate(ret.t, ret.exposed, ret.dead, values["infectious_rate"])
+        return ret
 
-Model = SeicrdModel
\ No newline at end of file
+Model = SeicrdModel
@@ -1,8 +1,7 @@
 import numpy as np
-from scipy.integrate import odeint
-import lmfit
 from .. import util
 from .base_model import BaseModel
+from .graph import CompartmentGraph, Flow, Capacity
 
 class SeicrdRlModel(BaseModel):
     params = ["incubation_period",
@@ -11,46 +10,44 @@ class SeicrdRlModel(BaseModel):
                     "death_chance_normal", "death_time_normal",
                     "death_chance_over", "death_time_over", 
                     "exposed_rate_critical", "k"]
+    option = "seicrd_rl"
+    
+    #critical above kapasitas_rs aren't cared for, die on their own rate and infect others
+    graph = CompartmentGraph(
+        ("population", "susceptible", "exposed", "infectious", "critical", "recovered", "dead"),
+        [
+            Flow("exposed_flow_normal", "susceptible", "exposed", "exposed_rate_normal", infector="infectious"),
+            Flow("exposed_flow_over", "susceptible", "exposed", "exposed_rate_critical", infector="critical_over"),
+            Flow("infectious_flow", "exposed", "infectious", "infectious_rate"),
+            Flow("critical_flow", "infectious", "critical", "critical_rate", "critical_chance"),
+            Flow("recovery_flow_normal", "infectious", "recovered", "recovery_rate_normal", "1-critical_chance"),
+            Flow("recovery_flow_critical", "critical_cared", "recovered", "recovery_rate_critical", "1-death_chance_normal"),
+            Flow("death_flow_normal", "critical_cared", "dead", "death_rate_normal", "death_chance_normal"),
+            Flow("death_flow_over", "critical_over", "dead", "death_rate_over", "death_chance_over")
+        ],
+        capacity=Capacity("critical", "critical_cared", "critical_over"),
+        series={
+            "critical_cared": ("critical_cared",),
+            "critical_over": ("critical_over",),
+            "infectious_all": ("infectious", "critical"),
+            "infected": ("infectious", "critical", "recovered", "dead")
+        }
+    )
+    dataset_series = {
+        "infectious": "infectious",
+        "critical_cared": "critical_cared",
+        "infectious_all": "infectious_all",
+        "recovered": "recovered",
+        "dead": "dead",
+        "infected": "infected"
+    }
+    available_datasets = list(dataset_series.keys())
     
     def __init__(self, kabko):
         super().__init__(kabko) 
-    
-    def deriv(self, y, t, exposed_rate_normal, exposed_rate_critical, 
-                    infectious_rate, 
-                    critical_rate, critical_chance, 
-                    recovery_rate_normal, recovery_rate_critical, 
-                    death_rate_normal, death_chance_normal, 
-                    death_rate_over, death_chance_over):
-        
-        population, susceptible, exposed, infectious, critical, recovered, dead = y
-        
-        critical_cared = min(critical, self.kabko.kapasitas_rs(t))
-        critical_over = max(0, critical-self.kabko.kapasitas_rs(t))
-        
-        exposed_flow_normal = exposed_rate_normal(t) * susceptible * infectious / population
-        exposed_flow_over = exposed_rate_critical * susceptible * critical_over / population
-        exposed_flow = exposed_flow_normal + exposed_flow_over
-        
-        infectious_flow = infectious_rate * exposed * 1
-        critical_flow = critical_rate * infectious * critical_chance
-        recovery_flow_normal = recovery_rate_normal * infectious * (1-critical_chance)
         
-        recovery_flow_critical = recovery_rate_critical * critical_cared * (1-death_chance_normal)
-        
-        death_flow_normal = death_rate_normal * critical_cared * death_chance_normal
-        death_flow_over = death_rate_over * critical_over * death_chance_over
-        death_flow = death_flow_normal + death_flow_over
-        
-        
-        dSdt = -exposed_flow
-        dEdt = exposed_flow - infectious_flow
-        dIdt = infectious_flow - recovery_flow_normal - critical_flow
-        dCdt = critical_flow - recovery_flow_critical - death_flow
-        dRdt = recovery_flow_normal + recovery_flow_critical
-        dDdt = death_flow
-        dPdt = dSdt + dEdt + dIdt + dCdt + dRdt + dDdt
-        
-        return dPdt, dSdt, dEdt, dIdt, dCdt, dRdt, dDdt
+    def incubation_period_init(self):
+        return self.kabko.params["incubation_period"].init
         
     def model(self, days, incubation_period,
                     critical_chance, critical_time, 
@@ -58,112 +55,33 @@ class SeicrdRlModel(BaseModel):
                     death_chance_normal, death_time_normal,
                     death_chance_over, death_time_over, 
                     exposed_rate_critical, k,
-                    **kwargs):
-        
-        #unpack rt values
-        rt_values = util.get_kwargs_rt(kwargs, self.kabko.rt_count)
-        rt_data = list(zip(self.kabko.rt_days, rt_values))
-        rt_delta = util.rt_delta(rt_data, self.kabko.oldest_tanggal)
-        r_0 = rt_values[0]
-        
-        #load values
-        population = self.kabko.population
+                    sanity_check_mode=util.SANITY_CHECK_CORRECT, **kwargs):
+        self.check_continuation(kwargs)
+        logistic_rt = self.logistic_rt(kwargs, k)
         
-        # this is derived parameter
         infectious_period_opt = recovery_time_normal * (1-critical_chance) + critical_time * critical_chance #this is derived parameter
-        infectious_rate = 1.0 / incubation_period # this is derived parameter
-        recovery_rate_normal = 1.0 / recovery_time_normal # this is derived parameter
-        death_rate_normal = 1.0 / death_time_normal # this is derived parameter
-        critical_rate = 1.0 / critical_time # this is derived parameter
-        recovery_rate_critical = 1.0 / recovery_time_critical #this is derived parameter
-        death_rate_over = 1.0/death_time_over # this is a derived parameter
         
-        def logistic_rt(t):
-            return self.kabko.logistic_rt(r_0, rt_delta, t, k)
-
         def exposed_rate_normal(t):
-            ret = logistic_rt(t) / infectious_period_opt
-            return ret
-        
-        def r0_over(critical_over):
-            return exposed_rate_critical * death_time_over * critical_chance * (critical_over/population)
-
-        population_init, susceptible_init, exposed_init, infectious_init, critical_init, recovered_init, dead_init = population, population-1, 1, 0, 0, 0, 0,  # initial conditions: one exposed, rest susceptible
-        
-        t = np.linspace(0, days-1, days) # days
-        y0 = population_init, susceptible_init, exposed_init, infectious_init, critical_init, recovered_init, dead_init # Initial conditions tuple
-
-        
-        # Integrate the SIR equations over the time grid, t.
-        ret = odeint(self.deriv, y0, t, args=(
-            exposed_rate_normal, exposed_rate_critical, 
-            infectious_rate, 
-            critical_rate, critical_chance, 
-            recovery_rate_normal, recovery_rate_critical, 
-            death_rate_normal, death_chance_normal, 
-            death_rate_over, death_chance_over
-        ))
-        
-        retT = ret.T
-        population_2, susceptible, exposed, infectious, critical, recovered, dead = retT
-        
-        kapasitas_rs_val = util.map_function(t, self.kabko.kapasitas_rs)
-        #kapasitas_rs_val = np.zeros(days)
-        
-        death_chance_val = [0] + [100 * dead[i] / sum(infectious_rate*exposed[:i]) if sum(infectious_rate*exposed[:i])>0 else 0 for i in range(1, len(t))]
-        #death_chance_val = np.zeros(days)
-        
-        r0_normal_val = util.map_function(t, logistic_rt)
-        
-        infected = np.array(util.sum_respectively([infectious, critical, dead, recovered]))
-        
-        return t, population_2, susceptible, exposed, infectious, critical, recovered, dead, infected, death_chance_val, r0_normal_val, kapasitas_rs_val
-    
-    def fitter(self, x, days, incubation_period,
-                    critical_chance, critical_time, 
-                    recovery_time_normal, recovery_time_critical,
-                    death_chance_normal, death_time_normal,
-                    death_chance_over, death_time_over, 
-                    exposed_rate_critical, k,
-                    **kwargs):
-        #days = self.kabko.data_days(self.kabko.outbreak_shift(incubation_period))
-        ret = self.model(days, incubation_period,
-                    critical_chance, critical_time, 
-                    recovery_time_normal, recovery_time_critical,
-                    death_chance_normal, death_time_normal,
-                    death_chance_over, death_time_over, 
-                    exposed_rate_critical, k,
-                    **kwargs)
-        dead = ret[7]
-        return dead[x]
-    
-    def fit(self):
-        mod = lmfit.Model(self.fitter)
-        
-        self.kabko.apply_params(mod)
-        
-        outbreak_shift = self.kabko.outbreak_shift(
-            self.kabko.params["incubation_period"].init
-        )
-        
-        days = self.kabko.data_days(outbreak_shift)
-        
-        mod.set_param_hint("days", value=days, vary=False)
-
-        params = mod.make_params()
-        
-        x_data = np.linspace(0, days - 1, days, dtype=int)
-        
-        y_data = util.shift_array(
-            self.kabko.dead, 
-            outbreak_shift
-        )
-
-        result = mod.fit(y_data, params, method="least_squares", x=x_data)
-        
-
-        #result.plot_fit(datafmt="-");
-        
-        return result
+            return logistic_rt(t) / infectious_period_opt
+        
+        values = {
+            "exposed_rate_critical": exposed_rate_critical,
+            "infectious_rate": 1.0 / incubation_period,
+            "critical_rate": 1.0 / critical_time,
+            "critical_chance": critical_chance,
+            "recovery_rate_normal": 1.0 / recovery_time_normal,
+            "recovery_rate_critical": 1.0 / recovery_time_critical,
+            "death_rate_normal": 1.0 / death_time_normal,
+            "death_chance_normal": death_chance_normal,
+            "death_rate_over": 1.0 / death_time_over,
+            "death_chance_over": death_chance_over
+        }
+        
+        kapasitas_rs = self.kabko.kapasitas_rs_table(days)
+        ret = self.integrate(days, values, {"exposed_rate_normal": exposed_rate_normal}, kapasitas_rs, sanity_check_mode=sanity_check_mode)
+        ret.extra["kapasitas_rs"] = ret.capacity
+        ret.extra["mortality_rate"] = lambda: self.mortality_rate(ret.t, ret.exposed, ret.dead, values["infectious_rate"])
+        ret.extra["r0_normal"] = lambda: logistic_rt(ret.t)
+        return ret
 
-Model = SeicrdRlModel
\ No newline at end of file
+Model = SeicrdRlModel
@@ -1,134 +1,223 @@
 import numpy as np
 from scipy.integrate import odeint, solve_ivp
 import lmfit
-from .. import util
+from .. import util, config, instrumentation
 from .base_model import BaseModel
+from . import kernel
+from .cache import ModelCache, ModelCheckpoints
+from .graph import CompartmentGraph, Flow, Capacity
 import math
 
 class SeicrdRlcModelResult:
-    def __init__(self, t, population, susceptible, exposed_normal, exposed_over, infectious, critical, recovered_normal, recovered_critical, dead_normal, dead_over, mortality_rate, r0_normal, kapasitas_rs, r0_over, r0_overall, test_coverage, sanity_check_mode=util.SANITY_CHECK_CORRECT):
+    compartments = ("population", "susceptible", "exposed_normal", "exposed_over", "infectious", "critical", "recovered_normal", "recovered_critical", "dead_normal", "dead_over")
+    __slots__ = ("t", "_y", "kapasitas_rs", "test_coverage", "_rates", "sanity_check_mode", "_memo")
+    
+    def __init__(self, t, y, kapasitas_rs, test_coverage, rates, sanity_check_mode=util.SANITY_CHECK_CORRECT):
         self.t = t
-        self.population = population
-        self.susceptible = susceptible
-        self.exposed_normal = util.sanity_clamp(exposed_normal, sanity_check_mode)
-        self.exposed_over = util.sanity_clamp(exposed_over, sanity_check_mode)
-        self.infectious = util.sanity_clamp(infectious, sanity_check_mode)
-        self.critical = util.sanity_clamp(critical, sanity_check_mode)
-        self.recovered_normal = util.sanity_clamp(recovered_normal, sanity_check_mode)
-        self.recovered_critical = util.sanity_clamp(recovered_critical, sanity_check_mode)
-        self.dead_normal = util.sanity_clamp(dead_normal, sanity_check_mode)
-        self.dead_over = util.sanity_clamp(dead_over, sanity_check_mode)
-        self.mortality_rate = util.sanity_clamp(mortality_rate, sanity_check_mode)
-        self.r0_normal = r0_normal
+        #compartments as the rows of one array, in the order of compartments
+        self._y = np.ascontiguousarray(y, dtype=float)
+        self._y.flags.writeable = False
         self.kapasitas_rs = kapasitas_rs
-        self.r0_over = r0_over
-        self.r0_overall = r0_overall
         self.test_coverage = test_coverage
+        #what SeicrdRlcModel.derived needs for mortality rate and r0, which fitting never reads
+        self._rates = rates
+        self.sanity_check_mode = sanity_check_mode
+        #derived series are computed on first access and kept, read only since they're shared
+        self._memo = {}
+        
+    def _get(self, name, f):
+        ret = self._memo.get(name)
+        if ret is None:
+            ret = np.asarray(f())
+            ret.flags.writeable = False
+            self._memo[name] = ret
+        return ret
+        
+    def _clamped(self, i):
+        return self._get(SeicrdRlcModelResult.compartments[i], lambda: util.sanity_clamp(self._y[i], self.sanity_check_mode, SeicrdRlcModelResult.compartments[i]))
+        
+    @property
+    def y(self):
+        #raw integrated state, (days, 10), before any clamping
+        return self._y.T
+        
+    @property
+    def states(self):
+        #the same (days, compartments) accessor as GraphResult.states
+        return self._y.T
+        
+    @property
+    def population(self):
+        return self._y[0]
+        
+    @property
+    def susceptible(self):
+        return self._y[1]
+        
+    @property
+    def exposed_normal(self):
+        return self._clamped(2)
+        
+    @property
+    def exposed_over(self):
+        return self._clamped(3)
+        
+    @property
+    def infectious(self):
+        return self._clamped(4)
+        
+    @property
+    def critical(self):
+        return self._clamped(5)
+        
+    @property
+    def recovered_normal(self):
+        return self._clamped(6)
+        
+    @property
+    def recovered_critical(self):
+        return self._clamped(7)
+        
+    @property
+    def dead_normal(self):
+        return self._clamped(8)
+        
+    @property
+    def dead_over(self):
+        return self._clamped(9)
+        
+    def _derived(self, name):
+        if name not in self._memo:
+            for k, v in SeicrdRlcModel.derived(self.t, self._y, self.kapasitas_rs, *self._rates).items():
+                self._get(k, lambda: v)
+        return self._memo[name]
+        
+    @property
+    def mortality_rate(self):
+        return self._get("mortality_rate", lambda: util.sanity_clamp(self._derived("mortality_rate_raw"), self.sanity_check_mode, "mortality_rate"))
+        
+    @property
+    def r0_normal(self):
+        return self._derived("r0_normal")
+        
+    @property
+    def r0_over(self):
+        return self._derived("r0_over")
+        
+    @property
+    def r0_overall(self):
+        return self._derived("r0_overall")
+        
+    def _series(self, name):
+        return self._get(name, lambda: SeicrdRlcModel.graph.series(self._y, self.kapasitas_rs, [name], self.sanity_check_mode)[name])
         
     def exposed(self):
-        return self.exposed_normal + self.exposed_over
+        return self._series("exposed")
         
     def critical_cared(self):
-        return SeicrdRlcModel.critical_cared(self.critical, self.kapasitas_rs)
+        return self._series("critical_cared")
         
     def critical_over(self):
-        return SeicrdRlcModel.critical_over(self.critical, self.kapasitas_rs)
+        return self._series("critical_over")
         
     def infectious_all(self):
-        return self.infectious + self.critical
+        return self._series("infectious_all")
         
     def recovered(self):
-        return self.recovered_normal + self.recovered_critical
+        return self._series("recovered")
         
     def dead(self):
-        return self.dead_normal + self.dead_over
+        return self._series("dead")
         
     def over(self):
-        return self.critical_over() + self.dead_over
+        return self._series("over")
         
     def infectious_scaled(self):
-        return self.test_coverage * (self.infectious + self.critical_over())
+        return self._get("infectious_scaled", lambda: self.test_coverage * (self.infectious + self.critical_over()))
         
     def critical_cared_scaled(self):
         return self.critical_cared()
         
     def infectious_all_scaled(self):
-        return self.infectious_scaled() + self.critical_cared_scaled()
+        return self._get("infectious_all_scaled", lambda: self.infectious_scaled() + self.critical_cared_scaled())
         
     def recovered_scaled(self):
-        return self.test_coverage * self.recovered_normal + self.recovered_critical
+        return self._get("recovered_scaled", lambda: self.test_coverage * self.recovered_normal + self.recovered_critical)
         
     def dead_scaled(self):
-        return self.test_coverage * self.dead_over + self.dead_normal
+        return self._get("dead_scaled", lambda: self.test_coverage * self.dead_over + self.dead_normal)
         
     def infected_scaled(self):
-        return self.infectious_all_scaled() + self.recovered_scaled() + self.dead_scaled()
+        return self._get("infected_scaled", lambda: self.infectious_all_scaled() + self.recovered_scaled() + self.dead_scaled())
+        
+    def _daily(self, name, f):
+        return self._get("daily_" + name, lambda: util.delta(f()))
     
     def daily_susceptible(self):
-        return util.delta(self.susceptible)
+        return self._daily("susceptible", lambda: self.susceptible)
         
     def daily_exposed_normal(self):
-        return util.delta(self.exposed_normal)
+        return self._daily("exposed_normal", lambda: self.exposed_normal)
         
     def daily_exposed_over(self):
-        return util.delta(self.exposed_over)
+        return self._daily("exposed_over", lambda: self.exposed_over)
         
     def daily_exposed(self):
-        return util.delta(self.exposed())
+        return self._daily("exposed", self.exposed)
         
     def daily_infectious(self):
-        return util.delta(self.infectious)
+        return self._daily("infectious", lambda: self.infectious)
         
     def daily_critical_cared(self):
-        return util.delta(self.critical_cared())
+        return self._daily("critical_cared", self.critical_cared)
         
     def daily_critical_over(self):
-        return util.delta(self.critical_over())
+        return self._daily("critical_over", self.critical_over)
         
     def daily_critical(self):
-        return util.delta(self.critical)
+        return self._daily("critical", lambda: self.critical)
         
     def daily_infectious_all(self):
-        return util.delta(self.infectious_all())
+        return self._daily("infectious_all", self.infectious_all)
         
     def daily_recovered_normal(self):
-        return util.delta(self.recovered_normal)
+        return self._daily("recovered_normal", lambda: self.recovered_normal)
         
     def daily_recovered_critical(self):
-        return util.delta(self.recovered_critical)
+        return self._daily("recovered_critical", lambda: self.recovered_critical)
         
     def daily_recovered(self):
-        return util.delta(self.recovered())
+        return self._daily("recovered", self.recovered)
         
     def daily_dead_normal(self):
-        return util.delta(self.dead_normal)
+        return self._daily("dead_normal", lambda: self.dead_normal)
         
     def daily_dead_over(self):
-        return util.delta(self.dead_over)
+        return self._daily("dead_over", lambda: self.dead_over)
         
     def daily_dead(self):
-        return util.delta(self.dead())
+        return self._daily("dead", self.dead)
         
     def daily_over(self):
-        return tuil.delta(self.over())
+        return self._daily("over", self.over)
     
     def daily_infectious_scaled(self):
-        return util.delta(self.infectious_scaled())
+        return self._daily("infectious_scaled", self.infectious_scaled)
         
     def daily_critical_cared_scaled(self):
-        return util.delta(self.critical_cared_scaled())
+        return self._daily("critical_cared_scaled", self.critical_cared_scaled)
         
     def daily_infectious_all_scaled(self):
-        return util.delta(self.infectious_all_scaled())
+        return self._daily("infectious_all_scaled", self.infectious_all_scaled)
         
     def daily_recovered_scaled(self):
-        return util.delta(self.recovered_scaled())
+        return self._daily("recovered_scaled", self.recovered_scaled)
         
     def daily_dead_scaled(self):
-        return util.delta(self.dead_scaled())
+        return self._daily("dead_scaled", self.dead_scaled)
         
     def daily_infected_scaled(self):
-        return util.delta(self.infected_scaled())
+        return self._daily("infected_scaled", self.infected_scaled)
         
     def get_dataset(self, d, shift=0):
         # TODO
@@ -154,7 +243,41 @@ class SeicrdRlcModelResult:
         
     def get_datasets_values(self, datasets, shift=0):
         return np.array([self.get_dataset(k, shift) for k in datasets])
-        
+
+    def get_datasets_into(self, datasets, out, start=0, end=None):
+        '''
+        Writes days start..end of datasets as the rows of out, same values as get_datasets_values.
+        Only the slices are computed and nothing is memoized, so it's cheap for a result read once.
+        '''
+        s = slice(start, end)
+        infectious = self.infectious[s]
+        critical = self.critical[s]
+        kapasitas_rs = self.kapasitas_rs[s]
+        test_coverage = self.test_coverage[s]
+        for row, d in zip(out, datasets):
+            if d in ("infectious", "infectious_all", "infected"):
+                #test_coverage * (infectious + critical_over)
+                np.subtract(critical, kapasitas_rs, out=row)
+                np.maximum(row, 0, out=row)
+                np.add(infectious, row, out=row)
+                row *= test_coverage
+                if d != "infectious":
+                    row += np.minimum(critical, kapasitas_rs)
+                if d == "infected":
+                    row += test_coverage * self.recovered_normal[s] + self.recovered_critical[s]
+                    row += test_coverage * self.dead_over[s] + self.dead_normal[s]
+            elif d == "critical_cared":
+                np.minimum(critical, kapasitas_rs, out=row)
+            elif d == "recovered":
+                np.multiply(test_coverage, self.recovered_normal[s], out=row)
+                row += self.recovered_critical[s]
+            elif d == "dead":
+                np.multiply(test_coverage, self.dead_over[s], out=row)
+                row += self.dead_normal[s]
+            else:
+                raise ValueError("Invalid dataset: " + str(d))
+        return out
+
 class SeicrdRlcModel(BaseModel):
     params = ["infectious_rate",
                     "critical_chance", "critical_rate", 
@@ -163,10 +286,51 @@ class SeicrdRlcModel(BaseModel):
                     "death_chance_over", "death_rate_over", 
                     "exposed_rate_over", "k", "kapasitas_rs_mul",
                     "test_coverage_0", "test_coverage_increase", "test_coverage_max"]
+    continues = True
+    initial_exposed = None
+    
+    #critical above kapasitas_rs aren't cared for, die on their own rate and infect others
+    graph = CompartmentGraph(
+        SeicrdRlcModelResult.compartments,
+        [
+            Flow("exposed_flow_normal", "susceptible", "exposed_normal", "exposed_rate_normal", infector="infectious"),
+            Flow("exposed_flow_over", "susceptible", "exposed_over", "exposed_rate_over", infector="critical_over"),
+            Flow("infectious_flow_normal", "exposed_normal", "infectious", "infectious_rate"),
+            Flow("infectious_flow_over", "exposed_over", "infectious", "infectious_rate"),
+            Flow("recovery_flow_normal", "infectious", "recovered_normal", "recovery_rate_normal", "1-critical_chance"),
+            Flow("recovery_flow_critical", "critical_cared", "recovered_critical", "recovery_rate_critical", "1-death_chance_normal"),
+            Flow("death_flow_normal", "critical_cared", "dead_normal", "death_rate_normal", "death_chance_normal"),
+            Flow("death_flow_over", "critical_over", "dead_over", "death_rate_over", "death_chance_over"),
+            Flow("critical_flow", "infectious", "critical", "critical_rate", "critical_chance")
+        ],
+        capacity=Capacity("critical", "critical_cared", "critical_over"),
+        series={
+            "exposed": ("exposed_normal", "exposed_over"),
+            "critical_cared": ("critical_cared",),
+            "critical_over": ("critical_over",),
+            "infectious_all": ("infectious", "critical"),
+            "recovered": ("recovered_normal", "recovered_critical"),
+            "dead": ("dead_normal", "dead_over"),
+            "over": ("critical_over", "dead_over")
+        },
+        seed="exposed_normal"
+    )
+    flows = graph.flows
+    #flows in the order of flows, mapped onto dydt
+    stoichiometry = graph.stoichiometry
                     
-    def __init__(self, kabko):
+    def __init__(self, kabko, compiled=False, jacobian=True, cache=True, checkpoint=True):
         super().__init__(kabko) 
-        self.prev_dydt = None
+        #use the flat (numba-compiled if available) rhs kernel instead of deriv, False integrates the graph rhs in numpy
+        self.compiled = compiled
+        #give odeint the analytic jacobian instead of letting it difference deriv when stiff
+        self.jacobian = jacobian
+        #lru of model() results by parameter vector, set cache.enabled = False to switch it off
+        self.cache = ModelCache()
+        self.cache.enabled = cache
+        #recent trajectories to reuse when the changed params only act after the days asked for
+        self.checkpoints = ModelCheckpoints()
+        self.checkpoints.enabled = checkpoint
     
     def critical_cared(critical, kapasitas_rs):
         ret = critical[:]
@@ -176,8 +340,31 @@ class SeicrdRlcModel(BaseModel):
         ret = critical-kapasitas_rs
         return np.clip(ret, a_min=0, a_max=None)
         
+    def rates(exposed_rate_over, 
+                    infectious_rate, 
+                    critical_rate, critical_chance, 
+                    recovery_rate_normal, recovery_rate_critical, 
+                    death_rate_normal, death_chance_normal, 
+                    death_rate_over, death_chance_over,
+                    exposed_rate_normal=None):
+        #graph values, without exposed_rate_normal it's left to vary
+        ret = {
+            "exposed_rate_over": exposed_rate_over,
+            "infectious_rate": infectious_rate,
+            "critical_rate": critical_rate,
+            "critical_chance": critical_chance,
+            "recovery_rate_normal": recovery_rate_normal,
+            "recovery_rate_critical": recovery_rate_critical,
+            "death_rate_normal": death_rate_normal,
+            "death_chance_normal": death_chance_normal,
+            "death_rate_over": death_rate_over,
+            "death_chance_over": death_chance_over
+        }
+        if exposed_rate_normal is not None:
+            ret["exposed_rate_normal"] = exposed_rate_normal
+        return ret
+        
     def deriv(self, y, t, population,
-    #def deriv(self, t, y, population,
                     exposed_rate_normal, exposed_rate_over, 
                     infectious_rate, 
                     critical_rate, critical_chance, 
@@ -185,83 +372,141 @@ class SeicrdRlcModel(BaseModel):
                     death_rate_normal, death_chance_normal, 
                     death_rate_over, death_chance_over, kapasitas_rs, 
                     sanity_check_mode=util.SANITY_CHECK_CORRECT):
-                    
+        #dydt at one t, see graph.rhs for the one _model integrates
+        #only corrects, see sanity_check_trajectory for the checks, done once on the integrated trajectory
+        coefficients = SeicrdRlcModel.graph.coefficients(SeicrdRlcModel.rates(
+            exposed_rate_over, 
+            infectious_rate, 
+            critical_rate, critical_chance, 
+            recovery_rate_normal, recovery_rate_critical, 
+            death_rate_normal, death_chance_normal, 
+            death_rate_over, death_chance_over,
+            exposed_rate_normal(t)
+        ))
+        return SeicrdRlcModel.graph.deriv(y, coefficients, kapasitas_rs(t), population, sanity_check_mode == util.SANITY_CHECK_CORRECT, self.compiled)
+        
+    def deriv_jacobian(self, y, t, population,
+                    exposed_rate_normal, exposed_rate_over, 
+                    infectious_rate, 
+                    critical_rate, critical_chance, 
+                    recovery_rate_normal, recovery_rate_critical, 
+                    death_rate_normal, death_chance_normal, 
+                    death_rate_over, death_chance_over, kapasitas_rs, 
+                    sanity_check_mode=util.SANITY_CHECK_CORRECT):
+        coefficients = SeicrdRlcModel.graph.coefficients(SeicrdRlcModel.rates(
+            exposed_rate_over, 
+            infectious_rate, 
+            critical_rate, critical_chance, 
+            recovery_rate_normal, recovery_rate_critical, 
+            death_rate_normal, death_chance_normal, 
+            death_rate_over, death_chance_over,
+            exposed_rate_normal(t)
+        ))
+        return SeicrdRlcModel.graph.jacobian(y, coefficients, kapasitas_rs(t), population, sanity_check_mode == util.SANITY_CHECK_CORRECT, self.compiled)
+
+    def sanity_check_trajectory(self, t, y, population,
+                    exposed_rate_normal_val, kapasitas_rs_val, exposed_rate_over,
+                    infectious_rate,
+                    critical_rate, critical_chance,
+                    recovery_rate_normal, recovery_rate_critical,
+                    death_rate_normal, death_chance_normal,
+                    death_rate_over, death_chance_over,
+                    sanity_check_mode=util.SANITY_CHECK_ERROR):
         '''
-        if sanity_check_mode != util.SANITY_CHECK_IGNORE:
-            print("Nonzero sanity check")
+        The checks deriv used to do on every call, done once on the integrated days.
+        y is (10, days), exposed_rate_normal_val and kapasitas_rs_val are per day.
+        Returns the violations as (name, day, value, message), earliest day first. Raises on the first one in SANITY_CHECK_ERROR mode.
         '''
-        population_y, susceptible, exposed_normal, exposed_over, infectious, critical, recovered_normal, recovered_critical, dead_normal, dead_over = y
-        
-        y_name = ("population", "susceptible", "exposed_normal", "exposed_over", "infectious", "critical", "recovered_normal", "recovered_critical", "dead_normal", "dead_over")
-        if sanity_check_mode:
-            population_y, susceptible, exposed_normal, exposed_over, infectious, critical, recovered_normal, recovered_critical, dead_normal, dead_over = [util.sanity_check_init(*args, sanity_check_mode) for args in zip(y_name, y)]
-        
-        exposed_flow_normal = exposed_rate_normal(t) * susceptible * infectious / population
-        
-        
-        infectious_flow_normal = infectious_rate * exposed_normal * 1
-        infectious_flow_over = infectious_rate * exposed_over * 1
-        
-        recovery_flow_normal = recovery_rate_normal * infectious * (1.0-critical_chance)
-        critical_flow = critical_rate * infectious * critical_chance
-        
-        #tricky part because I must not take y+dy (the flow) into account, because I need dt to do that
-        kapasitas_rs_val = kapasitas_rs(t)
-        critical_cared = min(kapasitas_rs_val, critical)
-        critical_over = max(0, critical-critical_cared)
-        
-        
-        if critical_over > 0 and critical_cared < kapasitas_rs_val:
-            raise Exception("There can't be critical_over if critical_cared is below kapasitas_rs_val")
-        
-        exposed_flow_over = exposed_rate_over * susceptible * critical_over / population
-        recovery_flow_critical = recovery_rate_critical * critical_cared * (1.0-death_chance_normal)
-        
-        
-        
-        if recovery_flow_normal > infectious:
-            raise Exception("There can't be more people recovering than infected people. (%f, %f, %f. %f)" % (recovery_rate_normal, critical_chance, recovery_flow_normal, infectious))
-        
-        if recovery_flow_critical > critical_cared:
-            raise Exception("There can't be more people recovering than being cared")
-        
-        
-        death_flow_normal = death_rate_normal * critical_cared * death_chance_normal
-        death_flow_over = death_rate_over * critical_over * death_chance_over
-        
-        if death_flow_over > 0 and critical_cared < kapasitas_rs_val:
-            raise Exception("There can't be death_flow_over if critical_cared is below kapasitas_rs_val")
-        
-        flow = exposed_flow_normal, exposed_flow_over, infectious_flow_normal, infectious_flow_over, recovery_flow_normal, recovery_flow_critical, death_flow_normal, death_flow_over, critical_flow
-        
-        if sanity_check_mode:
-            flow_name = ("exposed_flow_normal", "exposed_flow_over", "infectious_flow_normal", "infectious_flow_over", "recovery_flow_normal", "recovery_flow_critical", "death_flow_normal", "death_flow_over", "critical_flow")
-            exposed_flow_normal, exposed_flow_over, infectious_flow_normal, infectious_flow_over, recovery_flow_normal, recovery_flow_critical, death_flow_normal, death_flow_over, critical_flow = [util.sanity_check_flow(*args, sanity_check_mode) for args in zip(flow_name, flow)]
-        
-        dSdt = -exposed_flow_normal - exposed_flow_over
-        dENdt = exposed_flow_normal - infectious_flow_normal
-        dEOdt = exposed_flow_over - infectious_flow_over
-        dIdt = infectious_flow_normal + infectious_flow_over - recovery_flow_normal - critical_flow
-        dCdt = critical_flow - recovery_flow_critical - death_flow_normal - death_flow_over
-        dRNdt = recovery_flow_normal
-        dRCdt = recovery_flow_critical
-        dDNdt = death_flow_normal
-        dDOdt = death_flow_over
-        dPdt = dSdt + dENdt + dEOdt + dIdt + dCdt + dRNdt + dRCdt + dDNdt + dDOdt
+        infectious, critical = y[4], y[5]
+        critical_cared = np.minimum(kapasitas_rs_val, critical)
+        coefficients = SeicrdRlcModel.graph.coefficients(SeicrdRlcModel.rates(
+            exposed_rate_over,
+            infectious_rate,
+            critical_rate, critical_chance,
+            recovery_rate_normal, recovery_rate_critical,
+            death_rate_normal, death_chance_normal,
+            death_rate_over, death_chance_over,
+            exposed_rate_normal_val
+        ))
+        flow = SeicrdRlcModel.graph.flow_values(y, coefficients, kapasitas_rs_val, population)
+        recovery_flow_normal, recovery_flow_critical = flow[4], flow[5]
+        dydt = SeicrdRlcModel.stoichiometry @ flow
+
+        mode = util.SANITY_CHECK_CORRECT
+        compartments = SeicrdRlcModelResult.compartments
+        ret = util.sanity_check_trajectory(compartments, y, mode, t)
+        ret += util.sanity_check_trajectory(SeicrdRlcModel.flows, flow, mode, t)
+        ret += util.sanity_check_trajectory(compartments, y + dydt, mode, t, message="can't flow more than source")
+        ret += util.sanity_check_trajectory(["recovery_flow_normal"], np.where(infectious > 0, infectious - recovery_flow_normal, 0), mode, t, 0, "can't be more than infectious")
+        ret += util.sanity_check_trajectory(["recovery_flow_critical"], np.where(critical_cared > 0, critical_cared - recovery_flow_critical, 0), mode, t, 0, "can't be more than critical_cared")
+        ret.sort(key=lambda v: v[1])
+
+        if ret and sanity_check_mode == util.SANITY_CHECK_ERROR:
+            util.raise_sanity_error(ret[0])
+        return ret
+
+    def model(self, days, sanity_check_mode=util.SANITY_CHECK_CORRECT, state=None, **kwargs):
         '''
-        if dPdt != 0:
-            raise Exception("Population must not change: %f" % (dPdt,))
+        state=(t0, y0) continues from the compartments y0 at day t0 instead of the seed at day 0.
+        The result then only covers days t0 to days-1, unless history gives the states of the days before t0.
         '''
-        dydt = dPdt, dSdt, dENdt, dEOdt, dIdt, dCdt, dRNdt, dRCdt, dDNdt, dDOdt
-        
-        if sanity_check_mode:
-            y1 = [util.sanity_check_y(*args, sanity_check_mode) for args in zip(y_name, y, dydt)]
-        
-        self.prev_dydt = dict(zip(y_name, dydt))
+        names = self.ensemble_params()
+        if state is not None or any(n not in kwargs for n in names):
+            return self._model(days, sanity_check_mode=sanity_check_mode, state=state, **kwargs)
+        if not self.cache.enabled:
+            return self._model_checkpointed(days, sanity_check_mode, kwargs)
+        key = self.cache.key(days, sanity_check_mode, *[kwargs[n] for n in names])
+        return self.cache.get_or_compute(key, lambda: self._model_checkpointed(days, sanity_check_mode, kwargs))
+        
+    def ode_params(self):
+        #the test coverage params only scale the datasets afterwards
+        return [p for p in self.ensemble_params() if not p.startswith("test_coverage")]
+        
+    def resume_days(self, kwargs, y):
+        '''
+        Last day of the trajectory y each of ode_params() can't have affected, None if it affects it from day 0.
+        r_i only moves Rt through its logistic step, whose effect stays below FLOAT_TOLERANCE
+        until about log(1/(k*tolerance))/k days before the step.
+        The over params only act once critical is above kapasitas_rs.
+        '''
+        k = float(kwargs["k"])
+        lead = math.log(1.0 / (k * config.FLOAT_TOLERANCE)) / k if k > 0 else float("inf")
+        rt_delta = self.kabko.get_rt_delta(self.kabko.get_kwargs_rt(kwargs))
+        rt_resume = [None] + [int(math.floor(day - lead)) if lead < float("inf") else None for day, delta in rt_delta]
+        
+        kapasitas_rs = self.kabko.kapasitas_rs_table(len(y))[:len(y)] * float(kwargs["kapasitas_rs_mul"])
+        #the capacity in effect over (d-1, d) is that of day d-1
+        critical = y[:, 5]
+        over = np.flatnonzero(np.maximum(critical[:-1], critical[1:]) >= kapasitas_rs[:-1]) + 1
+        over_resume = (over[0] if len(over) > 0 else len(y)) - 2
+        
+        ret = []
+        for p in self.ode_params():
+            if p.startswith("r_"):
+                ret.append(rt_resume[int(p[2:])])
+            elif p in ("exposed_rate_over", "death_rate_over", "death_chance_over"):
+                ret.append(over_resume)
+            else:
+                ret.append(None)
+        return ret
         
-        return dydt
+    def _model_checkpointed(self, days, sanity_check_mode, kwargs):
+        days = int(days)
+        if not self.checkpoints.enabled:
+            return self._model(days, sanity_check_mode=sanity_check_mode, **kwargs)
+        values = tuple(float(kwargs[n]) for n in self.ode_params())
+        found = self.checkpoints.find(sanity_check_mode, values, lambda y: self.resume_days(kwargs, y), days)
+        if found is None:
+            ret = self._model(days, sanity_check_mode=sanity_check_mode, **kwargs)
+            self.checkpoints.count_days(days, 0)
+            self.checkpoints.put(sanity_check_mode, values, ret.y)
+        else:
+            #the stored states, only the series are made again
+            ret = self._model(days, sanity_check_mode=sanity_check_mode, state=(days-1, found[-1]), history=found[:-1], **kwargs)
+            self.checkpoints.count_days(0, days)
+        return ret
         
-    def model(self, days, infectious_rate,
+    def _model(self, days, infectious_rate,
                     critical_chance, critical_rate, 
                     recovery_rate_normal, recovery_rate_critical,
                     death_chance_normal, death_rate_normal,
@@ -269,11 +514,13 @@ class SeicrdRlcModel(BaseModel):
                     exposed_rate_over, k, kapasitas_rs_mul,
                     test_coverage_0, test_coverage_increase, test_coverage_max,
                     sanity_check_mode=util.SANITY_CHECK_CORRECT,
+                    state=None, history=None,
                     **kwargs):
         '''
         if sanity_check_mode != util.SANITY_CHECK_IGNORE:
             print("Nonzero sanity check")
         '''
+        #history holds the states of days before state's t0, to report the whole trajectory
         days = int(days)
         #unpack rt values
         rt_values = self.kabko.get_kwargs_rt(kwargs)
@@ -294,71 +541,95 @@ class SeicrdRlcModel(BaseModel):
         #recovery_rate_critical = 1.0 / recovery_time_critical #this is derived parameter
         #death_rate_over = 1.0/death_time_over # this is a derived parameter
         
+        #time-varying inputs are laid out once here so deriv only has to index into them
+        kapasitas_rs_table = (self.kabko.kapasitas_rs_table(days) * kapasitas_rs_mul).tolist()
+        kapasitas_rs_last = len(kapasitas_rs_table) - 1
+        
         def kapasitas_rs(t):
-            kap = self.kabko.kapasitas_rs(t)
-            '''
-            if kapasitas_rs_mul != 1:
-                raise Exception("kapasitas_rs_mul must be 1")
-            if kap != 1352:
-                raise Exception("kap must be 1352")
-            '''
-            return kap * kapasitas_rs_mul
-        
-        def test_coverage(t):
-            return min(test_coverage_max, test_coverage_0 + test_coverage_increase * t)
+            return kapasitas_rs_table[min(int(t), kapasitas_rs_last)]
         
         def logistic_rt(t):
             return self.kabko.logistic_rt(r_0, rt_delta, t, k)
 
+        rt_resolution = config.RT_TABLE_RESOLUTION * max(1, math.ceil(k))
+        rt_t = np.arange(days * rt_resolution + 1) / rt_resolution
+        rt_table = util.hermite_table(
+            infectious_leave_rate_opt * self.kabko.logistic_rt_array(r_0, rt_delta, rt_t, k),
+            infectious_leave_rate_opt * self.kabko.logistic_rt_slope_array(rt_delta, rt_t, k),
+            1.0 / rt_resolution
+        )
+        #the kernel reads the array itself, only deriv needs python floats
+        use_kernel = self.compiled
+        rt_table_list = None if use_kernel else rt_table.tolist()
+        rt_table_len = len(rt_table)
+
         def exposed_rate_normal(t):
+            ts = t * rt_resolution
+            i = int(ts)
+            if i < rt_table_len:
+                c0, c1, c2, c3 = rt_table_list[i]
+                s = ts - i
+                return ((c3*s + c2)*s + c1)*s + c0
+            #odeint may step past the last day
             rt = logistic_rt(t)
             #ret = rt * recovery_rate_normal * (1-critical_chance) + rt * critical_rate * critical_chance
             ret = rt * infectious_leave_rate_opt
             #ret = logistic_rt(t) / infectious_period_opt
             return ret
         
-        _r0_over = exposed_rate_over / death_rate_over
-        def r0_normal(t, infectious):
-            return logistic_rt(t) if infectious > 0 else 0
-            
-        def r0_over(critical_over):
-            return _r0_over if critical_over > 0 else 0
-            
-        def r0_overall(t, infectious, critical_over):
-            #return exposed_rate_over / death_rate_over# * critical_chance * (critical_over/population)
-            tot = infectious+critical_over
-            if tot == 0: 
-                return 0
-            elif infectious == 0:
-                return r0_over(critical_over)
-            elif critical_over == 0:
-                return r0_normal(t, infectious)
-            else:
-                nor = exposed_rate_normal(t) / infectious_leave_rate_opt * infectious/tot
-                over = exposed_rate_over / death_rate_over * critical_over/tot
-                return nor + over
-        
-        seed = self.kabko.seed
-        population_init, susceptible_init, exposed_normal_init, exposed_over_init, infectious_init, critical_init, recovered_normal_init, recovered_critical_init, dead_normal_init, dead_over_init = population, population-seed, seed, 0, 0, 0, 0, 0, 0, 0  # initial conditions: one exposed, rest susceptible
-        
-        y0 = population_init, susceptible_init, exposed_normal_init, exposed_over_init, infectious_init, critical_init, recovered_normal_init, recovered_critical_init, dead_normal_init, dead_over_init # Initial conditions tuple
+        y0 = SeicrdRlcModel.graph.initial(population, self.kabko.seed) # Initial conditions
 
         
         # Integrate the SIR equations over the time grid, t.
         t = np.linspace(0, days-1, days) # days
         
-        with util.odeint_lock:
-            ret = odeint(self.deriv, y0, t, args=(
-                population,
-                exposed_rate_normal, exposed_rate_over, 
-                infectious_rate, 
-                critical_rate, critical_chance, 
-                recovery_rate_normal, recovery_rate_critical, 
-                death_rate_normal, death_chance_normal, 
-                death_rate_over, death_chance_over,
-                kapasitas_rs,
-                sanity_check_mode
-            ))
+        t0 = 0
+        if state is not None:
+            t0, y0 = state
+            t0 = int(t0)
+        
+        if use_kernel:
+            rt_delta_arr = np.array(rt_delta, dtype=float).reshape(-1, 2)
+            deriv = kernel.seicrd_rlc_deriv
+            jacobian = kernel.seicrd_rlc_jacobian
+            args = (
+                float(population),
+                rt_table, rt_resolution, float(r_0), rt_delta_arr[:, 0].copy(), rt_delta_arr[:, 1].copy(), float(k), float(infectious_leave_rate_opt),
+                np.array(kapasitas_rs_table), float(exposed_rate_over), 
+                float(infectious_rate), 
+                float(critical_rate), float(critical_chance), 
+                float(recovery_rate_normal), float(recovery_rate_critical), 
+                float(death_rate_normal), float(death_chance_normal), 
+                float(death_rate_over), float(death_chance_over),
+                sanity_check_mode == util.SANITY_CHECK_CORRECT
+            )
+        else:
+            deriv, jacobian = SeicrdRlcModel.graph.rhs(
+                SeicrdRlcModel.rates(
+                    exposed_rate_over, 
+                    infectious_rate, 
+                    critical_rate, critical_chance, 
+                    recovery_rate_normal, recovery_rate_critical, 
+                    death_rate_normal, death_chance_normal, 
+                    death_rate_over, death_chance_over
+                ),
+                {"exposed_rate_normal": exposed_rate_normal},
+                kapasitas_rs, population, sanity_check_mode == util.SANITY_CHECK_CORRECT, False
+            )
+            args = ()
+        
+        if t0 < days-1:
+            deriv = instrumentation.timed_function("rhs", deriv)
+            jacobian = instrumentation.timed_function("rhs_jacobian", jacobian)
+            with util.odeint_lock, instrumentation.timed("integration"):
+                ret = odeint(deriv, y0, t[t0:], args=args, Dfun=jacobian if self.jacobian else None)
+        else:
+            ret = np.array([y0], dtype=float)
+        
+        if history is not None:
+            ret = np.concatenate((history, ret))
+        else:
+            t = t[t0:]
             
         retT = ret.T
         '''
@@ -374,36 +645,295 @@ class SeicrdRlcModel(BaseModel):
         ))
         retT = sol.sol(t)
         '''
-        population_2, susceptible, exposed_normal, exposed_over, infectious, critical, recovered_normal, recovered_critical,  dead_normal, dead_over = retT
         
-        kapasitas_rs_val = util.map_function(t, kapasitas_rs)
-        #kapasitas_rs_val = np.zeros(days)
+        #series the datasets need; mortality rate and r0 are left to the result, computed if read
+        day_index = t.astype(int)
+        kapasitas_rs_val = np.array(kapasitas_rs_table)[np.minimum(day_index, kapasitas_rs_last)]
+        
+        test_coverage_val = np.minimum(float(test_coverage_max), test_coverage_0 + test_coverage_increase * t)
+        
+        #t are whole days, where the rt table is exact
+        exposed_rate_normal_val = rt_table[day_index * rt_resolution, 0]
+        
+        if sanity_check_mode == util.SANITY_CHECK_ERROR:
+            self.sanity_check_trajectory(t, retT, population,
+                exposed_rate_normal_val, kapasitas_rs_val, exposed_rate_over,
+                infectious_rate,
+                critical_rate, critical_chance,
+                recovery_rate_normal, recovery_rate_critical,
+                death_rate_normal, death_chance_normal,
+                death_rate_over, death_chance_over,
+                sanity_check_mode
+            )
+        
+        rates = (r_0, rt_delta, k, infectious_rate, exposed_rate_over, death_rate_over, infectious_leave_rate_opt, exposed_rate_normal_val)
+        return SeicrdRlcModelResult(t, retT, kapasitas_rs_val, test_coverage_val, rates, sanity_check_mode)
+        
+    def derived(t, y, kapasitas_rs_val, r_0, rt_delta, k, infectious_rate, exposed_rate_over, death_rate_over, infectious_leave_rate_opt, exposed_rate_normal_val):
+        #mortality rate and r0 series of a trajectory, whole days at once
+        population_2, susceptible, exposed_normal, exposed_over, infectious, critical, recovered_normal, recovered_critical,  dead_normal, dead_over = y
         
         exposed = util.sum_element(exposed_normal, exposed_over)
         dead = util.sum_element(dead_normal, dead_over)
-        mortality_rate_val = self.mortality_rate(t, exposed, dead, infectious_rate)
-        #mortality_rate_val = np.zeros(days)
+        mortality_rate_val = BaseModel.mortality_rate(None, t, exposed, dead, infectious_rate)
+        
+        #same summation order as kabko.logistic_rt, on the whole t
+        rt_val = r_0 + sum([delta / (1 + np.exp(k*(-t+day))) for day, delta in rt_delta]) + np.zeros(len(t))
+        r0_normal_val = np.where(infectious > 0, rt_val, 0)
         
-        test_coverage_val = util.map_function(t, test_coverage)
-        r0_normal_val = util.map_function(zip(t, infectious), r0_normal, unpack=True)
         critical_over = SeicrdRlcModel.critical_over(critical, kapasitas_rs_val)
-        r0_over_val = util.map_function(critical_over, r0_over)
-        r0_overall_val = util.map_function(zip(t, infectious, critical_over), r0_overall, unpack=True)
-        #r0_normal_val = np.zeros(days)
-        #r0_over_val = np.zeros(days)
+        r0_over_val = np.where(critical_over > 0, exposed_rate_over / death_rate_over, 0)
+        
+        tot = infectious + critical_over
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r0_mixed = exposed_rate_normal_val / infectious_leave_rate_opt * infectious/tot + exposed_rate_over / death_rate_over * critical_over/tot
+        r0_overall_val = np.where(tot == 0, 0, np.where(infectious == 0, r0_over_val, np.where(critical_over == 0, r0_normal_val, r0_mixed)))
+        
+        return {
+            "mortality_rate_raw": mortality_rate_val,
+            "r0_normal": r0_normal_val,
+            "r0_over": r0_over_val,
+            "r0_overall": r0_overall_val
+        }
+
+    def model_sensitivity(self, days, infectious_rate,
+                    critical_chance, critical_rate,
+                    recovery_rate_normal, recovery_rate_critical,
+                    death_chance_normal, death_rate_normal,
+                    death_chance_over, death_rate_over,
+                    exposed_rate_over, k, kapasitas_rs_mul,
+                    test_coverage_0=None, test_coverage_increase=None, test_coverage_max=None,
+                    **kwargs):
+        '''
+        Integrates the forward sensitivity equations ds/dt = J s + df/dp alongside the state, without sanity checks.
+        Returns y as (10, days) and dy/dp as (n_params, 10, days), params in the order of ensemble_params().
+        The test_coverage params don't enter the ODE, so their rows are zero.
+        The augmented rhs is kernel.seicrd_rlc_sensitivity_deriv, compiled with numba when available.
+        '''
+        days = int(days)
+        rt_values = self.kabko.get_kwargs_rt(kwargs)
+        rt_delta = self.kabko.get_rt_delta(rt_values)
+        r_0 = float(rt_values[0])
+        rt_days = np.array([day for day, delta in rt_delta], dtype=float)
+        rt_deltas = np.array([delta for day, delta in rt_delta], dtype=float)
+
+        population = float(self.kabko.population)
+        param_count = len(self.ensemble_params())
+
+        infectious_leave_rate_opt = recovery_rate_normal * (1-critical_chance) + critical_rate * critical_chance
+
+        #the flat kernel, with the columns of the sensitivities in the order of ensemble_params()
+        args = (
+            population,
+            r_0, rt_days, rt_deltas, float(k), float(infectious_leave_rate_opt),
+            np.asarray(self.kabko.kapasitas_rs_table(days), dtype=float), float(kapasitas_rs_mul), float(exposed_rate_over),
+            float(infectious_rate),
+            float(critical_rate), float(critical_chance),
+            float(recovery_rate_normal), float(recovery_rate_critical),
+            float(death_rate_normal), float(death_chance_normal),
+            float(death_rate_over), float(death_chance_over),
+            SeicrdRlcModel.stoichiometry
+        )
+
+        z0 = np.zeros(10 * (1 + param_count))
+        z0[:10] = SeicrdRlcModel.graph.initial(population, self.kabko.seed)
+
+        t = np.linspace(0, days-1, days)
+
+        deriv = instrumentation.timed_function("sensitivity_rhs", kernel.seicrd_rlc_sensitivity_deriv)
+        jacobian = instrumentation.timed_function("sensitivity_rhs_jacobian", kernel.seicrd_rlc_sensitivity_jacobian)
+        with util.odeint_lock, instrumentation.timed("sensitivity_integration"):
+            ret = odeint(deriv, z0, t, args=args, Dfun=jacobian if self.jacobian else None)
+
+        y = ret[:, :10].T
+        sens = ret[:, 10:].reshape((days, 10, param_count)).transpose((2, 1, 0))
+        return y, sens
+
+    def fitter_jacobian(self, names, **kwargs):
+        '''
+        d(fitter)/d(params) for the given param names, as (len(names), len(datasets), days).
+        Follows the dataset transforms of SeicrdRlcModelResult without sanity checks.
+        '''
+        all_names = self.ensemble_params()
+        for name in names:
+            if name not in all_names:
+                raise ValueError("No sensitivity for param: " + str(name))
+        kwargs = {k: float(v) for k, v in kwargs.items() if k != "sanity_check_mode"}
+        y, sens = self.model_sensitivity(**kwargs)
+        days = y.shape[1]
+        t = np.linspace(0, days-1, days)
+        param_count = len(all_names)
+
+        kapasitas_rs_base = self.kabko.kapasitas_rs_table(days)[np.minimum(t.astype(int), days-1)]
+        kapasitas_rs_val = kapasitas_rs_base * kwargs["kapasitas_rs_mul"]
+        critical = y[5]
+        cared = (critical < kapasitas_rs_val).astype(float)
+        over = 1.0 - cared
+
+        #critical_cared = min(kapasitas_rs, critical), critical_over = max(0, critical-kapasitas_rs)
+        kapasitas_rs_d = np.zeros((param_count, days))
+        kapasitas_rs_d[all_names.index("kapasitas_rs_mul")] = np.where(over > 0, kapasitas_rs_base, 0)
+        critical_cared_d = cared * sens[:, 5] + kapasitas_rs_d
+        critical_over_d = over * sens[:, 5] - kapasitas_rs_d
+        critical_over = np.maximum(0, critical - kapasitas_rs_val)
+
+        test_coverage_uncapped = kwargs["test_coverage_0"] + kwargs["test_coverage_increase"] * t
+        capped = test_coverage_uncapped >= kwargs["test_coverage_max"]
+        test_coverage = np.where(capped, kwargs["test_coverage_max"], test_coverage_uncapped)
+        test_coverage_d = np.zeros((param_count, days))
+        test_coverage_d[all_names.index("test_coverage_0")] = ~capped
+        test_coverage_d[all_names.index("test_coverage_increase")] = np.where(capped, 0, t)
+        test_coverage_d[all_names.index("test_coverage_max")] = capped
+
+        def scaled_d(scaled, scaled_d):
+            #d(test_coverage * x)
+            return test_coverage_d * scaled + test_coverage * scaled_d
+
+        infectious_d = scaled_d(y[4] + critical_over, sens[:, 4] + critical_over_d)
+        recovered_d = scaled_d(y[6], sens[:, 6]) + sens[:, 7]
+        dead_d = scaled_d(y[9], sens[:, 9]) + sens[:, 8]
+        infectious_all_d = infectious_d + critical_cared_d
+
+        datasets_d = {
+            "infectious": infectious_d,
+            "critical_cared": critical_cared_d,
+            "infectious_all": infectious_all_d,
+            "recovered": recovered_d,
+            "dead": dead_d,
+            "infected": infectious_all_d + recovered_d + dead_d
+        }
+        ret = np.array([datasets_d[d] for d in self.datasets])
+        index = [all_names.index(name) for name in names]
+        return ret.transpose((1, 0, 2))[index]
+
+    def ensemble_params(self):
+        return SeicrdRlcModel.params + ["r_%d" % (i,) for i in range(0, self.kabko.rt_count)]
         
-        return SeicrdRlcModelResult(t, population_2, susceptible, exposed_normal, exposed_over, infectious, critical, recovered_normal, recovered_critical, dead_normal, dead_over, mortality_rate_val, r0_normal_val, kapasitas_rs_val, r0_over_val, r0_overall_val, test_coverage_val, sanity_check_mode)
+    def ensemble_values(self, values):
+        #list of param dicts (e.g. fit_result.params.valuesdict()) to the (N, n_params) array model_ensemble takes
+        names = self.ensemble_params()
+        return np.array([[v[n] for n in names] for v in values], dtype=float)
         
-    
-    def _fitter(self, ret):
-                    
-        self.last_result_full = ret
+    def model_ensemble(self, params, days, steps_per_day=None, sanity_check_mode=util.SANITY_CHECK_CORRECT):
+        '''
+        Integrates N parameter vectors at once with fixed step RK4, all members advancing together.
+        params is (N, n_params) in the order of ensemble_params().
+        Returns (N, 10, days), compartments in the same order as model()'s y.
+        '''
+        params = np.atleast_2d(np.asarray(params, dtype=float))
+        names = self.ensemble_params()
+        if params.shape[1] != len(names):
+            raise ValueError("params must have %d columns: %s" % (len(names), str(names)))
+        p = dict(zip(names, params.T))
         
-            
+        days = int(days)
+        steps_per_day = int(steps_per_day or config.ENSEMBLE_STEPS_PER_DAY)
+        h = 1.0 / steps_per_day
+        member_count = len(params)
+        clamp = sanity_check_mode == util.SANITY_CHECK_CORRECT
+        
+        population = self.kabko.population
+        seed = self.kabko.seed
+        
+        infectious_rate = p["infectious_rate"]
+        critical_chance = p["critical_chance"]
+        critical_rate = p["critical_rate"]
+        recovery_rate_normal = p["recovery_rate_normal"]
+        recovery_rate_critical = p["recovery_rate_critical"]
+        death_chance_normal = p["death_chance_normal"]
+        death_rate_normal = p["death_rate_normal"]
+        death_chance_over = p["death_chance_over"]
+        death_rate_over = p["death_rate_over"]
+        exposed_rate_over = p["exposed_rate_over"]
+        k = p["k"][:, np.newaxis]
+        kapasitas_rs_mul = p["kapasitas_rs_mul"]
+        
+        infectious_leave_rate_opt = recovery_rate_normal * (1-critical_chance) + critical_rate * critical_chance
+        
+        rt_values = np.array(util.get_kwargs_rt(p, self.kabko.rt_count))
+        r_0 = rt_values[0]
+        rt_days = np.array(self.kabko.rt_days[1:], dtype=float)
+        rt_deltas = (rt_values[1:] - rt_values[:-1]).T
+        
+        kapasitas_rs_table = self.kabko.kapasitas_rs_table(days + 1)
+        kapasitas_rs_last = len(kapasitas_rs_table) - 1
+        
+        graph = SeicrdRlcModel.graph
+        #(flows, members), the exposed rate is multiplied in per t
+        coefficients = graph.coefficients(SeicrdRlcModel.rates(
+            exposed_rate_over,
+            infectious_rate,
+            critical_rate, critical_chance,
+            recovery_rate_normal, recovery_rate_critical,
+            death_rate_normal, death_chance_normal,
+            death_rate_over, death_chance_over
+        ), ["exposed_rate_normal"])
+        
+        def deriv(y, t, kapasitas_rs_val):
+            with np.errstate(over="ignore"):
+                rt = r_0 + np.sum(rt_deltas / (1 + np.exp(k*(-t+rt_days))), axis=1)
+            rates = {"exposed_rate_normal": rt * infectious_leave_rate_opt}
+            return graph.deriv(y, graph.with_rates(coefficients, rates), kapasitas_rs_val, population, clamp)
+        
+        y = np.repeat(graph.initial(population, seed)[:, np.newaxis], member_count, axis=1)
+        
+        ret = np.empty((member_count, 10, days))
+        ret[:, :, 0] = y.T
+        for day in range(1, days):
+            #kapasitas_rs only changes on whole days, so keep it constant within the day's steps
+            kapasitas_rs_val = kapasitas_rs_table[min(day-1, kapasitas_rs_last)] * kapasitas_rs_mul
+            for step in range(0, steps_per_day):
+                t = day - 1 + step * h
+                k1 = deriv(y, t, kapasitas_rs_val)
+                k2 = deriv(y + (h/2) * k1, t + h/2, kapasitas_rs_val)
+                k3 = deriv(y + (h/2) * k2, t + h/2, kapasitas_rs_val)
+                k4 = deriv(y + h * k3, t + h, kapasitas_rs_val)
+                y = y + (h/6) * (k1 + 2*k2 + 2*k3 + k4)
+            ret[:, :, day] = y.T
+        
+        return ret
+        
+    def ensemble_datasets(self, params, y, datasets=None, sanity_check_mode=util.SANITY_CHECK_CORRECT):
+        '''
+        The datasets of model_ensemble's output, same transforms as SeicrdRlcModelResult.
+        params is (N, n_params) as given to model_ensemble, y is its (N, 10, days) output.
+        Returns (N, len(datasets), days).
+        '''
+        datasets = datasets or self.datasets
+        params = np.atleast_2d(np.asarray(params, dtype=float))
+        p = dict(zip(self.ensemble_params(), params.T[:, :, np.newaxis]))
+        days = y.shape[2]
+        t = np.linspace(0, days-1, days)
+        
+        y = util.sanity_clamp(y, sanity_check_mode)
+        infectious, critical = y[:, 4], y[:, 5]
+        recovered_normal, recovered_critical, dead_normal, dead_over = y[:, 6], y[:, 7], y[:, 8], y[:, 9]
+        kapasitas_rs = self.kabko.kapasitas_rs_table(days)[:days] * p["kapasitas_rs_mul"]
+        test_coverage = np.minimum(p["test_coverage_max"], p["test_coverage_0"] + p["test_coverage_increase"] * t)
+        
+        critical_cared = SeicrdRlcModel.critical_cared(critical, kapasitas_rs)
+        infectious_scaled = test_coverage * (infectious + SeicrdRlcModel.critical_over(critical, kapasitas_rs))
+        infectious_all_scaled = infectious_scaled + critical_cared
+        recovered_scaled = test_coverage * recovered_normal + recovered_critical
+        dead_scaled = test_coverage * dead_over + dead_normal
+        ret = {
+            "infectious": infectious_scaled,
+            "critical_cared": critical_cared,
+            "infectious_all": infectious_all_scaled,
+            "recovered": recovered_scaled,
+            "dead": dead_scaled
+        }
+        if "infected" in datasets:
+            ret["infected"] = infectious_all_scaled + recovered_scaled + dead_scaled
+        for d in datasets:
+            if d not in ret:
+                raise ValueError("Invalid dataset: " + str(d))
+        return np.stack([ret[d] for d in datasets], axis=1)
+        
+    def _fitter(self, ret):
         results = ret.get_datasets_values(self.datasets)
                 
         results = np.array(results)
-        self.last_result = results
         return results
     
     def fitter(self, **kwargs):
@@ -412,5 +942,9 @@ class SeicrdRlcModel(BaseModel):
         ret = self.model(**kwargs)
         return self._fitter(ret)
         
+    def fitter_into(self, out, x, **kwargs):
+        ret = self.model(**kwargs)
+        return ret.get_datasets_into(self.datasets, out, x[0], x[1])
+        
 
 Model = SeicrdRlcModel
\ No newline at end of file
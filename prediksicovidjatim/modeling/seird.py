@@ -1,104 +1,62 @@
 import numpy as np
-from scipy.integrate import odeint
-import lmfit
 from .. import util
 from .base_model import BaseModel
+from .graph import CompartmentGraph, Flow
 
 class SeirdModel(BaseModel):
     params = ["incubation_period", "recovery_time", "death_chance", "death_time"]
+    option = "seird"
+    
+    graph = CompartmentGraph(
+        ("population", "susceptible", "exposed", "infectious", "recovered", "dead"),
+        [
+            Flow("exposed_flow", "susceptible", "exposed", "exposed_rate", infector="infectious"),
+            Flow("infectious_flow", "exposed", "infectious", "infectious_rate"),
+            Flow("recovery_flow", "infectious", "recovered", "recovery_rate", "1-death_chance"),
+            Flow("death_flow", "infectious", "dead", "death_rate", "death_chance")
+        ],
+        series={
+            "infected": ("infectious", "recovered", "dead")
+        }
+    )
+    #without critical, all infectious are infectious
+    dataset_series = {
+        "infectious": "infectious",
+        "infectious_all": "infectious",
+        "recovered": "recovered",
+        "dead": "dead",
+        "infected": "infected"
+    }
+    available_datasets = list(dataset_series.keys())
     
     def __init__(self, kabko):
         super().__init__(kabko) 
-    
-    def deriv(self, y, t, exposed_rate, infectious_rate, recovery_rate, death_rate, death_chance):
+        self.datasets = ["infectious_all", "recovered", "dead"]
         
-        population, susceptible, exposed, infectious, recovered, dead = y
-        exposed_flow = exposed_rate * susceptible * infectious / population
-        infectious_flow = infectious_rate * exposed * 1
-        recovery_flow = recovery_rate * infectious * (1-death_chance)
-        death_flow = death_rate * infectious * death_chance
-        dSdt = -exposed_flow
-        dEdt = exposed_flow - infectious_flow
-        dIdt = infectious_flow - recovery_flow - death_flow
-        dRdt = recovery_flow
-        dDdt = death_flow
-        dPdt = dSdt + dEdt + dIdt + dRdt + dDdt
-        return dPdt, dSdt, dEdt, dIdt, dRdt, dDdt
+    def incubation_period_init(self):
+        return self.kabko.params["incubation_period"].init
         
-    def model(self, days, r_0, incubation_period,
+    def model(self, days, incubation_period,
                     recovery_time,
-                    death_chance, death_time, **kwargs):
-        
-        #load values
-        population = self.kabko.population
+                    death_chance, death_time, 
+                    sanity_check_mode=util.SANITY_CHECK_CORRECT, **kwargs):
+        self.check_continuation(kwargs)
+        r_0 = self.kabko.get_kwargs_rt(kwargs, single=True)[0]
         
         # this is derived parameter
-        infectious_period_opt = recovery_time_normal * (1-death_chance) + death_time * death_chance #this is derived parameter
+        infectious_period_opt = recovery_time * (1-death_chance) + death_time * death_chance #this is derived parameter
         infectious_rate = 1.0 / incubation_period # this is derived parameter
-        recovery_rate = 1.0 / recovery_time # this is derived parameter
-        death_rate = 1.0 / death_time # this is derived parameter
-
-        exposed_rate = r0 / infectious_period_opt
-
-        population_init, susceptible_init, exposed_init, infectious_init, recovered_init, dead_init = population, population-1, 1, 0, 0, 0  # initial conditions: one exposed, rest susceptible
-        
-        t = np.linspace(0, days-1, days) # days
-        y0 = population_init, susceptible_init, exposed_init, infectious_init, recovered_init, dead_init # Initial conditions tuple
-
-        
-        # Integrate the SIR equations over the time grid, t.
-        ret = odeint(self.deriv, y0, t, args=(
-            exposed_rate, infectious_rate, recovery_rate, death_rate, death_chance
-        ))
-        
-        retT = ret.T
-        population_2, susceptible, exposed, infectious, recovered, dead = retT
         
-        death_chance_val = [0] + [100 * dead[i] / sum(infectious_rate*exposed[:i]) if sum(infectious_rate*exposed[:i])>0 else 0 for i in range(1, len(t))]
-        #death_chance_val = np.zeros(days)
-        
-        infected = np.array(util.sum_respectively([infectious, dead, recovered]))
-        
-        return t, population_2, susceptible, exposed, infectious, recovered, dead, infected, death_chance_val
-    
-    def fitter(self, x, days, r_0, incubation_period,
-                    recovery_time, 
-                    death_chance, death_time, **kwargs):
-        #days = self.kabko.data_days(self.kabko.outbreak_shift(incubation_period))
-        ret = self.model(days, r_0, incubation_period,
-                    recovery_time, 
-                    death_chance, death_time,
-                    k)
-        dead = ret[7]
-        return dead[x]
-    
-    def fit(self):
-        mod = lmfit.Model(self.fitter)
-        
-        self.kabko.apply_params(mod)
-        
-        outbreak_shift = self.kabko.outbreak_shift(
-            self.kabko.params["incubation_period"].init
-        )
-        
-        days = self.kabko.data_days(outbreak_shift)
-        
-        mod.set_param_hint("days", value=days, vary=False)
-
-        params = mod.make_params()
-        
-        x_data = np.linspace(0, days - 1, days, dtype=int)
-        
-        y_data = util.shift_array(
-            self.kabko.dead, 
-            outbreak_shift
-        )
-
-        result = mod.fit(y_data, params, method="least_squares", x=x_data)
-        
-
-        #result.plot_fit(datafmt="-");
+        values = {
+            "exposed_rate": r_0 / infectious_period_opt,
+            "infectious_rate": infectious_rate,
+            "recovery_rate": 1.0 / recovery_time,
+            "death_rate": 1.0 / death_time,
+            "death_chance": death_chance
+        }
         
-        return result
+        ret = self.integrate(days, values, sanity_check_mode=sanity_check_mode)
+        ret.extra["mortality_rate"] = lambda: self.mortality_rate(ret.t, ret.exposed, ret.dead, infectious_rate)
+        return ret
 
-Model = SeirdModel
\ No newline at end of file
+Model = SeirdModel
@@ -1,21 +1,16 @@
 from datetime import datetime, date, timezone
 import numpy as np
-import matplotlib.dates as mdates
-import matplotlib.pyplot as plt
 import math
 from datetime import timedelta
-from operator import add
-from sklearn.model_selection import TimeSeriesSplit
 from . import config
 import calendar
 from threading import RLock
-import line_profiler
-lprofile = line_profiler.LineProfiler()
-#import atexit
-#atexit.register(lprofile.print_stats)
+from contextlib import nullcontext
+import scipy
 
-odeint_lock = RLock()
-lmfit_lock = RLock()
+#odepack keeps its callback in globals before scipy 1.15, so odeint calls can't overlap there
+ODEINT_REENTRANT = tuple(int(v) for v in scipy.__version__.split(".")[:2]) >= (1, 15)
+odeint_lock = nullcontext() if ODEINT_REENTRANT else RLock()
 
 
 def use_multiprocess():
@@ -32,12 +27,34 @@ def use_multiprocess():
         #return 'terminal'
         return False
 
-if use_multiprocess():
-    from multiprocess import Pool
-else:
-    from multiprocessing import Pool
-    
-from multiprocessing.pool import ThreadPool
+def lazy_function(module, name):
+    '''
+    Stands in for module.name, importing module on the first call.
+    '''
+    from importlib import import_module
+    def wrapper(*args, **kwargs):
+        return getattr(import_module(module), name)(*args, **kwargs)
+    wrapper.__name__ = name
+    return wrapper
+
+def __getattr__(name):
+    #Pool, ThreadPool and date_formatter are made on first use,
+    #so processes that never use pools or plot don't import them
+    if name == "Pool":
+        if use_multiprocess():
+            from multiprocess import Pool
+        else:
+            from multiprocessing import Pool
+        ret = Pool
+    elif name == "ThreadPool":
+        from multiprocessing.pool import ThreadPool
+        ret = ThreadPool
+    elif name == "date_formatter":
+        ret = _date_formatter()
+    else:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    globals()[name] = ret
+    return ret
 '''
 def max_none(a, b):
     return a if b is None else max(a, b)
@@ -55,18 +72,39 @@ SANITY_CHECK_IGNORE = 0
 SANITY_CHECK_CORRECT = 1
 SANITY_CHECK_ERROR = 2
 
-def sanity_clamp(arr, mode=SANITY_CHECK_CORRECT):
+def sanity_clamp(arr, mode=SANITY_CHECK_CORRECT, name="value"):
     if mode == SANITY_CHECK_IGNORE:
         return arr
     elif mode == SANITY_CHECK_CORRECT:
         return np.clip(arr, 0, None)
     elif mode == SANITY_CHECK_ERROR:
-        if (arr < 0).any():
-            raise Exception("%s can't be negative. (%f, %f)" % (name, y, config.FLOAT_TOLERANCE))
-        else:
-            return arr
+        sanity_check_trajectory([name], arr, mode)
+        return arr
     raise ValueError("Invalid mode")
 
+def sanity_check_trajectory(names, arr, mode=SANITY_CHECK_ERROR, t=None, tolerance=None, message="can't be negative"):
+    '''
+    Checks the rows of arr, one named series over days each, for values below -tolerance, all at once.
+    Returns the violations as (name, day, value, message), earliest day first. Raises on the first one in SANITY_CHECK_ERROR mode.
+    '''
+    if mode == SANITY_CHECK_IGNORE:
+        return []
+    tolerance = config.FLOAT_TOLERANCE if tolerance is None else tolerance
+    arr = np.atleast_2d(arr)
+    rows, days = np.nonzero(arr < -tolerance)
+    if len(rows) == 0:
+        return []
+    order = np.lexsort((rows, days))
+    t = np.arange(arr.shape[1]) if t is None else t
+    ret = [(names[r], t[d], arr[r, d], message) for r, d in zip(rows[order], days[order])]
+    if mode == SANITY_CHECK_ERROR:
+        raise_sanity_error(ret[0])
+    return ret
+    
+def raise_sanity_error(violation):
+    name, day, value, message = violation
+    raise Exception("%s %s, on day %d. (%g, %g)" % (name, message, day, value, config.FLOAT_TOLERANCE))
+
 def sanity_check_init(name, y, mode=SANITY_CHECK_CORRECT):
     if mode==SANITY_CHECK_IGNORE or y >= 0:
         return y
@@ -154,13 +192,14 @@ def extract_dict(data, keys):
     return [data[k] for k in keys]
     
 def delta(arr):
-    return np.array([arr[0]] + [arr[i]-arr[i-1] for i in range(1, len(arr))])
+    arr = np.asarray(arr)
+    return np.concatenate((arr[:1], np.diff(arr)))
     
 def post_plot(ax):
     ax.yaxis.set_tick_params(length=0)
     ax.xaxis.set_tick_params(length=0)
 
-    ax.grid(b=True, which='major', c='w', lw=0.5, ls='-', alpha=0.25)
+    ax.grid(True, which='major', c='w', lw=0.5, ls='-', alpha=0.25)
 
     ax.legend(loc='best', shadow=True)
     
@@ -168,9 +207,17 @@ def post_plot(ax):
         ax.spines[spine].set_visible(False)
         
 
-date_formatter = mdates.DateFormatter('%Y-%m-%d')
+def _date_formatter():
+    #util.date_formatter, made on the first plot
+    ret = globals().get("date_formatter")
+    if ret is None:
+        import matplotlib.dates as mdates
+        ret = mdates.DateFormatter('%Y-%m-%d')
+        globals()["date_formatter"] = ret
+    return ret
 
 def date_plot(ax):
+    date_formatter = _date_formatter()
     ax.xaxis.set_major_formatter(date_formatter)
     ax.format_xdata = date_formatter
     ax.fmt_xdata = date_formatter
@@ -180,7 +227,7 @@ def sum_respectively(lists):
     return [sum(x) for x in zip(*lists)]
 
 def sum_element(a, b):
-    return np.array(list(map(add, a, b)))
+    return np.add(a, b)
 
 def lerp(start, end, t):
     return start + (end-start)*t
@@ -238,6 +285,16 @@ def map_function(t, f, unpack=False):
         return np.array([f(*ti) for ti in t])
     return np.array([f(ti) for ti in t])
     
+def hermite_table(y, dydt, step):
+    #cubic hermite coefficients (c0, c1, c2, c3) of each interval, in terms of s=(t-t_i)/step
+    y = np.asarray(y, dtype=float)
+    m = np.asarray(dydt, dtype=float) * step
+    y0, y1 = y[:-1], y[1:]
+    m0, m1 = m[:-1], m[1:]
+    c2 = 3*(y1-y0) - 2*m0 - m1
+    c3 = 2*(y0-y1) + m0 + m1
+    return np.stack((y0, m0, c2, c3), axis=1)
+    
 def get_kwargs_rt(kwargs, count):
     return [kwargs["r_%d" % (i,)] for i in range(0, count)]
     
@@ -276,6 +333,7 @@ def transpose_list_list(ll):
     return [[ll[i][j] for i in range(0, row_count)] for j in range(0, col_count)]
     
 def plot_single(t, data, title=None, label=None, color='blue'):
+    import matplotlib.pyplot as plt
     fig, ax = plt.subplots(1, 1)
     _plot_single(ax, t, data, title, label, color)
     post_plot(ax)
@@ -288,6 +346,7 @@ def _plot_single(ax, t, data, title=None, label=None, color='blue'):
         ax.title.set_text(title)
         
 def plot_single_pred(t, pred, data=None, min=None, max=None, title=None, label=None, color='blue'):
+    import matplotlib.pyplot as plt
     fig, ax = plt.subplots(1, 1)
     _plot_single(ax, t, data, pred, min, max, title, label, color)
     util.post_plot(ax)
@@ -332,7 +391,13 @@ def np_make_2d(data):
     
 def time_series_split(data, split):
     if split > 1:
-        return TimeSeriesSplit(split).split(data)
+        #the folds of sklearn's TimeSeriesSplit(split), without importing sklearn in every fitting process
+        data_len = len(data)
+        test_size = data_len // (split + 1)
+        if test_size < 1:
+            raise ValueError("Cannot have %d splits of %d samples" % (split, data_len))
+        index = np.arange(data_len)
+        return [(index[:start], index[start:start+test_size]) for start in range(data_len - split * test_size, data_len, test_size)]
     else:
         data_len = len(data)
         full_index = np.linspace(0, data_len - 1, data_len, dtype=int)
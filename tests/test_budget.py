@@ -0,0 +1,51 @@
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+import pytest
+from prediksicovidjatim.bench.synthetic import synthetic_kabko
+from prediksicovidjatim.modeling import SeicrdRlcModel
+
+MAX_NFEV = 30
+
+@pytest.fixture(scope="module")
+def kabko():
+    return synthetic_kabko(days=90, seed=0)
+
+def fit(kabko, **kwargs):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return SeicrdRlcModel(kabko).fit(test_splits=[3], **kwargs)
+
+def test_max_nfev_is_per_minimization(kabko):
+    counts = {}
+    def progress(fold, nfev, chisqr, elapsed):
+        counts[fold] = nfev
+    result = fit(kabko, max_nfev=MAX_NFEV, progress=progress)
+    assert result.budget_truncated
+    assert "full" in counts and len(counts) > 1
+    #each stops at the cap, lmfit then evaluates the best values once more for the residual
+    for fold, nfev in counts.items():
+        assert MAX_NFEV <= nfev <= MAX_NFEV + 1, fold
+    assert result.fit_result.nfev == counts["full"]
+
+def test_max_nfev_same_with_threads_and_processes(kabko):
+    results = []
+    for executor in (ThreadPoolExecutor(2), ProcessPoolExecutor(2)):
+        with executor:
+            results.append(fit(kabko, max_nfev=MAX_NFEV, executor=executor))
+    threads, processes = results
+    assert threads.fit_result.params.valuesdict() == processes.fit_result.params.valuesdict()
+    assert threads.fit_result.chisqr == processes.fit_result.chisqr
+    np.testing.assert_array_equal(threads.test_scorer.mae(), processes.test_scorer.mae())
+
+def test_final_fit_keeps_time_reserve(kabko):
+    counts = {}
+    def progress(fold, nfev, chisqr, elapsed):
+        counts[fold] = nfev
+        time.sleep(0.02)
+    result = fit(kabko, max_time=1.0, progress=progress)
+    assert result.budget_truncated
+    #the folds stop at 0.75s, the final fit gets the rest instead of a single evaluation
+    assert counts["full"] > 3
+    assert result.fit_result.nfev == counts["full"]
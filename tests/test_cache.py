@@ -0,0 +1,22 @@
+import numpy as np
+from prediksicovidjatim.bench.synthetic import synthetic_kabko, synthetic_values
+from prediksicovidjatim.modeling import SeicrdRlcModel, ModelCache
+
+def test_key_is_exact():
+    cache = ModelCache()
+    assert cache.key(100, 0.2) == (100.0, 0.2)
+    assert cache.key(100, 0.2) != cache.key(100, 0.2 * (1 + 1e-15))
+
+def test_model_perturbed_below_rounding():
+    #a finite difference step however small is a new evaluation, not the cached one
+    kabko = synthetic_kabko(days=60)
+    model = SeicrdRlcModel(kabko, checkpoint=False)
+    values = synthetic_values(kabko)
+    perturbed = dict(values, infectious_rate=values["infectious_rate"] * (1 + 1e-13))
+    a = model.model(**values)
+    b = model.model(**perturbed)
+    assert model.cache.stats()["misses"] == 2
+    assert a is not b
+    assert model.model(**values) is a
+    assert model.cache.stats()["hits"] == 1
+    np.testing.assert_allclose(a.y, b.y, rtol=1e-6)
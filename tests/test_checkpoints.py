@@ -0,0 +1,44 @@
+import warnings
+import numpy as np
+from prediksicovidjatim.bench.synthetic import synthetic_kabko, synthetic_values
+from prediksicovidjatim.modeling import SeicrdRlcModel
+
+def test_checkpointed_fit_matches():
+    kabko = synthetic_kabko(days=90, seed=0)
+    values = {}
+    for checkpoint in (True, False):
+        model = SeicrdRlcModel(kabko, checkpoint=checkpoint)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            result = model.fit(test_splits=[2], max_nfev=300)
+        values[checkpoint] = result.fit_result.params.valuesdict()
+        if checkpoint:
+            assert model.checkpoints.stats()["reused_days"] > 0
+    assert values[True] == values[False]
+
+def test_reused_trajectory_is_exact():
+    kabko = synthetic_kabko(days=90, seed=0)
+    values = synthetic_values(kabko)
+    model = SeicrdRlcModel(kabko, cache=False)
+    model.model(**values)
+    #test coverage doesn't enter the ode, so the stored trajectory is reused
+    changed = dict(values, test_coverage_0=values["test_coverage_0"] * 1.5)
+    reused = model.model(**changed)
+    assert model.checkpoints.stats()["reused_days"] == values["days"]
+    full = SeicrdRlcModel(kabko, cache=False, checkpoint=False).model(**changed)
+    np.testing.assert_array_equal(reused.y, full.y)
+    for d in model.datasets:
+        np.testing.assert_array_equal(reused.get_dataset(d), full.get_dataset(d))
+
+def test_over_resume_reads_capacity_of_the_interval():
+    kabko = synthetic_kabko(days=90, seed=0)
+    values = synthetic_values(kabko)
+    model = SeicrdRlcModel(kabko)
+    table = kabko.kapasitas_rs_table(values["days"])[:values["days"]]
+    day = int(np.flatnonzero(np.diff(table) > 0)[0]) + 1
+    #critical reaches the capacity of (day-1, day), but not that of day itself
+    y = np.zeros((values["days"], len(SeicrdRlcModel.graph.compartments)))
+    y[:, 5] = table * 0.5
+    y[day, 5] = (table[day-1] + table[day]) / 2
+    resume = dict(zip(model.ode_params(), model.resume_days(values, y)))
+    assert resume["death_rate_over"] == day - 2
@@ -0,0 +1,62 @@
+import math
+import types
+import numpy as np
+from lmfit import Parameters
+from prediksicovidjatim.bench.synthetic import synthetic_kabko, synthetic_values
+from prediksicovidjatim.modeling import SeicrdRlcModel, StreamingPercentiles
+from prediksicovidjatim.modeling.fitting_result import FittingResult
+
+Q = [2.5, 25, 50, 75, 97.5]
+
+def test_percentiles_match_numpy():
+    #lognormal samples spread over four decades, added in chunks like predict_ensemble does
+    rng = np.random.default_rng(0)
+    samples = np.exp(rng.normal(np.log(rng.uniform(10, 1e5, (3, 50))), 0.5, (20000, 3, 50)))
+    reducer = StreamingPercentiles((3, 50), 1e6)
+    for i in range(0, len(samples), 256):
+        reducer.add(samples[i:i+256])
+    expected = np.percentile(samples, Q, axis=0)
+    #within one log1p bin, expm1(1/scale) of 1+value: 0.68% here
+    tolerance = math.expm1(1 / reducer.scale) * (1 + expected)
+    assert np.all(np.abs(reducer.percentiles(Q) - expected) <= tolerance)
+
+def test_counts_widen_before_int32_overflow():
+    reducer = StreamingPercentiles((2,), 100.0, bins=8)
+    #as if 2**31 - 5 samples of 0 were added already
+    full = np.iinfo(np.int32).max - 5
+    reducer.counts[:, 0] = full
+    reducer.count = full
+    reducer.min[:] = 0
+    reducer.max[:] = 0
+    reducer.add(np.zeros((10, 2)))
+    assert reducer.counts.dtype == np.int64
+    np.testing.assert_array_equal(reducer.counts[:, 0], full + 10)
+    assert reducer.count == full + 10
+    np.testing.assert_array_equal(reducer.percentiles([50]), 0)
+
+def test_predict_ensemble():
+    kabko = synthetic_kabko(days=150, seed=0)
+    model = SeicrdRlcModel(kabko, cache=False, checkpoint=False)
+    values = synthetic_values(kabko)
+    params = Parameters()
+    for k, v in values.items():
+        params.add(k, value=v, vary=False)
+    names = ["infectious_rate", "critical_chance"]
+    for n in names:
+        params[n].set(vary=True, min=0, max=1)
+    stderr = np.array([0.05, 0.1]) * [values[n] for n in names]
+    fit_result = types.SimpleNamespace(params=params, var_names=names, covar=np.diag(stderr**2))
+    result = FittingResult(model, fit_result, model.datasets, None, None, len(names))
+    datasets = ["infectious_all", "dead"]
+    bands = result.predict_ensemble(days=10, n_samples=300, datasets=datasets, chunk_size=128, rng=np.random.default_rng(0))
+    assert set(bands) == set(datasets)
+    days = values["days"] + 10
+    fitted = model.model(**dict(values, days=days)).get_datasets_values(datasets)
+    for d, f in zip(datasets, fitted):
+        band = bands[d]
+        assert band.shape == (3, days)
+        assert np.all(np.isfinite(band)) and np.all(band >= 0)
+        assert np.all(band[0] <= band[1]) and np.all(band[1] <= band[2])
+        #the spread of the params shows in the band, its median stays near the fitted values
+        assert np.any(band[2] > band[0])
+        assert np.max(np.abs(band[1] - f)) <= 0.05 * np.max(f)
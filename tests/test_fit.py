@@ -0,0 +1,64 @@
+import warnings
+import numpy as np
+import pytest
+from lmfit import Parameters
+from prediksicovidjatim.bench.synthetic import synthetic_kabko
+from prediksicovidjatim.modeling import BaseModel, SeicrdRlcModel, SeirdModel, SeicrdModel, SeicrdRModel, SeicrdRlModel, SeicrdRlExtModel
+from prediksicovidjatim.data.model.repo import score_columns
+
+MODELS = [SeicrdRlcModel, SeirdModel, SeicrdModel, SeicrdRModel, SeicrdRlModel, SeicrdRlExtModel]
+
+@pytest.fixture(scope="module")
+def kabko():
+    return synthetic_kabko(days=90, seed=0)
+
+@pytest.mark.parametrize("cls", MODELS, ids=lambda cls: cls.__name__)
+def test_fit_smoke(kabko, cls, capsys):
+    #a short fit end to end: folds, full fit, scores and prediction
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        result = cls(kabko).fit(test_splits=[2], max_nfev=150)
+        #fit reports through its result and progress, not stdout
+        assert capsys.readouterr().out == ""
+        values = result.fit_result.params.valuesdict()
+        assert values["days"] == kabko.data_days(result.outbreak_shift)
+        assert np.isfinite(result.fit_result.chisqr)
+        assert len(result.fit_scorer.get_values(score_columns)) == len(score_columns)
+        assert len(result.test_scorer.get_values(score_columns)) == len(score_columns)
+        assert np.all(np.isfinite(result.fit_scorer.mae()))
+        predicted = result.predict(10)
+        for d in result.datasets:
+            assert len(predicted.get_dataset(d)) == values["days"] + 10
+    #max_nfev stops most of these fits, which leaves lmfit without a covariance; the bands still come from the stderr
+    for scorer in (result.fit_scorer, result.test_scorer):
+        assert np.all(np.any(scorer.dely_conf > 0, axis=1))
+        assert np.all(scorer.dely_pred >= scorer.dely_conf)
+
+@pytest.mark.parametrize("cls", [SeicrdRlcModel, SeirdModel, SeicrdModel], ids=lambda cls: cls.__name__)
+def test_bands_scale_with_sigma(kabko, cls):
+    #the sensitivity jacobian and the differences, with and without lmfit's covariance
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        result = cls(kabko).fit(test_splits=[], max_nfev=150)
+    fit_result = result.fit_result
+    model = result.model
+    x_range = (0, int(fit_result.params["days"].value))
+    set_count = len(model.datasets)
+    conf_1, pred_1 = model._get_dely(fit_result, x_range, set_count, sigma_conf=1)
+    conf_2, pred_2 = model._get_dely(fit_result, x_range, set_count, sigma_conf=2)
+    dof = fit_result.ndata - fit_result.nvarys
+    scale = BaseModel.uncertainty_scale(2, dof) / BaseModel.uncertainty_scale(1, dof)
+    assert np.max(conf_1) > 0
+    np.testing.assert_allclose(conf_2, scale * conf_1, rtol=1e-12)
+    np.testing.assert_allclose(pred_2, scale * pred_1, rtol=1e-12)
+
+def test_uncertainty_jacobian_without_stderr(kabko):
+    #fold fits have no stderr, the differences step by the value then
+    model = SeicrdModel(kabko)
+    params = model.kabko.get_params_init(model.option, outbreak_shift=0)
+    lm = Parameters()
+    for k, v in params.items():
+        lm.add(k, value=v, vary=False)
+    names = ["critical_chance", "incubation_period"]
+    jacobian = model.uncertainty_jacobian(lm, names)
+    assert all(np.max(np.abs(j)) > 0 for j in jacobian)
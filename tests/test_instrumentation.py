@@ -0,0 +1,55 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from prediksicovidjatim import instrumentation
+
+def count(name, n):
+    for i in range(n):
+        with instrumentation.timed(name):
+            pass
+
+def test_threads_record_separately():
+    #both threads record at once, each only into its own instrumentation
+    barrier = threading.Barrier(2)
+    recorded = {}
+    def record(name, n):
+        with instrumentation.recording() as ins:
+            barrier.wait()
+            count(name, n)
+            barrier.wait()
+            recorded[name] = ins.as_dict()
+        assert instrumentation.current.get() is None
+    threads = [threading.Thread(target=record, args=(name, n)) for name, n in (("a", 3), ("b", 5))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert set(recorded["a"]) == {"a", "wall_time"}
+    assert set(recorded["b"]) == {"b", "wall_time"}
+    assert recorded["a"]["a"]["count"] == 3
+    assert recorded["b"]["b"]["count"] == 5
+    assert instrumentation.current.get() is None
+
+def test_submit_records_executor_threads():
+    with ThreadPoolExecutor(2) as executor:
+        with instrumentation.recording() as ins:
+            futures = [instrumentation.submit(executor, count, "task", 2) for i in range(4)]
+            for f in futures:
+                f.result()
+        assert ins.as_dict()["task"]["count"] == 8
+        #outside a recording the tasks add to nothing
+        assert instrumentation.submit(executor, instrumentation.current.get).result() is None
+
+def test_db_times_queries_not_connections():
+    #timed_cursor wraps whatever cursor_factory a connection's cursor is made with
+    from prediksicovidjatim import database
+    class Cursor:
+        def execute(self, query, args=None):
+            self.rows = [(1,), (2,)]
+        def fetchall(self):
+            return self.rows
+    cursor = database.timed_cursor(Cursor)()
+    with instrumentation.recording() as ins:
+        cursor.execute("SELECT 1")
+        assert cursor.fetchall() == [(1,), (2,)]
+    assert ins.as_dict()["db"]["count"] == 2
+    assert database.timed_cursor(Cursor) is type(cursor)
@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+from prediksicovidjatim import util
+from prediksicovidjatim.bench.synthetic import synthetic_kabko, synthetic_values
+from prediksicovidjatim.modeling import kernel, SeicrdRlcModel, SeirdModel, SeicrdModel, SeicrdRModel, SeicrdRlModel, SeicrdRlExtModel
+
+POPULATION = 1e6
+CAPACITY = 50.0
+#critical below and above CAPACITY, far enough from it for the differences not to cross it
+CRITICAL = [30.0, 80.0]
+RATES = {
+    "exposed_rate_over": 0.3,
+    "infectious_rate": 0.2,
+    "critical_rate": 0.15,
+    "critical_chance": 0.1,
+    "recovery_rate_normal": 0.1,
+    "recovery_rate_critical": 0.08,
+    "death_rate_normal": 0.12,
+    "death_chance_normal": 0.2,
+    "death_rate_over": 0.3,
+    "death_chance_over": 0.5
+}
+EXPOSED_RATE_NORMAL = 0.35
+
+@pytest.fixture(params=[True, False], ids=["compiled", "numpy"])
+def compiled(request, monkeypatch):
+    #without compilation the graphs take their numpy path
+    if not request.param:
+        monkeypatch.setattr(kernel, "is_compiled", lambda: False)
+    return request.param
+
+def state(graph, critical):
+    #a mid-outbreak state, with critical set to the capacity compartment
+    y = np.linspace(200.0, 3000.0, len(graph.compartments))
+    y[graph.compartments.index("susceptible")] = 9e5
+    if graph.capacity:
+        y[graph.compartments.index(graph.capacity.compartment)] = critical
+    if "population" in graph.compartments:
+        y[graph.compartments.index("population")] = POPULATION
+    return y
+
+def central_differences(deriv, y, rel=1e-6):
+    ret = np.zeros((len(y), len(y)))
+    for j in range(len(y)):
+        h = rel * max(1.0, abs(y[j]))
+        up, down = y.copy(), y.copy()
+        up[j] += h
+        down[j] -= h
+        ret[:, j] = (deriv(up) - deriv(down)) / (2*h)
+    return ret
+
+def assert_jacobian(jacobian, deriv, y):
+    expected = central_differences(deriv, y)
+    np.testing.assert_allclose(jacobian, expected, rtol=1e-6, atol=1e-8 * np.abs(expected).max())
+
+@pytest.mark.parametrize("critical", CRITICAL)
+def test_seicrd_rlc_jacobian(compiled, critical):
+    y = state(SeicrdRlcModel.graph, critical)
+    t = 3.5
+    if compiled:
+        #the flat kernel SeicrdRlcModel(compiled=True) integrates
+        rt_table = np.array([[EXPOSED_RATE_NORMAL, 0.0, 0.0, 0.0]] * 20)
+        args = (
+            POPULATION,
+            rt_table, 1, 1.0, np.zeros(0), np.zeros(0), 0.3, 1.0,
+            np.full(10, CAPACITY), RATES["exposed_rate_over"],
+            RATES["infectious_rate"],
+            RATES["critical_rate"], RATES["critical_chance"],
+            RATES["recovery_rate_normal"], RATES["recovery_rate_critical"],
+            RATES["death_rate_normal"], RATES["death_chance_normal"],
+            RATES["death_rate_over"], RATES["death_chance_over"],
+            True
+        )
+        deriv = lambda y: kernel.seicrd_rlc_deriv(y, t, *args)
+        jacobian = kernel.seicrd_rlc_jacobian(y, t, *args)
+    else:
+        #the graph rhs SeicrdRlcModel(compiled=False) integrates
+        model = SeicrdRlcModel(synthetic_kabko(days=60))
+        args = (POPULATION, lambda t: EXPOSED_RATE_NORMAL) + tuple(RATES[k] for k in (
+            "exposed_rate_over", "infectious_rate", "critical_rate", "critical_chance",
+            "recovery_rate_normal", "recovery_rate_critical", "death_rate_normal", "death_chance_normal",
+            "death_rate_over", "death_chance_over"
+        )) + (lambda t: CAPACITY,)
+        deriv = lambda y: model.deriv(y, t, *args)
+        jacobian = model.deriv_jacobian(y, t, *args)
+    assert_jacobian(jacobian, deriv, y)
+
+@pytest.mark.parametrize("critical", CRITICAL)
+@pytest.mark.parametrize("cls", [SeicrdRlcModel, SeirdModel, SeicrdModel, SeicrdRModel, SeicrdRlModel, SeicrdRlExtModel], ids=lambda cls: cls.__name__)
+def test_graph_jacobian(compiled, cls, critical):
+    graph = cls.graph
+    coefficients = np.random.default_rng(0).uniform(0.05, 0.5, len(graph.flows))
+    capacity = CAPACITY if graph.capacity else np.inf
+    y = state(graph, critical)
+    deriv = lambda y: graph.deriv(y, coefficients, capacity, POPULATION, True)
+    assert_jacobian(graph.jacobian(y, coefficients, capacity, POPULATION, True), deriv, y)
+
+@pytest.mark.parametrize("kapasitas_rs_mul", [1.0, 0.003], ids=["cared", "over"])
+def test_fitter_jacobian(kapasitas_rs_mul):
+    #the sensitivities through the dataset transforms, against the model itself
+    kabko = synthetic_kabko(days=90, seed=0)
+    model = SeicrdRlcModel(kabko, cache=False, checkpoint=False)
+    model.use_datasets(["infectious", "critical_cared", "infectious_all", "recovered", "dead", "infected"])
+    values = dict(synthetic_values(kabko), kapasitas_rs_mul=kapasitas_rs_mul)
+    names = model.ensemble_params()
+    jacobian = model.fitter_jacobian(names, **values)
+    for name, column in zip(names, jacobian):
+        #smaller steps mostly difference odeint's error, critical is below one person here
+        h = 1e-3 * abs(values[name])
+        up = model.fitter(**dict(values, **{name: values[name] + h}), sanity_check_mode=util.SANITY_CHECK_IGNORE)
+        down = model.fitter(**dict(values, **{name: values[name] - h}), sanity_check_mode=util.SANITY_CHECK_IGNORE)
+        expected = (up - down) / (2*h)
+        np.testing.assert_allclose(column, expected, rtol=0, atol=1e-3 * max(np.abs(expected).max(), 1e-9), err_msg=name)
+
+def test_uncompiled_model_stays_on_numpy(monkeypatch):
+    #compiled=False integrates the numpy graph rhs even with numba installed
+    kabko = synthetic_kabko(days=90, seed=0)
+    values = synthetic_values(kabko)
+    expected = SeicrdRlcModel(kabko, compiled=True, cache=False, checkpoint=False).model(**values)
+    def compiled(*args):
+        raise AssertionError("compiled graph kernel called")
+    monkeypatch.setattr(kernel, "graph_deriv", compiled)
+    monkeypatch.setattr(kernel, "graph_jacobian", compiled)
+    ret = SeicrdRlcModel(kabko, compiled=False, cache=False, checkpoint=False).model(**values)
+    np.testing.assert_allclose(ret.states, expected.states, rtol=1e-4, atol=1e-6)
@@ -0,0 +1,92 @@
+import math
+import warnings
+import numpy as np
+import pytest
+from sklearn.metrics import explained_variance_score, max_error, mean_absolute_error, mean_squared_error, mean_squared_log_error, median_absolute_error, r2_score
+from statsmodels.stats.stattools import durbin_watson
+from prediksicovidjatim.modeling.fitting_result import BaseScorer
+
+NVARYS = 3
+
+def reference(data, pred, dely_pred, indexes):
+    #the metrics as the scorer computed them before metrics(), row by row with sklearn and statsmodels
+    ndata = len(data[0])
+    def smape(d, p):
+        c = [(math.fabs(a)+math.fabs(b), math.fabs(b-a)) for a, b in zip(d, p)]
+        return sum(e / s for s, e in c if s != 0) / ndata
+    def mase(d, p):
+        #sklearn used to return numpy floats, a naive error of 0 gave inf or nan instead of raising
+        return np.mean([np.float64(mean_absolute_error(d[a:b], p[a:b])) / mean_absolute_error(d[a:b][1:], p[a:b][:-1]) for a, b in indexes])
+    def stats(r):
+        chisqr = (r**2).sum()
+        redchi = chisqr / max(1, ndata - NVARYS)
+        chisqr = max(chisqr, 1.e-250*ndata)
+        neg2 = ndata * np.log(chisqr / ndata)
+        aic = neg2 + 2 * NVARYS
+        return {
+            "chisqr": chisqr, "redchi": redchi, "aic": aic,
+            "aicc": aic + (2*NVARYS*NVARYS + 2*NVARYS)/(ndata-NVARYS-1), "bic": neg2 + np.log(ndata) * NVARYS
+        }
+    rows = []
+    for d, p, dp in zip(data, pred, dely_pred):
+        r = d - p
+        r2 = r2_score(d, p)
+        row = {
+            "residual_mean": np.mean(r),
+            "residual_median": np.median(r),
+            "max_error": max_error(d, p),
+            "mae": mean_absolute_error(d, p),
+            "mse": mean_squared_error(d, p),
+            "msle": mean_squared_log_error(d, p),
+            "median_absolute_error": median_absolute_error(d, p),
+            "explained_variance": explained_variance_score(d, p),
+            "r2": r2,
+            "r2_adj": 1.0 - (1.0-r2)*(ndata-1)/(ndata-NVARYS-1),
+            "mase": mase(d, p),
+            "smape": smape(d, p),
+            "dw": durbin_watson(r),
+            "prediction_interval": sum(0 if a-e <= b <= a+e else 1 for a, b, e in zip(p, d, dp)) / ndata
+        }
+        row.update(stats(r))
+        rows.append(row)
+    ret = {k: np.array([row[k] for row in rows]) for k in rows[0]}
+    ret["rmse"] = np.sqrt(ret["mse"])
+    ret["rmsle"] = np.sqrt(ret["msle"])
+    return ret
+
+def assert_metrics(data, pred, dely_pred, indexes=None):
+    with warnings.catch_warnings():
+        #the edge cases divide by zero in both
+        warnings.simplefilter("ignore")
+        expected = reference(data, pred, dely_pred, indexes or [(0, len(data[0]))])
+        metrics = BaseScorer(data, pred, dely_pred, dely_pred, NVARYS, indexes=indexes).metrics()
+    assert set(metrics) == set(expected)
+    for name, value in expected.items():
+        np.testing.assert_allclose(metrics[name], value, rtol=1e-9, atol=1e-12, equal_nan=True, err_msg=name)
+
+def test_metrics_random():
+    rng = np.random.default_rng(0)
+    data = rng.uniform(0, 1000, (6, 80))
+    pred = data * rng.uniform(0.8, 1.2, data.shape) + rng.normal(0, 20, data.shape)
+    pred = np.abs(pred)
+    dely_pred = rng.uniform(0, 100, data.shape)
+    assert_metrics(data, pred, dely_pred)
+    #scorers of several test splits put together mean mase over each split's points
+    assert_metrics(data, pred, dely_pred, [(0, 30), (30, 55), (55, 80)])
+
+def test_metrics_zero_variance():
+    #constant data, predicted exactly, off by a constant and off by noise; pred constant at the last
+    rng = np.random.default_rng(1)
+    data = np.full((4, 12), 50.0)
+    data[3] = rng.uniform(0, 100, 12)
+    pred = np.array([data[0], data[1] + 5, data[2] + rng.normal(0, 5, 12), np.full(12, 40.0)])
+    assert_metrics(data, pred, np.full(data.shape, 3.0))
+
+@pytest.mark.parametrize("ndata", [2, 3])
+def test_metrics_short_series(ndata):
+    rng = np.random.default_rng(ndata)
+    data = rng.uniform(0, 100, (3, ndata))
+    #the last row has a naive forecast error of 0, mase is inf or nan there
+    data[2] = 7.0
+    pred = np.abs(data + rng.normal(0, 10, data.shape))
+    assert_metrics(data, pred, np.full(data.shape, 5.0))
@@ -0,0 +1,79 @@
+import copy
+import types
+import numpy as np
+import pytest
+from scipy.integrate import odeint
+from lmfit import Parameters
+from prediksicovidjatim.bench.synthetic import synthetic_kabko, synthetic_values
+from prediksicovidjatim.modeling import SeicrdRlcModel, SeirdModel, SeicrdModel, SeicrdRModel, SeicrdRlModel, SeicrdRlExtModel
+from prediksicovidjatim.modeling.fitting_result import FittingResult
+
+GRAPH_MODELS = [SeirdModel, SeicrdModel, SeicrdRModel, SeicrdRlModel, SeicrdRlExtModel]
+
+@pytest.fixture(scope="module")
+def kabko():
+    return synthetic_kabko(days=90, seed=0)
+
+def fitting_result(model, values):
+    #a FittingResult of the given values, without running a fit
+    params = Parameters()
+    for k, v in values.items():
+        params.add(k, value=v, vary=False)
+    return FittingResult(model, types.SimpleNamespace(params=params), model.datasets, None, None, 0)
+
+def counting(model):
+    calls = []
+    inner = model.model
+    def model_(*args, **kwargs):
+        calls.append(kwargs)
+        return inner(*args, **kwargs)
+    model.model = model_
+    return calls
+
+def test_predict_continues_fitted_trajectory(kabko):
+    values = synthetic_values(kabko)
+    model = SeicrdRlcModel(kabko, cache=False, checkpoint=False)
+    calls = counting(model)
+    result = fitting_result(model, values)
+    assert calls == []
+    predicted = result.predict(10)
+    assert [("state" in c) for c in calls] == [False, True]
+    full = model.model(**dict(values, days=values["days"] + 10))
+    assert predicted.states.shape == full.states.shape
+    np.testing.assert_allclose(predicted.states, full.states, rtol=1e-4, atol=1e-6)
+    #the fitted trajectory is integrated only once
+    result.predict(20)
+    assert len(calls) == 4
+
+@pytest.mark.parametrize("cls", GRAPH_MODELS, ids=lambda cls: cls.__name__)
+def test_predict_graph_model(kabko, cls):
+    model = cls(kabko)
+    values = kabko.get_params_init(model.option, outbreak_shift=0)
+    with pytest.raises(ValueError):
+        model.model(**values, state=(values["days"] - 1, np.zeros(len(model.graph.compartments))))
+    predicted = fitting_result(model, values).predict(10)
+    full = model.model(**dict(values, days=values["days"] + 10))
+    assert predicted.states.shape == (values["days"] + 10, len(model.graph.compartments))
+    np.testing.assert_array_equal(predicted.states, full.states)
+
+def test_graph_model_starts_from_one_exposed(kabko):
+    #the models before SeicrdRlcModel start from one exposed whatever the kabko's seed, against the old SeirdModel.deriv
+    kabko = copy.copy(kabko)
+    kabko.seed = 20
+    model = SeirdModel(kabko)
+    values = kabko.get_params_init(model.option, outbreak_shift=0)
+    ret = model.model(**values)
+    r_0 = kabko.get_kwargs_rt(values, single=True)[0]
+    incubation_period, recovery_time, death_chance, death_time = (values[k] for k in SeirdModel.params)
+    exposed_rate = r_0 / (recovery_time * (1-death_chance) + death_time * death_chance)
+    def deriv(y, t):
+        population, susceptible, exposed, infectious, recovered, dead = y
+        exposed_flow = exposed_rate * susceptible * infectious / population
+        infectious_flow = exposed / incubation_period
+        recovery_flow = infectious * (1-death_chance) / recovery_time
+        death_flow = infectious * death_chance / death_time
+        return 0, -exposed_flow, exposed_flow - infectious_flow, infectious_flow - recovery_flow - death_flow, recovery_flow, death_flow
+    population = kabko.population
+    expected = odeint(deriv, (population, population-1, 1, 0, 0, 0), ret.t)
+    np.testing.assert_array_equal(ret.states[0], expected[0])
+    np.testing.assert_allclose(ret.states, expected, rtol=1e-5, atol=1e-3)
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from prediksicovidjatim import util
+from prediksicovidjatim.bench.synthetic import synthetic_kabko, synthetic_values
+from prediksicovidjatim.modeling import SeicrdRlcModel
+from prediksicovidjatim.modeling.seicrd_rlc import SeicrdRlcModelResult
+
+DATASETS = ["infectious", "critical_cared", "infectious_all", "recovered", "dead", "infected"]
+
+def eager(y, kapasitas_rs, test_coverage, mode):
+    #the datasets as the result computed them before they were lazy, every compartment clamped up front
+    population, susceptible, exposed_normal, exposed_over, infectious, critical, recovered_normal, recovered_critical, dead_normal, dead_over = [
+        c if i < 2 else util.sanity_clamp(c, mode) for i, c in enumerate(y)
+    ]
+    critical_cared = np.clip(critical[:], a_min=None, a_max=kapasitas_rs)
+    critical_over = np.clip(critical-kapasitas_rs, a_min=0, a_max=None)
+    infectious_scaled = test_coverage * (infectious + critical_over)
+    infectious_all_scaled = infectious_scaled + critical_cared
+    recovered_scaled = test_coverage * recovered_normal + recovered_critical
+    dead_scaled = test_coverage * dead_over + dead_normal
+    return {
+        "infectious": infectious_scaled,
+        "critical_cared": critical_cared,
+        "infectious_all": infectious_all_scaled,
+        "recovered": recovered_scaled,
+        "dead": dead_scaled,
+        "infected": infectious_all_scaled + recovered_scaled + dead_scaled
+    }
+
+def model_result(kapasitas_rs_mul):
+    kabko = synthetic_kabko(days=120, seed=0)
+    model = SeicrdRlcModel(kabko, cache=False, checkpoint=False)
+    return model.model(**dict(synthetic_values(kabko), kapasitas_rs_mul=kapasitas_rs_mul))
+
+def noisy_result(mode):
+    #a trajectory with small negatives, which the modes clamp or keep
+    ret = model_result(0.003)
+    y = ret._y + np.random.default_rng(0).normal(0, 1e-3, ret._y.shape)
+    return SeicrdRlcModelResult(ret.t, y, ret.kapasitas_rs, ret.test_coverage, ret._rates, mode)
+
+@pytest.mark.parametrize("case", ["cared", "over", "noisy_correct", "noisy_ignore"])
+def test_datasets_match_eager(case):
+    if case == "cared":
+        ret = model_result(1.0)
+    elif case == "over":
+        ret = model_result(0.003)
+    else:
+        ret = noisy_result(util.SANITY_CHECK_CORRECT if case == "noisy_correct" else util.SANITY_CHECK_IGNORE)
+    expected = eager(ret._y, ret.kapasitas_rs, ret.test_coverage, ret.sanity_check_mode)
+    if case == "over":
+        assert np.any(ret.critical > ret.kapasitas_rs)
+    if case.startswith("noisy"):
+        assert np.any(ret._y[2:] < 0)
+    days = len(ret.t)
+    for datasets in (DATASETS, DATASETS[::-1], ["dead", "infected"]):
+        np.testing.assert_array_equal(ret.get_datasets_values(datasets), [expected[d] for d in datasets])
+        for d, v in ret.get_datasets(datasets, shift=3).items():
+            np.testing.assert_array_equal(v, util.shift_array(expected[d], 3))
+        for start, end in ((0, None), (10, 50), (days-7, days)):
+            out = np.full((len(datasets), len(range(days)[start:end])), np.nan)
+            assert ret.get_datasets_into(datasets, out, start, end) is out
+            np.testing.assert_array_equal(out, [expected[d][start:end] for d in datasets])
+
+def test_datasets_into_fitter():
+    #fitter_into writes the same as the sliced fitter, the way the objective reads it
+    kabko = synthetic_kabko(days=120, seed=0)
+    model = SeicrdRlcModel(kabko, cache=False, checkpoint=False)
+    model.use_datasets(DATASETS)
+    values = dict(synthetic_values(kabko), kapasitas_rs_mul=0.003)
+    out = np.empty((len(DATASETS), 40))
+    model.fitter_into(out, (30, 70), **values)
+    np.testing.assert_array_equal(out, model.fitter(**values)[:, 30:70])
+
+def test_datasets_into_invalid():
+    ret = model_result(1.0)
+    with pytest.raises(ValueError):
+        ret.get_datasets_into(["invalid"], np.empty((1, len(ret.t))))
+    with pytest.raises(ValueError):
+        ret.get_datasets_values(["invalid"])
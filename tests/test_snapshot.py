@@ -0,0 +1,57 @@
+import json
+import numpy as np
+import pytest
+from prediksicovidjatim.bench.synthetic import synthetic_kabko
+from prediksicovidjatim.data.model.entities import KabkoData
+from prediksicovidjatim.data.model import snapshot
+
+@pytest.fixture(scope="module")
+def kabko():
+    ret = synthetic_kabko("sample", days=90, seed=0)
+    #the fields synthetic_kabko leaves at their defaults
+    ret.params["death_chance_over"].expr = "death_chance_normal*2"
+    ret.params["infectious_rate"].stderr = 0.01
+    ret._rt_0[1].stderr = 0.2
+    ret.seed = 7
+    ret.scored = True
+    return ret
+
+def assert_same(a, b):
+    #every attribute, the per day, rt and param entities by theirs
+    assert sorted(vars(a)) == sorted(vars(b))
+    for name, value in vars(a).items():
+        other = getattr(b, name)
+        if name in ("data", "_rt_0"):
+            assert [vars(x) for x in value] == [vars(x) for x in other], name
+        elif name == "params":
+            assert {k: vars(p) for k, p in value.items()} == {k: vars(p) for k, p in other.items()}
+        elif isinstance(value, np.ndarray):
+            np.testing.assert_array_equal(value, other, err_msg=name)
+        else:
+            assert value == other, name
+
+def test_snapshot_round_trip(kabko, tmp_path):
+    path = str(tmp_path / "sample.npz")
+    kabko.save_snapshot(path)
+    loaded = KabkoData.load_snapshot(path)
+    assert_same(kabko, loaded)
+    #the arrays and the header are the whole file, without pickles
+    with np.load(path, allow_pickle=False) as f:
+        header = json.loads(str(f["header"]))
+        assert header["version"] == snapshot.SNAPSHOT_VERSION
+        assert header["seed"] == 7 and header["scored"] == 1
+        np.testing.assert_array_equal(f["dead"], kabko.dead)
+
+def test_snapshot_loader(kabko, tmp_path):
+    kabko.save_snapshot(snapshot.snapshot_path(str(tmp_path), kabko.kabko))
+    load = snapshot.snapshot_loader(str(tmp_path))
+    assert_same(kabko, load(kabko.kabko))
+    assert [k.kabko for k in snapshot.load_snapshots(str(tmp_path))] == [kabko.kabko]
+
+def test_snapshot_newer_version(kabko, tmp_path, monkeypatch):
+    path = str(tmp_path / "sample.npz")
+    monkeypatch.setattr(snapshot, "SNAPSHOT_VERSION", snapshot.SNAPSHOT_VERSION + 1)
+    kabko.save_snapshot(path)
+    monkeypatch.undo()
+    with pytest.raises(Exception):
+        KabkoData.load_snapshot(path)